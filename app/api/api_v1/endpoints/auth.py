@@ -2,18 +2,27 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db
 from app.services.auth_service import auth_service, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.password_hasher import PasswordHasherBusy
 from app.schemas import auth as schemas
 from app.api.deps import get_current_user, get_current_active_user, oauth2_scheme
 
 router = APIRouter()
 # oauth2_scheme is now imported from deps
 
+def _hasher_busy() -> HTTPException:
+    # 密码哈希队列已满：快速拒绝，不占用线程池排队
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="请求过于频繁，请稍后重试", headers={"Retry-After": "1"})
+
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """用户登录，获取访问令牌"""
-    user = auth_service.authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await auth_service.authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -28,20 +37,20 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     }
 
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """用户注册"""
-    # 检查用户名是否已存在
-    existing_user = auth_service.get_user_by_username(db, username=user.username)
-    if existing_user:
+    # 检查用户名或邮箱是否已存在
+    existing = await auth_service.find_user(db, username=user.username, email=user.email)
+    if existing and existing.username == user.username:
         raise HTTPException(status_code=400, detail="用户名已存在")
-    
-    # 检查邮箱是否已存在
-    existing_email = auth_service.get_user_by_email(db, email=user.email)
-    if existing_email:
+    if existing:
         raise HTTPException(status_code=400, detail="邮箱已存在")
     
     # 创建新用户
-    db_user = auth_service.create_user(db, username=user.username, email=user.email, password=user.password)
+    try:
+        db_user = await auth_service.create_user(db, username=user.username, email=user.email, password=user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     return db_user
 
 @router.post("/refresh_token", response_model=schemas.Token)
@@ -91,14 +100,17 @@ def update_users_me(user_data: schemas.UserUpdate, current_user = Depends(get_cu
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/change_password")
-def change_password(password_data: schemas.PasswordChange, current_user = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def change_password(password_data: schemas.PasswordChange, current_user = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)):
     """修改当前用户密码"""
-    success = auth_service.update_password(
-        db, 
-        user_id=current_user.id, 
-        current_password=password_data.current_password, 
-        new_password=password_data.new_password
-    )
+    try:
+        success = await auth_service.update_password(
+            db, 
+            user_id=current_user.id, 
+            current_password=password_data.current_password, 
+            new_password=password_data.new_password
+        )
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not success:
         raise HTTPException(status_code=400, detail="当前密码错误")
     return {"message": "密码修改成功"}
@@ -1,54 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Header
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from app.core.database import get_db, get_async_db, release_connection
 from app.schemas import novel as schemas
+from app.schemas import prompt as prompt_schemas
 from app.models import models
 from app.services.novel_service import novel_service
 from app.services.proofreading_service import proofreading_service
+from app.services.batch_proofreading_service import batch_proofreading_service
+from app.services.revision_service import revision_service
+from app.services.search_service import search_service
+from app.services.publish_queue import publish_queue
+from app.services.text_patch import apply_splices, apply_unified_diff
 from app.services.llm_service import llm_service
 from app.models.models import ChapterStatus, Chapter, Comment, ChapterRevision
-from app.api.deps import get_current_active_user
+from app.api.deps import get_current_active_user, owned_novel, owned_novel_detail, owned_chapter, owned_chapter_by_id, owned_novel_async, owned_chapter_async
 from app.models.models import User
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import json
 
 router = APIRouter()
 
-@router.get("/chapters/{chapter_id}", response_model=schemas.Chapter)
-def get_chapter_by_id(
-    chapter_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """Get a specific chapter by ID"""
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Verify ownership
-    novel = db.query(models.Novel).get(ch.novel_id)
-    if novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-        
-    return ch
+# async def 接口使用 AsyncSession，查询不阻塞事件循环；异步会话不能懒加载，
+# 世界观等关系需要显式加载
+WORLD_BIBLE_RELATIONS = ["characters", "locations", "world_settings"]
 
-@router.put("/chapters/{chapter_id}", response_model=schemas.Chapter)
-def update_chapter_by_id(
-    chapter_id: int, 
-    chapter_update: schemas.ChapterUpdate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """Update a specific chapter by ID"""
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+
+def _build_world_bible(novel: models.Novel) -> str:
+    """把角色、地点与世界设定整理成提供给 LLM 的世界观文本，调用前需已加载 WORLD_BIBLE_RELATIONS"""
+    world_bible = ""
+    if novel.characters:
+        world_bible += "【角色列表】\n" + "\n".join([f"- {c.name} ({c.role}): {c.description}" for c in novel.characters]) + "\n\n"
+    if novel.locations:
+        world_bible += "【地点列表】\n" + "\n".join([f"- {l.name}: {l.description}" for l in novel.locations]) + "\n\n"
+    if novel.world_settings:
+        world_bible += "【世界设定】\n" + "\n".join([f"- {s.concept} ({s.category}): {s.description}" for s in novel.world_settings])
+    return world_bible
+
+def _chapter_etag(ch: models.Chapter) -> str:
+    return f'"{ch.id}-{ch.version}"'
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """从 If-Match 头（"<id>-<version>"，可带 W/ 前缀）中取出版本号"""
+    if not if_match:
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"').rsplit("-", 1)[-1])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+def _apply_chapter_update(
+    db: Session, ch: models.Chapter, chapter_update: schemas.ChapterUpdate,
+    response: Response, if_match: Optional[str]
+) -> models.Chapter:
+    """全量更新章节，和增量保存一样要求基准版本，避免覆盖他人的修改"""
+    base_version = chapter_update.base_version if chapter_update.base_version is not None else _parse_if_match(if_match)
+    if base_version is None:
+        raise HTTPException(status_code=428, detail="base_version or If-Match is required")
+    if ch.version != base_version:
+        raise HTTPException(status_code=409, detail={"message": "Version conflict", "current_version": ch.version})
     
-    # Verify ownership
-    novel = db.query(models.Novel).get(ch.novel_id)
-    if novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    content_changed = chapter_update.content is not None and chapter_update.content != ch.content
     
     if chapter_update.title is not None:
         ch.title = chapter_update.title
@@ -60,23 +76,107 @@ def update_chapter_by_id(
         ch.summary = chapter_update.summary
     if chapter_update.status is not None:
         ch.status = chapter_update.status
+    if chapter_update.prompt_version is not None:
+        ch.prompt_version = chapter_update.prompt_version
     
-    db.commit()
+    try:
+        # 先写入带版本检查的章节更新，修订与之同一事务提交：并发保存在此处冲突，
+        # 修订的增量链不会基于同一个最新修订分叉，两次提交之间失败也不会丢失修订
+        db.flush()
+        if content_changed:
+            proofreading_service.add_revision(db, ch, chapter_update.content, commit=False)
+        db.commit()
+    except StaleDataError:
+        # 读取之后被其他请求修改
+        db.rollback()
+        raise HTTPException(status_code=409, detail={"message": "Version conflict"})
     db.refresh(ch)
+    response.headers["ETag"] = _chapter_etag(ch)
     return ch
 
+@router.get("/chapters/{chapter_id}", response_model=schemas.Chapter)
+def get_chapter_by_id(
+    response: Response,
+    ch: models.Chapter = Depends(owned_chapter_by_id)
+):
+    """Get a specific chapter by ID"""
+    response.headers["ETag"] = _chapter_etag(ch)
+    return ch
+
+@router.put("/chapters/{chapter_id}", response_model=schemas.Chapter)
+def update_chapter_by_id(
+    chapter_update: schemas.ChapterUpdate, 
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    ch: models.Chapter = Depends(owned_chapter_by_id)
+):
+    """Update a specific chapter by ID
+
+    需要 base_version 或 If-Match，版本不一致时返回 409。
+    """
+    return _apply_chapter_update(db, ch, chapter_update, response, if_match)
+
+@router.patch("/chapters/{chapter_id}", response_model=schemas.ChapterPatchAck)
+def patch_chapter_content(
+    patch: schemas.ChapterContentPatch, 
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    ch: models.Chapter = Depends(owned_chapter_by_id)
+):
+    """增量保存章节正文：只上传改动，服务端应用后返回简短确认
+
+    基准版本与当前版本不一致时返回 409，客户端应重新获取章节后再保存。
+    """
+    base_version = patch.base_version if patch.base_version is not None else _parse_if_match(if_match)
+    if base_version is None:
+        raise HTTPException(status_code=428, detail="base_version or If-Match is required")
+    if (patch.splices is None) == (patch.diff is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of splices or diff")
+    
+    if ch.version != base_version:
+        raise HTTPException(status_code=409, detail={"message": "Version conflict", "current_version": ch.version})
+    
+    try:
+        if patch.splices is not None:
+            content = apply_splices(ch.content or "", [(op.offset, op.delete, op.insert) for op in patch.splices])
+        else:
+            content = apply_unified_diff(ch.content or "", patch.diff)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    content_changed = content != ch.content
+    ch.content = content
+    if patch.prompt_version is not None:
+        ch.prompt_version = patch.prompt_version
+    try:
+        # 与全量保存相同：章节更新与修订在同一事务中提交
+        db.flush()
+        if content_changed:
+            proofreading_service.add_revision(db, ch, content, commit=False)
+        db.commit()
+    except StaleDataError:
+        # 读取之后被其他请求修改
+        db.rollback()
+        raise HTTPException(status_code=409, detail={"message": "Version conflict"})
+    
+    response.headers["ETag"] = _chapter_etag(ch)
+    return {"id": ch.id, "version": ch.version, "word_count": ch.word_count or 0}
+
 @router.get("/", response_model=List[schemas.Novel])
 def list_novels(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List all novels for the current user"""
-    return db.query(models.Novel).filter(models.Novel.author_id == current_user.id).all()
+    # outline 为延迟加载列，这里一次性取回，避免逐条补查
+    return db.query(models.Novel).options(undefer(models.Novel.outline)).filter(models.Novel.author_id == current_user.id).all()
 
 @router.post("/", response_model=schemas.Novel)
 async def create_novel(
     novel: schemas.NovelCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     return await novel_service.create_novel(
@@ -90,23 +190,17 @@ async def create_novel(
 
 @router.get("/{novel_id}", response_model=schemas.Novel)
 def read_novel(
-    novel_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db_novel: models.Novel = Depends(owned_novel_detail)
 ):
-    db_novel = db.query(models.Novel).filter(models.Novel.id == novel_id).first()
-    if db_novel is None:
-        raise HTTPException(status_code=404, detail="Novel not found")
     return db_novel
 
 @router.post("/{novel_id}/generate_outline", response_model=str)
 async def generate_outline(
-    novel_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
 ):
     try:
-        outline = await novel_service.generate_novel_outline(db, novel_id)
+        outline = await novel_service.generate_novel_outline(db, novel.id)
         return outline
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -115,76 +209,217 @@ async def generate_outline(
 
 @router.post("/{novel_id}/chapters", response_model=schemas.Chapter)
 async def create_chapter(
-    novel_id: int, 
     chapter: schemas.ChapterCreate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    db_novel: models.Novel = Depends(owned_novel_async)
 ):
-    # Check if novel exists
-    db_novel = db.query(models.Novel).filter(models.Novel.id == novel_id).first()
-    if not db_novel:
-        raise HTTPException(status_code=404, detail="Novel not found")
-        
     return await novel_service.create_chapter(
         db=db,
-        novel_id=novel_id,
+        novel_id=db_novel.id,
         title=chapter.title,
         order=chapter.order,
         outline_snippet=chapter.outline_snippet
     )
 
-@router.get("/{novel_id}/chapters", response_model=List[schemas.Chapter])
+# 目录接口可返回的字段；word_count 随正文写入维护，不需要加载正文
+CHAPTER_LIST_COLUMNS = {
+    "id": models.Chapter.id,
+    "title": models.Chapter.title,
+    "order": models.Chapter.order,
+    "status": models.Chapter.status,
+    "word_count": func.coalesce(models.Chapter.word_count, 0),
+    "updated_at": models.Chapter.updated_at,
+    "summary": models.Chapter.summary,
+    "content": models.Chapter.content,
+}
+DEFAULT_CHAPTER_LIST_FIELDS = ["id", "title", "order", "status", "word_count", "updated_at"]
+
+@router.get("/{novel_id}/chapters", response_model=List[schemas.ChapterListItem], response_model_exclude_unset=True)
 def read_chapters(
-    novel_id: int, 
+    response: Response,
+    include_content: bool = False,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    novel: models.Novel = Depends(owned_novel)
+):
+    """章节目录：按 (order, id) 键集分页，默认不返回正文与摘要
+
+    - fields: 逗号分隔的字段列表，如 "id,title,word_count"
+    - include_content: 同时返回 content 与 summary
+    - cursor: 上一页响应头 X-Next-Cursor 的值
+    """
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(DEFAULT_CHAPTER_LIST_FIELDS)
+    if include_content:
+        selected += ["summary", "content"]
+    unknown = [f for f in selected if f not in CHAPTER_LIST_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # 分页游标需要 id 和 order
+    selected = list(dict.fromkeys(["id", "order"] + selected))
+
+    query = db.query(*[CHAPTER_LIST_COLUMNS[f].label(f) for f in selected]).filter(models.Chapter.novel_id == novel.id)
+    if cursor:
+        try:
+            after_order, after_id = (int(v) for v in cursor.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            models.Chapter.order > after_order,
+            and_(models.Chapter.order == after_order, models.Chapter.id > after_id)
+        ))
+    rows = query.order_by(models.Chapter.order, models.Chapter.id).limit(limit + 1).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{last.order}:{last.id}"
+    return [schemas.ChapterListItem(**row._asdict()) for row in rows]
+
+@router.get("/{novel_id}/search")
+def search_chapters(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    novel: models.Novel = Depends(owned_novel)
+):
+    """全文检索本书章节：空格分隔的词项均需出现，引号内为短语；结果按相关度排序，片段中命中处以 <mark> 标出"""
+    return search_service.search(db, novel.id, q, limit=limit, offset=offset)
+
+@router.post("/{novel_id}/search/reindex")
+def reindex_chapters(
+    db: Session = Depends(get_db),
+    novel: models.Novel = Depends(owned_novel)
 ):
-    return db.query(models.Chapter).filter(models.Chapter.novel_id == novel_id).order_by(models.Chapter.order).all()
+    """重建本书的全文索引（如新增角色名后希望旧章节按新词典切分）"""
+    return {"indexed": search_service.rebuild(db, novel.id)}
 
 @router.get("/{novel_id}/chapters/{chapter_id}", response_model=schemas.Chapter)
 def read_chapter(
-    novel_id: int, 
-    chapter_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    ch: models.Chapter = Depends(owned_chapter)
 ):
     """Get a specific chapter"""
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
     return ch
 
 @router.post("/{novel_id}/chapters/{chapter_id}/proofread")
 async def proofread_chapter(
-    novel_id: int, 
-    chapter_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    ch: models.Chapter = Depends(owned_chapter_async)
+):
+    # 校对在计算进程池中执行，期间不占用连接
+    await release_connection(db)
+    return await proofreading_service.proofread_text(ch.content or "")
+
+@router.post("/{novel_id}/proofread_jobs")
+async def start_proofread_job(
+    start_order: Optional[int] = None, 
+    end_order: Optional[int] = None, 
+    novel: models.Novel = Depends(owned_novel_async)
+):
+    """对整本小说（或指定章节范围）启动批量校对任务"""
+    return await batch_proofreading_service.start_job(novel.id, start_order, end_order)
+
+def _get_proofread_job(novel: models.Novel, job_id: str):
+    """任务保存在数据库中，任一 worker 都能查到"""
+    job = batch_proofreading_service.get_job(job_id)
+    if not job or job["novel_id"] != novel.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{novel_id}/proofread_jobs/{job_id}")
+def get_proofread_job(
+    job_id: str, 
+    novel: models.Novel = Depends(owned_novel)
 ):
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    sensitive = proofreading_service.filter_sensitive(ch.content or "")
-    grammar = await proofreading_service.grammar_check(ch.content or "")
-    return {"sensitive": sensitive, "grammar": grammar}
+    """查询批量校对任务的进度与汇总报告"""
+    return _get_proofread_job(novel, job_id)
+
+@router.get("/{novel_id}/proofread_jobs/{job_id}/stream")
+async def stream_proofread_job(
+    job_id: str, 
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
+):
+    """流式返回逐章校对结果与进度"""
+    await release_connection(db)
+    await run_in_threadpool(_get_proofread_job, novel, job_id)
+
+    async def event_generator():
+        try:
+            async for event in batch_proofreading_service.stream_job(job_id):
+                yield f"data: {json.dumps(event)}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@router.post("/{novel_id}/publish_jobs", response_model=List[schemas.PublishJob])
+async def enqueue_publish_jobs(
+    request: schemas.PublishJobCreate,
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
+):
+    """把章节加入定时发布队列；重复提交相同章节返回已有任务"""
+    account = await publish_queue.find_account(db, request.platform.value, request.account_username)
+    if account is None:
+        raise HTTPException(status_code=400, detail=f"No account configured for {request.platform.value}")
+    try:
+        return await publish_queue.enqueue(
+            db, novel.id, account, request.chapter_ids,
+            release_at=request.release_at,
+            interval_seconds=request.interval_minutes * 60,
+            idempotency_key=request.idempotency_key
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/{novel_id}/publish_jobs", response_model=List[schemas.PublishJob])
+async def list_publish_jobs(
+    status: Optional[models.PublishJobStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
+):
+    return await publish_queue.list_jobs(db, novel.id, status.value if status else None, limit, offset)
+
+@router.delete("/{novel_id}/publish_jobs/{job_id}")
+async def cancel_publish_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
+):
+    if not await publish_queue.cancel(db, novel.id, job_id):
+        raise HTTPException(status_code=409, detail="Job not found or already started")
+    return {"status": "cancelled"}
 
 @router.post("/{novel_id}/chapters/{chapter_id}/status/{target}")
 def change_status(
-    novel_id: int, 
-    chapter_id: int, 
     target: str, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    ch: models.Chapter = Depends(owned_chapter)
 ):
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
     try:
         updated = proofreading_service.transition_status(db, ch, ChapterStatus(target))
         return {"status": updated.status}
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid transition")
 
+@router.post("/{novel_id}/chapters/{chapter_id}/prompt_feedback")
+async def rate_chapter_prompt(
+    rating: prompt_schemas.PromptFeedbackCreate,
+    chapter: models.Chapter = Depends(owned_chapter_async)
+):
+    """为生成本章所用的 prompt 版本评分（0-1），影响之后的版本选择"""
+    if not chapter.prompt_version:
+        raise HTTPException(status_code=409, detail="Chapter was not generated from a registered prompt")
+    if not await llm_service.evaluate_template("chapter", chapter.prompt_version, rating.score, rating.feedback, chapter.id):
+        raise HTTPException(status_code=404, detail="Prompt version not found")
+    return {"status": "ok", "prompt_version": chapter.prompt_version}
+
 from pydantic import BaseModel
 
 class ContinueRequest(BaseModel):
@@ -193,33 +428,15 @@ class ContinueRequest(BaseModel):
 
 @router.post("/{novel_id}/chapters/{chapter_id}/stream_continue")
 async def stream_continue_chapter(
-    novel_id: int, 
-    chapter_id: int, 
     request: ContinueRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    chapter: models.Chapter = Depends(owned_chapter_async)
 ):
-    # Check ownership
-    novel = db.query(models.Novel).get(novel_id)
-    if not novel or novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-        
-    chapter = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Prepare World Bible
-    characters = novel.characters
-    locations = novel.locations
-    world_settings = novel.world_settings
+    novel = chapter.novel
+    await db.refresh(novel, attribute_names=WORLD_BIBLE_RELATIONS)
     
-    world_bible = ""
-    if characters:
-        world_bible += "【角色列表】\n" + "\n".join([f"- {c.name} ({c.role}): {c.description}" for c in characters]) + "\n\n"
-    if locations:
-        world_bible += "【地点列表】\n" + "\n".join([f"- {l.name}: {l.description}" for l in locations]) + "\n\n"
-    if world_settings:
-        world_bible += "【世界设定】\n" + "\n".join([f"- {s.concept} ({s.category}): {s.description}" for s in world_settings])
+    world_bible = _build_world_bible(novel)
+    await release_connection(db)
 
     async def event_generator():
         try:
@@ -242,15 +459,12 @@ class ImproveExpandRequest(BaseModel):
 
 @router.post("/{novel_id}/chapters/{chapter_id}/stream_improve")
 async def stream_improve_chapter(
-    novel_id: int, 
     chapter_id: int, 
     request: ImproveExpandRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
 ):
-    novel = db.query(models.Novel).get(novel_id)
-    if not novel or novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    await release_connection(db)
 
     async def event_generator():
         try:
@@ -268,15 +482,12 @@ async def stream_improve_chapter(
 
 @router.post("/{novel_id}/chapters/{chapter_id}/stream_expand")
 async def stream_expand_chapter(
-    novel_id: int, 
     chapter_id: int, 
     request: ImproveExpandRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    novel: models.Novel = Depends(owned_novel_async)
 ):
-    novel = db.query(models.Novel).get(novel_id)
-    if not novel or novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    await release_connection(db)
 
     async def event_generator():
         try:
@@ -294,24 +505,19 @@ async def stream_expand_chapter(
 
 @router.post("/{novel_id}/chapters/{chapter_id}/stream_generate")
 async def stream_generate_chapter(
-    novel_id: int, 
-    chapter_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    chapter: models.Chapter = Depends(owned_chapter_async)
 ):
-    novel = db.query(models.Novel).get(novel_id)
-    if not novel or novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-        
-    chapter = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+    novel = chapter.novel
+    await db.refresh(novel, attribute_names=WORLD_BIBLE_RELATIONS)
     
     # Get previous chapter context
-    prev_chapter = db.query(models.Chapter).filter(
-        models.Chapter.novel_id == novel_id, 
-        models.Chapter.order < chapter.order
-    ).order_by(models.Chapter.order.desc()).first()
+    prev_chapter = (await db.execute(
+        select(models.Chapter).where(
+            models.Chapter.novel_id == novel.id, 
+            models.Chapter.order < chapter.order
+        ).options(undefer(models.Chapter.content)).order_by(models.Chapter.order.desc()).limit(1)
+    )).scalar_one_or_none()
     
     context = prev_chapter.content[-1000:] if prev_chapter and prev_chapter.content else "第一章"
     
@@ -322,8 +528,10 @@ async def stream_generate_chapter(
     world_bible = ""
     if characters: world_bible += "【角色】\n" + "\n".join([f"- {c.name}" for c in characters]) + "\n"
     if locations: world_bible += "【地点】\n" + "\n".join([f"- {l.name}" for l in locations]) + "\n"
+    await release_connection(db)
 
     async def event_generator():
+        generation = {}
         try:
             async for chunk in llm_service.stream_generate_chapter(
                 title=novel.title,
@@ -331,9 +539,14 @@ async def stream_generate_chapter(
                 chapter_order=chapter.order,
                 chapter_title=chapter.title,
                 context=context,
-                chapter_outline=chapter.outline_snippet or "",
-                world_bible=world_bible
+                # 章节没有单独保存大纲片段，以已有的摘要代替
+                chapter_outline=chapter.summary or "",
+                world_bible=world_bible,
+                stats=generation
             ):
+                # 第一条事件为所用的 prompt 版本，客户端保存章节时带上，之后才能为该版本评分
+                if "prompt_version" in generation:
+                    yield f"data: {json.dumps({'prompt_version': generation.pop('prompt_version')})}\n\n"
                 yield f"data: {json.dumps({'content': chunk})}\n\n"
             yield "data: [DONE]\n\n"
         except Exception as e:
@@ -343,86 +556,114 @@ async def stream_generate_chapter(
 
 @router.post("/{novel_id}/chapters/{chapter_id}/consistency_check")
 async def check_chapter_consistency(
-    novel_id: int, 
-    chapter_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    mode: Literal["auto", "single"] = "auto",
+    db: AsyncSession = Depends(get_async_db),
+    chapter: models.Chapter = Depends(owned_chapter_async)
 ):
-    # Check ownership
-    novel = db.query(models.Novel).get(novel_id)
-    if not novel or novel.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-        
-    chapter = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
     if not chapter.content:
-        return {"issues": [], "issue_count": 0, "message": "章节内容为空"}
+        return {"issues": [], "issue_count": 0, "cached": False, "message": "章节内容为空"}
 
-    # Prepare World Bible
-    characters = novel.characters
-    locations = novel.locations
-    world_settings = novel.world_settings
-    
-    world_bible = ""
-    if characters:
-        world_bible += "【角色列表】\n" + "\n".join([f"- {c.name} ({c.role}): {c.description}" for c in characters]) + "\n\n"
-    if locations:
-        world_bible += "【地点列表】\n" + "\n".join([f"- {l.name}: {l.description}" for l in locations]) + "\n\n"
-    if world_settings:
-        world_bible += "【世界设定】\n" + "\n".join([f"- {s.concept} ({s.category}): {s.description}" for s in world_settings])
+    novel = chapter.novel
+    await db.refresh(novel, attribute_names=WORLD_BIBLE_RELATIONS)
+
+    world_bible = _build_world_bible(novel)
 
     # Perform Analysis
     result = await proofreading_service.analyze_logical_consistency(
         text=chapter.content,
         context="", # 可以扩展为获取前文摘要
         world_bible=world_bible,
-        title=novel.title
+        title=novel.title,
+        mode=mode,
+        db=db,
+        chapter_id=chapter.id
     )
     
     return result
 
+@router.post("/{novel_id}/chapters/{chapter_id}/stream_consistency_check")
+async def stream_check_chapter_consistency(
+    mode: Literal["auto", "single"] = "auto",
+    db: AsyncSession = Depends(get_async_db),
+    chapter: models.Chapter = Depends(owned_chapter_async)
+):
+    """流式逻辑一致性检查：先返回规则检查结果，再按块返回LLM检查结果"""
+    novel = chapter.novel
+    await db.refresh(novel, attribute_names=WORLD_BIBLE_RELATIONS)
+    
+    content = chapter.content or ""
+    
+    world_bible = _build_world_bible(novel)
+
+    await release_connection(db)
+
+    async def event_generator():
+        try:
+            rule_issues = await proofreading_service._rule_based_logical_check(content, "")
+            yield f"data: {json.dumps({'source': 'rules', 'issues': rule_issues})}\n\n"
+            if content:
+                async for partial in proofreading_service.stream_llm_logical_check(content, world_bible, novel.title, mode=mode):
+                    yield f"data: {json.dumps({'source': 'llm', **partial})}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
 @router.post("/{novel_id}/chapters/{chapter_id}/comments")
 def add_comment(
-    novel_id: int, 
-    chapter_id: int, 
     author: str, 
     body: str, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    ch: models.Chapter = Depends(owned_chapter)
 ):
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
     c = proofreading_service.add_comment(db, ch, author, body)
     return {"id": c.id}
 
+@router.get("/{novel_id}/chapters/{chapter_id}/revisions")
+def list_revisions(
+    db: Session = Depends(get_db),
+    ch: models.Chapter = Depends(owned_chapter)
+):
+    """列出章节的修订历史（不含内容）"""
+    return revision_service.list_revisions(db, ch.id)
+
+@router.get("/{novel_id}/chapters/{chapter_id}/revisions/diff")
+def diff_revisions(
+    from_revision: int, 
+    to_revision: int, 
+    db: Session = Depends(get_db),
+    ch: models.Chapter = Depends(owned_chapter)
+):
+    """两个修订之间的统一格式 diff"""
+    before = revision_service.get_revision(db, ch.id, from_revision)
+    after = revision_service.get_revision(db, ch.id, to_revision)
+    if not before or not after:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return {"from_revision": before.id, "to_revision": after.id, "diff": revision_service.diff(db, before, after)}
+
+@router.get("/{novel_id}/chapters/{chapter_id}/revisions/{revision_id}")
+def get_revision(
+    revision_id: int, 
+    db: Session = Depends(get_db),
+    ch: models.Chapter = Depends(owned_chapter)
+):
+    """获取任意修订的完整内容"""
+    rev = revision_service.get_revision(db, ch.id, revision_id)
+    if not rev:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return {"id": rev.id, "created_at": rev.created_at, "content": revision_service.reconstruct(db, rev)}
+
 @router.put("/{novel_id}/chapters/{chapter_id}", response_model=schemas.Chapter)
 def update_chapter(
-    novel_id: int, 
-    chapter_id: int, 
     chapter_update: schemas.ChapterUpdate, 
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    ch: models.Chapter = Depends(owned_chapter)
 ):
-    """Update a chapter"""
-    ch = db.query(models.Chapter).filter(models.Chapter.id == chapter_id, models.Chapter.novel_id == novel_id).first()
-    if not ch:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Update chapter fields if provided
-    if chapter_update.title is not None:
-        ch.title = chapter_update.title
-    if chapter_update.order is not None:
-        ch.order = chapter_update.order
-    if chapter_update.content is not None:
-        ch.content = chapter_update.content
-    if chapter_update.summary is not None:
-        ch.summary = chapter_update.summary
-    if chapter_update.status is not None:
-        ch.status = chapter_update.status
-    
-    db.commit()
-    db.refresh(ch)
-    return ch
+    """Update a chapter
+
+    需要 base_version 或 If-Match，版本不一致时返回 409。
+    """
+    return _apply_chapter_update(db, ch, chapter_update, response, if_match)
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.api.deps import get_current_active_user, get_current_admin_user
+from app.schemas import prompt as schemas
+from app.services.prompt_manager import prompt_manager
+
+router = APIRouter()
+
+# prompt 版本全局共享：所有用户可查看与评分，新增与启停需要管理员
+
+@router.get("/{task}")
+async def get_prompt_variants(task: str, current_user = Depends(get_current_active_user)):
+    """各版本的调用统计、质量评分与当前的选择比例"""
+    try:
+        return await prompt_manager.get_template_evaluation(task)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{task}")
+async def create_prompt_variant(task: str, variant: schemas.PromptVariantCreate, current_user = Depends(get_current_admin_user)):
+    try:
+        created = await prompt_manager.add_variant(task, variant.version, variant.messages, variant.description)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return created.to_dict()
+
+@router.patch("/{task}/{version}")
+async def update_prompt_variant(task: str, version: str, update: schemas.PromptVariantUpdate, current_user = Depends(get_current_admin_user)):
+    variant = await prompt_manager.set_active(task, version, update.is_active)
+    if variant is None:
+        raise HTTPException(status_code=404, detail="Prompt version not found")
+    return variant.to_dict()
+
+@router.post("/{task}/{version}/feedback")
+async def rate_prompt_variant(task: str, version: str, rating: schemas.PromptFeedbackCreate, current_user = Depends(get_current_active_user)):
+    if not await prompt_manager.evaluate_template(task, version, rating.score, rating.feedback):
+        raise HTTPException(status_code=404, detail="Prompt version not found")
+    return {"status": "ok"}
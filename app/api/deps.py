@@ -1,32 +1,113 @@
-from typing import Generator
+from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session, undefer, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db, SessionLocal
+from app.models.models import User, Novel, Chapter, Character, Location, WorldSetting
 from app.services.auth_service import auth_service
+from app.services.user_cache import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """校验访问令牌并返回其内容，不查询数据库"""
     payload = auth_service.decode_token(token)
-    if payload is None or payload.get("type") != "access":
-        raise credentials_exception
-    
-    username: str = payload.get("sub")
-    if username is None:
-        raise credentials_exception
-    
-    user = auth_service.get_user_by_username(db, username=username)
+    if payload is None or payload.get("type") != "access" or payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def get_token_subject(payload: dict = Depends(get_token_payload)) -> str:
+    return payload["sub"]
+
+def get_current_user(payload: dict = Depends(get_token_payload)):
+    # 自动保存、SSE 等高频请求大多命中缓存，无需查询数据库
+    user = user_cache.get(payload)
+    if user is not None:
+        return user
+    # 使用独立的短会话：不与接口共享 get_db 的会话，流式响应期间不会一直占用连接
+    with SessionLocal() as db:
+        user = auth_service.get_user_by_username(db, username=payload["sub"])
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    user_cache.set(payload, user)
     return user
 
 def get_current_active_user(current_user = Depends(get_current_user)):
     if current_user.is_active == 0:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="用户已禁用")
     return current_user
+
+def get_current_admin_user(current_user = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限")
+    return current_user
+
+# --- 资源归属校验 ---
+# 以当前用户为起点左连接目标资源及其所属小说，一次查询同时完成用户校验、资源查找与归属判断：
+# 用户不存在 -> 401，用户已禁用 -> 403，资源不存在 -> 404，不属于当前用户 -> 403
+
+def _owned_stmt(username: str, model, item_id: int, novel_id: Optional[int] = None):
+    onclause = model.id == item_id
+    if novel_id is not None:
+        onclause = and_(onclause, model.novel_id == novel_id)
+    stmt = select(User.id, User.is_active, model, Novel.author_id).select_from(User).outerjoin(model, onclause)
+    if model is not Novel:
+        stmt = stmt.outerjoin(Novel, Novel.id == model.novel_id)
+    return stmt.where(User.username == username)
+
+def _owned_chapter_stmt(username: str, chapter_id: int, novel_id: Optional[int] = None):
+    # 章节接口基本都要用到正文；所属小说只取生成与展示需要的列
+    return _owned_stmt(username, Chapter, chapter_id, novel_id).options(
+        undefer(Chapter.content),
+        contains_eager(Chapter.novel).load_only(Novel.id, Novel.title, Novel.style, Novel.author_id)
+    )
+
+def _check_owned(row, detail: str):
+    if row is None:
+        raise _credentials_exception()
+    user_id, is_active, obj, author_id = row
+    if is_active == 0:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="用户已禁用")
+    if obj is None:
+        raise HTTPException(status_code=404, detail=detail)
+    if author_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return obj
+
+def owned_novel(novel_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Novel:
+    return _check_owned(db.execute(_owned_stmt(username, Novel, novel_id)).first(), "Novel not found")
+
+def owned_novel_detail(novel_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Novel:
+    """同 owned_novel，并在同一查询中取回延迟加载的大纲"""
+    return _check_owned(db.execute(_owned_stmt(username, Novel, novel_id).options(undefer(Novel.outline))).first(), "Novel not found")
+
+def owned_chapter(novel_id: int, chapter_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Chapter:
+    return _check_owned(db.execute(_owned_chapter_stmt(username, chapter_id, novel_id)).first(), "Chapter not found")
+
+def owned_chapter_by_id(chapter_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Chapter:
+    """用于路径中不含 novel_id 的章节接口"""
+    return _check_owned(db.execute(_owned_chapter_stmt(username, chapter_id)).first(), "Chapter not found")
+
+async def owned_novel_async(novel_id: int, db: AsyncSession = Depends(get_async_db), username: str = Depends(get_token_subject)) -> Novel:
+    return _check_owned((await db.execute(_owned_stmt(username, Novel, novel_id))).first(), "Novel not found")
+
+async def owned_chapter_async(novel_id: int, chapter_id: int, db: AsyncSession = Depends(get_async_db), username: str = Depends(get_token_subject)) -> Chapter:
+    return _check_owned((await db.execute(_owned_chapter_stmt(username, chapter_id, novel_id))).first(), "Chapter not found")
+
+def owned_character(character_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Character:
+    return _check_owned(db.execute(_owned_stmt(username, Character, character_id)).first(), "Character not found")
+
+def owned_location(location_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> Location:
+    return _check_owned(db.execute(_owned_stmt(username, Location, location_id)).first(), "Location not found")
+
+def owned_world_setting(setting_id: int, db: Session = Depends(get_db), username: str = Depends(get_token_subject)) -> WorldSetting:
+    return _check_owned(db.execute(_owned_stmt(username, WorldSetting, setting_id)).first(), "Setting not found")
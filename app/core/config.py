@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -7,6 +7,12 @@ class Settings(BaseSettings):
     # Auth
     SECRET_KEY: str = "development_secret_key"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    USER_CACHE_TTL: int = 60 # Seconds a token->user lookup is cached, capped by token expiry; 0 disables
+    USER_CACHE_MAXSIZE: int = 10000
+    USER_CACHE_REDIS: bool = False # Share the user cache across workers via REDIS_URL
+    BCRYPT_ROUNDS: int = 12 # Existing hashes are upgraded to the new cost on next login
+    PASSWORD_HASH_WORKERS: int = 2 # Dedicated threads for bcrypt
+    PASSWORD_HASH_QUEUE_SIZE: int = 32 # Waiting operations beyond this are rejected with 429
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
     # LLM
@@ -14,9 +20,48 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
     DEEPSEEK_API_KEY: str = ""
     DOUBAO_API_KEY: str = ""
+    # USD per 1K (input, output) tokens, used for the cost estimate in LLM telemetry
+    LLM_PRICES: Dict[str, List[float]] = {
+        "gpt-4-turbo-preview": [0.01, 0.03],
+        "gpt-4o": [0.005, 0.015],
+        "gpt-4o-mini": [0.00015, 0.0006],
+        "gpt-3.5-turbo": [0.0005, 0.0015],
+    }
+    LLM_TELEMETRY_LOG: str = "" # File receiving one JSON line per LLM call; empty disables
+    # "openai", or "fake" for the deterministic offline chat/embedding models (load tests, local development)
+    LLM_BACKEND: str = "openai"
+    FAKE_LLM_TTFT: float = 0.3 # Seconds before the first token
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0
+    FAKE_LLM_OUTPUT_TOKENS: int = 200
+    FAKE_LLM_ERROR_RATE: float = 0.0 # Fraction of calls failing before the first token
+    FAKE_LLM_SEED: int = 0
+    FAKE_EMBEDDING_LATENCY: float = 0.02 # Seconds per embedding call
+    WARM_UP_SERVICES: bool = True # After startup, build LLM/embedding clients and load the jieba dictionary in a background thread
+    # Prompt registry: variants are picked per call by Thompson sampling on
+    # quality * w_quality - tokens/1K * w_tokens - latency_s * w_latency - cost_usd * w_cost
+    PROMPT_OBJECTIVE_WEIGHTS: Dict[str, float] = {"quality": 1.0, "tokens": 0.1, "latency": 0.01, "cost": 0.0}
+    PROMPT_STATS_REFRESH: float = 30.0 # Seconds between reloads of the shared variant stats from the database
+    PROMPT_PRIOR_CALLS: float = 5.0 # Pseudo-calls at the task average used to shrink a new variant's cost estimates
+
+    # Tracing
+    TRACING_ENABLED: bool = True # Per-request stage spans, Server-Timing header and /debug/traces
+    TRACE_BUFFER_SIZE: int = 200 # Finished traces kept in memory (and as many slow ones)
+    TRACE_SLOW_THRESHOLD: float = 1.0 # Seconds; slower requests are also kept in the slow buffer
+    TRACE_MAX_SPANS: int = 500 # Spans beyond this per trace are counted but dropped
     
     # Database
     DATABASE_URL: str = "sqlite:///./sql_app.db" # Default to sqlite for easy start
+    ASYNC_DATABASE_URL: str = "" # Empty means DATABASE_URL with the async driver (aiosqlite/asyncpg)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30 # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_TIMEOUT: int = 0 # Seconds, 0 disables (PostgreSQL only)
+    
+    # Chapter/revision/outline bodies are stored compressed: "zlib", "zstd" (needs zstandard) or "none"
+    CONTENT_COMPRESSION: str = "zlib"
+    CONTENT_COMPRESSION_MIN_BYTES: int = 256 # Shorter values are stored uncompressed
+    REVISION_SNAPSHOT_INTERVAL: int = 20 # Every Nth chapter revision is a full snapshot, the rest are deltas
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -24,6 +69,46 @@ class Settings(BaseSettings):
     # Vector DB
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
     
+    # Proofreading
+    CONSISTENCY_RULES_PATH: str = "" # Empty means the bundled rule set
+    CONSISTENCY_RULE_WINDOW: int = 2 # Max sentences a co-occurrence may span
+    CONSISTENCY_RULE_MAX_DISTANCE: int = 200 # Max characters between the two terms
+    CONSISTENCY_CHUNK_SIZE: int = 3000 # Characters per LLM consistency-check chunk
+    CONSISTENCY_CHUNK_OVERLAP: int = 200
+    CONSISTENCY_MAX_CONCURRENCY: int = 4
+    SEARCH_SNIPPET_CHARS: int = 40 # Characters of context on each side of a search hit
+    SEARCH_TOKENIZER_CACHE_SIZE: int = 8 # Per-novel jieba dictionaries kept per process (~15 MB each)
+    PROOFREAD_BATCH_SIZE: int = 50 # Chapters per process-pool task
+    PROOFREAD_WORST_CHAPTERS: int = 10
+    PROOFREAD_REPORT_DIRECTORY: str = "./proofread_reports"
+    PROOFREAD_JOB_RETENTION: int = 86400 # Seconds a batch job and its results are kept in the database
+    PROOFREAD_JOB_STALE_SECONDS: int = 300 # A running job without progress for this long is reported as failed
+    
+    # Compute executor (CPU-bound text analysis)
+    COMPUTE_WORKERS: int = 0 # Process pool size, 0 means CPU count
+    COMPUTE_INLINE_THRESHOLD: int = 2000 # Inputs shorter than this (chars) run in-process
+    
+    # Publishing (Playwright)
+    PUBLISH_HEADLESS: bool = True
+    PUBLISH_SESSION_DIR: str = "./publish_sessions" # Encrypted storage_state per account
+    PUBLISH_MAX_CONCURRENCY_PER_PLATFORM: int = 2
+    PUBLISH_SESSION_CHECK_INTERVAL: int = 300 # Seconds a verified login is trusted before re-checking
+    PUBLISH_CONTEXT_IDLE_TIMEOUT: int = 1800 # Idle browser contexts are closed after this many seconds
+    QIDIAN_LOGIN_URL: str = "https://passport.qidian.com/"
+    QIDIAN_AUTHOR_URL: str = "https://author.qidian.com/"
+    JINJIANG_LOGIN_URL: str = "https://login.jjwxc.net/"
+    JINJIANG_AUTHOR_URL: str = "https://author.jjwxc.net/"
+    PUBLISH_QUEUE_ENABLED: bool = True # Run the scheduled publish dispatcher in this process
+    PUBLISH_QUEUE_POLL_INTERVAL: float = 5.0 # Seconds between scans for due jobs
+    PUBLISH_QUEUE_BATCH_SIZE: int = 50 # Jobs claimed per scan
+    PUBLISH_QUEUE_LEASE_SECONDS: int = 600 # A running job not finished within this is picked up again
+    PUBLISH_MAX_ATTEMPTS: int = 5
+    PUBLISH_RETRY_BASE_DELAY: float = 30.0 # Seconds, doubled per attempt and jittered
+    PUBLISH_RETRY_MAX_DELAY: float = 3600.0
+    PUBLISH_RATE_PER_MINUTE: float = 6.0 # Chapters per minute per platform
+    PUBLISH_STEP_ATTEMPTS: int = 3 # Attempts per publish step (open editor, submit, confirm)
+    PUBLISH_STEP_RETRY_DELAY: float = 1.0 # Seconds, randomized exponential backoff between step attempts
+    
     # Notification
     DINGTALK_WEBHOOK: str = ""
     
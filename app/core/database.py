@@ -1,10 +1,51 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.tracing import instrument_engine
 
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {})
+def _to_async_url(url: str) -> str:
+    """把同步驱动的连接串换成对应的异步驱动（aiosqlite / asyncpg）"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+def _engine_kwargs(url: str, is_async: bool) -> dict:
+    """连接池参数；内存 SQLite 使用单连接池，不支持这些参数"""
+    if "sqlite" in url:
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return kwargs
+    else:
+        kwargs = {"pool_pre_ping": True}
+    kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if settings.DB_STATEMENT_TIMEOUT and url.startswith("postgres"):
+        if is_async:
+            kwargs["connect_args"] = {"command_timeout": settings.DB_STATEMENT_TIMEOUT}
+        else:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT * 1000}"}
+    return kwargs
+
+engine = create_engine(settings.DATABASE_URL, **_engine_kwargs(settings.DATABASE_URL, is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎：供 async def 接口使用，避免数据库查询阻塞事件循环
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _to_async_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL, is_async=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# 请求内执行的每条 SQL 记录为一个 db span
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,3 +54,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def release_connection(db: AsyncSession):
+    """结束当前事务，把连接归还连接池
+
+    AsyncSession 只在事务内占用连接。在等待 LLM 或返回流式响应之前调用，避免长时间占用连接；
+    已加载的对象仍可访问（expire_on_commit=False），之后的查询或写入会重新从连接池取连接。
+    """
+    await db.commit()
@@ -0,0 +1,197 @@
+import os
+import re
+import logging
+from prometheus_client import Counter, Histogram, Gauge, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+logger = logging.getLogger(__name__)
+
+# 多 worker 部署时在启动前设置该环境变量（须在导入 prometheus_client 之前生效），
+# 各进程把指标写入该目录下的文件，/metrics 汇总所有进程的数据
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+_METRIC_FILE_PID = re.compile(r"_(\d+)\.db$")
+
+def _get_or_create(metric_cls, name: str, documentation: str, labelnames=(), **kwargs):
+    """注册指标；模块被重复导入（如 reload）时复用已注册的指标"""
+    try:
+        return metric_cls(name=name, documentation=documentation, labelnames=labelnames, **kwargs)
+    except ValueError:
+        logger.info(f"Metric already registered: {name}")
+        return REGISTRY._names_to_collectors[name]
+
+# --- HTTP 请求（path 为路由模板） ---
+REQUEST_COUNT = _get_or_create(
+    Counter,
+    "novel_agent_requests_total",
+    "Total HTTP requests for novel agent API",
+    ["path", "method", "status"]
+)
+REQUEST_LATENCY = _get_or_create(
+    Histogram,
+    "novel_agent_request_latency_seconds",
+    "Request latency for novel agent API, until the last body chunk is sent",
+    ["path", "method"]
+)
+RESPONSE_FIRST_BYTE = _get_or_create(
+    Histogram,
+    "novel_agent_response_first_byte_seconds",
+    "Time until the first response body chunk is sent",
+    ["path", "method"]
+)
+RESPONSE_STREAM_DURATION = _get_or_create(
+    Histogram,
+    "novel_agent_response_stream_seconds",
+    "Time from the first to the last response body chunk (streaming responses)",
+    ["path", "method"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+INSTRUMENTATION_OVERHEAD = _get_or_create(
+    Histogram,
+    "novel_agent_instrumentation_overhead_seconds",
+    "Time spent in the instrumentation middleware itself per request",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+
+# --- LLM 调用（operation: outline/chapter/summary/continue/improve/expand/consistency） ---
+LLM_CALLS = _get_or_create(
+    Counter, "novel_agent_llm_calls_total",
+    "LLM calls by result (ok, error, cache_hit)",
+    labelnames=["operation", "model", "result"]
+)
+LLM_TTFT = _get_or_create(
+    Histogram, "novel_agent_llm_ttft_seconds",
+    "Time from sending the request to the first generated token",
+    labelnames=["operation"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+)
+LLM_LATENCY = _get_or_create(
+    Histogram, "novel_agent_llm_latency_seconds",
+    "Total duration of an LLM call",
+    labelnames=["operation"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+)
+LLM_INTER_TOKEN = _get_or_create(
+    Histogram, "novel_agent_llm_inter_token_seconds",
+    "Mean gap between generated chunks within one LLM call",
+    labelnames=["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1)
+)
+LLM_TOKENS_PER_SECOND = _get_or_create(
+    Histogram, "novel_agent_llm_tokens_per_second",
+    "Completion tokens per second after the first token",
+    labelnames=["operation"],
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+)
+LLM_TOKENS = _get_or_create(
+    Histogram, "novel_agent_llm_tokens",
+    "Tokens per LLM call (kind: prompt or completion)",
+    labelnames=["operation", "kind"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+)
+LLM_COST = _get_or_create(
+    Counter, "novel_agent_llm_cost_usd_total",
+    "Estimated LLM cost in USD, from LLM_PRICES",
+    labelnames=["operation", "model"]
+)
+
+# --- Prompt 版本选择 ---
+PROMPT_SELECTIONS = _get_or_create(
+    Counter, "novel_agent_prompt_selections_total",
+    "Prompt variants picked by the registry per generation task",
+    labelnames=["task", "version"]
+)
+
+
+# --- 计算线程/进程池 ---
+
+COMPUTE_QUEUE_DEPTH = _get_or_create(
+    Gauge, "novel_agent_compute_queue_depth",
+    "CPU-bound tasks submitted to the compute executor and not yet finished",
+    multiprocess_mode="livesum"
+)
+COMPUTE_TASK_LATENCY = _get_or_create(
+    Histogram, "novel_agent_compute_task_seconds",
+    "Wall time of compute executor tasks including queueing",
+    labelnames=["task", "mode"]
+)
+EVENT_LOOP_LAG = _get_or_create(
+    Histogram, "novel_agent_event_loop_lag_seconds",
+    "Delay between a scheduled event loop wake-up and when it actually ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# --- 发布队列 ---
+PUBLISH_JOB_RESULTS = _get_or_create(
+    Counter,
+    "publish_job_results_total",
+    "Publish queue attempts by outcome (success, retry, failed)",
+    ["platform", "result"]
+)
+PUBLISH_STEP_LATENCY = _get_or_create(
+    Histogram,
+    "publish_step_seconds",
+    "Publish step latency including retries",
+    ["platform", "step"]
+)
+PUBLISH_JOBS_CLAIMED = _get_or_create(
+    Counter,
+    "publish_jobs_claimed_total",
+    "Publish jobs claimed by the dispatcher"
+)
+
+# --- 认证 ---
+
+USER_CACHE_REQUESTS = _get_or_create(
+    Counter, "novel_agent_user_cache_requests_total",
+    "Token to user lookups served by the user cache, by result",
+    labelnames=["result"]
+)
+PASSWORD_HASH_LATENCY = _get_or_create(
+    Histogram, "novel_agent_password_hash_seconds",
+    "bcrypt hash/verify time including queueing in the password hashing pool",
+    labelnames=["op"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+PASSWORD_HASH_QUEUE_DEPTH = _get_or_create(
+    Gauge, "novel_agent_password_hash_queue_depth",
+    "Password hashing operations running or waiting in the pool",
+    multiprocess_mode="livesum"
+)
+PASSWORD_HASH_REJECTED = _get_or_create(
+    Counter, "novel_agent_password_hash_rejected_total",
+    "Password hashing operations rejected because the queue was full",
+    labelnames=["op"]
+)
+
+
+# --- 导出 ---
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def cleanup_dead_workers():
+    """清理已退出 worker 的 live 类 gauge 文件；计数器与直方图文件保留，累计值不会因 worker 重启而丢失"""
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return
+    pids = set()
+    for name in os.listdir(MULTIPROC_DIR):
+        match = _METRIC_FILE_PID.search(name)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        if pid != os.getpid() and not _pid_alive(pid):
+            multiprocess.mark_process_dead(pid, MULTIPROC_DIR)
+
+def render_latest() -> bytes:
+    """/metrics 的内容：多进程模式下汇总目录中所有 worker 的指标"""
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    cleanup_dead_workers()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=MULTIPROC_DIR)
+    return generate_latest(registry)
@@ -0,0 +1,140 @@
+import time
+import logging
+from typing import Optional
+from app.core.metrics import (
+    REQUEST_COUNT, REQUEST_LATENCY, RESPONSE_FIRST_BYTE, RESPONSE_STREAM_DURATION, INSTRUMENTATION_OVERHEAD
+)
+from app.core.request_context import begin_request
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 未匹配任何路由的请求（404、CORS 预检等）统一使用该标签，避免按原始路径产生无限多的时间序列
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope) -> str:
+    """匹配到的路由模板，如 /api/v1/novels/{novel_id}/chapters/{chapter_id}"""
+    # 按需包含子路由的 FastAPI 版本中 route.path 只是子路由内的相对路径，
+    # 完整模板在 scope["fastapi"] 的 effective_route_context 上
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    route = scope.get("route")
+    return (
+        getattr(context, "path_format", None)
+        or getattr(route, "path_format", None)
+        or getattr(route, "path", None)
+        or UNMATCHED_ROUTE
+    )
+
+
+class InstrumentationMiddleware:
+    """纯 ASGI 的请求日志 + Prometheus 指标中间件
+
+    替代原先三个 @app.middleware("http")（日志、UTF-8、指标）：BaseHTTPMiddleware 每层都会
+    包装一次响应并经由内存流转发，流式响应也要多走几次任务切换。这里只包装 send：
+    - 指标按路由模板打标签，而不是实际路径；
+    - 记录首字节时间（http.response.start 到第一段 body）与流式响应从首字节到结束的时长；
+    - JSON 响应的 Content-Type 补上 charset=utf-8；
+    - 为每个请求设置 request_id（沿用 X-Request-ID 或新生成）并在响应头中返回，LLM 调用日志据此关联请求；
+    - 每个请求一个 trace（沿用 traceparent），响应头 Server-Timing 返回发送响应头之前已结束的各阶段耗时；
+    - 中间件自身耗时记录在 INSTRUMENTATION_OVERHEAD 中。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = begin_request(scope)["request_id"]
+        trace = tracer.start_trace(scope["method"], _header(scope, b"traceparent"))
+        if trace is not None:
+            trace.root.attributes.update({
+                "http.request.method": scope["method"], "url.path": scope["path"], "request_id": request_id
+            })
+        request_id = request_id.encode("latin-1")
+        state = {"status": None, "first_byte": None, "end": None, "overhead": 0.0}
+
+        async def send_wrapper(message):
+            t = time.perf_counter()
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                _ensure_utf8(message)
+                headers = list(message.get("headers") or []) + [(b"x-request-id", request_id)]
+                if trace is not None:
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message["headers"] = headers
+            elif message["type"] == "http.response.body":
+                if state["first_byte"] is None:
+                    state["first_byte"] = t
+                if not message.get("more_body", False):
+                    state["end"] = t
+            state["overhead"] += time.perf_counter() - t
+            await send(message)
+
+        state["overhead"] += time.perf_counter() - start
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            if trace is not None:
+                trace.root.record_error(e)
+            raise
+        finally:
+            self._record(scope, start, state)
+            if trace is not None:
+                self._finish_trace(scope, trace, state)
+
+    def _record(self, scope, start: float, state):
+        t = time.perf_counter()
+        end = state["end"] or t
+        # 未发出响应头就抛出异常时，由外层 ServerErrorMiddleware 返回 500
+        status = state["status"] or 500
+        path = route_template(scope)
+        method = scope["method"]
+
+        REQUEST_COUNT.labels(path=path, method=method, status=status).inc()
+        REQUEST_LATENCY.labels(path=path, method=method).observe(end - start)
+        first_byte: Optional[float] = state["first_byte"]
+        if first_byte is not None:
+            RESPONSE_FIRST_BYTE.labels(path=path, method=method).observe(first_byte - start)
+            RESPONSE_STREAM_DURATION.labels(path=path, method=method).observe(end - first_byte)
+        if state["end"] is None:
+            # 客户端中途断开或处理异常，响应没有正常结束
+            logger.info(f"Request: {method} {scope['path']} - Status: {status} - Aborted after {end - start:.4f}s")
+        else:
+            logger.info(f"Request: {method} {scope['path']} - Status: {status} - Latency: {end - start:.4f}s")
+
+        INSTRUMENTATION_OVERHEAD.observe(state["overhead"] + time.perf_counter() - t)
+
+
+    def _finish_trace(self, scope, trace, state):
+        path = route_template(scope)
+        status = state["status"] or 500
+        # OpenTelemetry HTTP 服务端 span 的命名方式："{method} {route}"
+        trace.root.name = f"{scope['method']} {path}"
+        trace.root.attributes["http.route"] = path
+        trace.root.attributes["http.response.status_code"] = status
+        if status >= 500:
+            trace.root.status = "ERROR"
+        tracer.finish_trace(trace)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _ensure_utf8(message):
+    headers = message.get("headers") or []
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b"content-type":
+            if value.startswith(b"application/json") and b"charset" not in value:
+                headers = list(headers)
+                headers[i] = (name, b"application/json; charset=utf-8")
+                message["headers"] = headers
+            return
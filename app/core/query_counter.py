@@ -0,0 +1,41 @@
+import threading
+from contextlib import contextmanager
+from typing import List, Iterator
+from sqlalchemy import event
+from app.core.database import engine, async_engine
+
+
+class QueryCounter:
+    """统计一段代码内同步与异步引擎执行的 SQL 语句数
+
+    用法：
+        with count_queries() as counter:
+            client.get("/api/v1/novels/1")
+        print(counter.count, counter.statements)
+    """
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(*engines) -> Iterator[QueryCounter]:
+    """默认同时监听 engine 与 async_engine"""
+    targets = engines or (engine, async_engine.sync_engine)
+    counter = QueryCounter()
+    for target in targets:
+        event.listen(target, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", counter._on_execute)
@@ -0,0 +1,26 @@
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# 当前请求的标识，由 InstrumentationMiddleware 设置；后台任务中为空
+_request: ContextVar[Optional[Dict[str, str]]] = ContextVar("request", default=None)
+
+
+def begin_request(scope) -> Dict[str, str]:
+    """为请求生成（或沿用客户端传入的 X-Request-ID）标识并设置到上下文"""
+    request_id = None
+    for name, value in scope.get("headers") or []:
+        if name == b"x-request-id":
+            request_id = value.decode("latin-1")[:64]
+            break
+    info = {
+        "request_id": request_id or uuid.uuid4().hex,
+        "method": scope.get("method", ""),
+        "path": scope.get("path", "")
+    }
+    _request.set(info)
+    return info
+
+
+def current_request() -> Dict[str, str]:
+    return _request.get() or {}
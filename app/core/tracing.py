@@ -0,0 +1,263 @@
+import os
+import re
+import time
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional
+from sqlalchemy import event
+from app.core.config import settings
+
+# W3C traceparent: 版本-trace_id-父 span_id-标志
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """一个阶段的耗时；字段与 OpenTelemetry span 对应（trace_id/span_id/parent_span_id/status/attributes）"""
+
+    __slots__ = ("trace", "span_id", "parent_span_id", "name", "start", "end", "attributes", "status")
+
+    def __init__(self, trace: "Trace", name: str, parent_span_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.status = "OK"
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException):
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            self.trace._add(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Trace:
+    """一个请求内的全部 span，根 span 为 HTTP 请求本身"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None, max_spans: int = 500):
+        self.trace_id = trace_id or _new_id(16)
+        self.started_at = time.time()
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.root = Span(self, name, parent_span_id)
+
+    def _add(self, span: Span):
+        if span is self.root:
+            return
+        # list.append 是原子的，线程池中执行的同步代码也可以直接记录
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """按阶段名汇总：总耗时、次数与扣除子阶段后的自身耗时（毫秒）"""
+        children: Dict[str, float] = {}
+        for span in self.spans:
+            if span.parent_span_id is not None:
+                children[span.parent_span_id] = children.get(span.parent_span_id, 0.0) + span.duration
+        stages: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {"count": 0, "total_ms": 0.0, "self_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += span.duration * 1000
+            # 并发执行的子阶段可能比父阶段还长
+            stage["self_ms"] += max(0.0, span.duration - children.get(span.span_id, 0.0)) * 1000
+        for stage in stages.values():
+            stage["total_ms"] = round(stage["total_ms"], 2)
+            stage["self_ms"] = round(stage["self_ms"], 2)
+        return stages
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头：已结束的各阶段总耗时 + 到目前为止的总耗时"""
+        parts = [
+            f'{name};dur={stage["total_ms"]:.1f}' + (f';desc="x{stage["count"]}"' if stage["count"] > 1 else "")
+            for name, stage in self.breakdown().items()
+        ]
+        parts.append(f"total;dur={self.root.duration * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self, include_spans: bool = True) -> Dict[str, Any]:
+        data = {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": self.started_at,
+            "duration_ms": round(self.root.duration * 1000, 2),
+            "status": self.root.status,
+            "attributes": self.root.attributes,
+            "breakdown": self.breakdown(),
+            "dropped_spans": self.dropped
+        }
+        if include_spans:
+            data["spans"] = [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start)]
+        return data
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+class Tracer:
+    """轻量的进程内阶段追踪
+
+    不依赖采集端：结束的 trace 保存在内存环形缓冲区中，超过 slow_threshold 的另存一份，
+    供 /debug/traces 查看；请求的阶段耗时同时通过 Server-Timing 响应头返回。
+    不在请求内（后台任务、脚本）时 span() 不做任何记录。
+    """
+
+    def __init__(self, enabled: bool = True, buffer_size: int = 200, slow_threshold: float = 1.0, max_spans: int = 500):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.max_spans = max_spans
+        self._recent: deque = deque(maxlen=buffer_size)
+        self._slow: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+
+    # --- trace ---
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        trace_id = parent_span_id = None
+        match = _TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_span_id = match.groups()
+        trace = Trace(name, trace_id, parent_span_id, max_spans=self.max_spans)
+        _current_trace.set(trace)
+        _current_span.set(trace.root)
+        return trace
+
+    def finish_trace(self, trace: Trace):
+        trace.root.finish()
+        with self._lock:
+            self._recent.append(trace)
+            if trace.root.duration >= self.slow_threshold:
+                self._slow.append(trace)
+
+    def traces(self, slow: bool = False, min_duration: float = 0.0, limit: int = 20) -> List[Trace]:
+        with self._lock:
+            traces = list(self._slow if slow else self._recent)
+        traces = [t for t in reversed(traces) if t.root.duration >= min_duration]
+        return traces[:limit]
+
+    def get_trace(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            for trace in reversed(self._recent):
+                if trace.trace_id == trace_id:
+                    return trace
+            for trace in reversed(self._slow):
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    async def detached(self, coro: Awaitable) -> Any:
+        """包装后台任务的协程：任务复制了创建时的上下文，这里先清除当前 trace，
+        任务中的 span 不会记到（可能早已结束的）发起请求的 trace 上
+
+        用法：asyncio.create_task(tracer.detached(job()))
+        """
+        _current_trace.set(None)
+        _current_span.set(None)
+        return await coro
+
+    # --- span ---
+
+    def start_span(self, name: str, **attributes) -> Optional[Span]:
+        """创建但不激活 span，用于异步生成器等跨越 yield 的阶段；调用方负责 finish()"""
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        parent = _current_span.get()
+        return Span(trace, name, parent.span_id if parent is not None else None, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """在当前 trace 中记录一个阶段，期间其为后续 span 的父节点"""
+        span = self.start_span(name, **attributes)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    def traced(self, name: str):
+        """把整个异步函数记录为一个阶段"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+tracer = Tracer(
+    enabled=settings.TRACING_ENABLED,
+    buffer_size=settings.TRACE_BUFFER_SIZE,
+    slow_threshold=settings.TRACE_SLOW_THRESHOLD,
+    max_spans=settings.TRACE_MAX_SPANS
+)
+
+
+def instrument_engine(sync_engine):
+    """每条 SQL 记录为一个 db span（异步引擎传入 async_engine.sync_engine）"""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span("db", **{"db.statement": statement[:200]})
+        if span is not None:
+            conn.info.setdefault("trace_spans", []).append(span)
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().finish()
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_error(exception_context.original_exception)
+            span.finish()
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
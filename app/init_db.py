@@ -1,9 +1,13 @@
 from app.core.database import engine, Base
 from app.models import models
+from app.services.search_service import search_service
+from app.services.prompt_manager import prompt_manager
 
 def init_db():
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    search_service.ensure_schema(engine)
+    prompt_manager.ensure_schema(engine)
     print("Tables created.")
 
 if __name__ == "__main__":
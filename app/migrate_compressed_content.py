@@ -0,0 +1,77 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.types import LargeBinary, Integer, String
+from app.core.database import engine, Base
+from app.models import models
+from app.models.types import compress_text
+
+# (表名, 旧的文本列, 新的压缩列)
+TARGETS = [
+    ("chapters", "content", "content_z"),
+    ("chapter_revisions", "content", "content_z"),
+    ("novels", "outline", "outline_z"),
+]
+
+# 后续版本新增的列：(表名, 列名, 类型, 回填默认值)
+NEW_COLUMNS = [
+    ("chapters", "word_count", Integer(), None),
+    ("chapters", "version", Integer(), 1),
+    ("chapters", "prompt_version", String(), None),
+    ("chapter_revisions", "delta_z", LargeBinary(), None),
+    ("chapter_revisions", "content_length", Integer(), None),
+]
+
+def _add_column(conn, table: str, column: str, column_type: str):
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+
+def migrate(batch_size: int = 500):
+    """把旧的明文 Text 列迁移到压缩列，补齐新增列并回填长度统计
+
+    可重复执行：只处理压缩列仍为空的行，迁移后旧列置空以释放空间
+    （SQLite 需 VACUUM、PostgreSQL 需 VACUUM FULL 才会真正回收）。
+    """
+    Base.metadata.create_all(bind=engine)
+    blob_type = LargeBinary().compile(dialect=engine.dialect)
+    inspector = inspect(engine)
+
+    for table, old_column, new_column in TARGETS:
+        columns = {c["name"] for c in inspector.get_columns(table)}
+        with engine.begin() as conn:
+            if new_column not in columns:
+                _add_column(conn, table, new_column, blob_type)
+            for extra_table, column, column_type, default in NEW_COLUMNS:
+                if extra_table != table:
+                    continue
+                if column not in columns:
+                    _add_column(conn, table, column, column_type.compile(dialect=engine.dialect))
+                if default is not None:
+                    conn.execute(text(f'UPDATE {table} SET {column} = :value WHERE {column} IS NULL'), {"value": default})
+        if old_column not in columns:
+            continue
+
+        migrated = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f'SELECT id, {old_column} FROM {table} '
+                    f'WHERE {new_column} IS NULL AND {old_column} IS NOT NULL '
+                    f'ORDER BY id LIMIT :limit'
+                ), {"limit": batch_size}).fetchall()
+                if not rows:
+                    break
+                for row_id, value in rows:
+                    params = {"id": row_id, "value": compress_text(value)}
+                    extra = ""
+                    if table == "chapters":
+                        extra = ", word_count = :length"
+                        params["length"] = len(value)
+                    elif table == "chapter_revisions":
+                        extra = ", content_length = :length"
+                        params["length"] = len(value)
+                    conn.execute(text(
+                        f'UPDATE {table} SET {new_column} = :value, {old_column} = NULL{extra} WHERE id = :id'
+                    ), params)
+                migrated += len(rows)
+        print(f"{table}.{old_column}: migrated {migrated} rows")
+
+if __name__ == "__main__":
+    migrate()
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, Enum, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, backref, deferred, validates
 from sqlalchemy.sql import func
 import enum
 from app.core.database import Base
+from app.models.types import CompressedText
 
 class NovelStatus(str, enum.Enum):
     PLANNING = "planning"
@@ -25,7 +26,8 @@ class Novel(Base):
     genre = Column(String) # e.g., Fantasy, Sci-Fi
     style = Column(String) # e.g., Dark, Humorous
     synopsis = Column(Text, nullable=True)
-    outline = Column(Text, nullable=True) # Generated full outline
+    # Generated full outline, compressed and only loaded when accessed
+    outline = deferred(Column("outline_z", CompressedText, nullable=True))
     status = Column(String, default=NovelStatus.PLANNING)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -43,16 +45,33 @@ class Chapter(Base):
     id = Column(Integer, primary_key=True, index=True)
     novel_id = Column(Integer, ForeignKey("novels.id"))
     title = Column(String)
-    content = Column(Text)
+    # Chapter body, compressed and only loaded when accessed
+    content = deferred(Column("content_z", CompressedText))
+    word_count = Column(Integer, default=0) # Kept in sync with content, so listings never load the body
     summary = Column(Text, nullable=True) # Summary for context
     order = Column(Integer)
     status = Column(String, default=ChapterStatus.DRAFT)
+    version = Column(Integer, nullable=False, default=1) # Optimistic concurrency token, exposed as the ETag
+    prompt_version = Column(String, nullable=True) # Chapter prompt variant that generated the content, for quality feedback
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     novel = relationship("Novel", back_populates="chapters")
     revisions = relationship("ChapterRevision", back_populates="chapter", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="chapter", cascade="all, delete-orphan")
+    consistency_checks = relationship("ConsistencyCheckCache", back_populates="chapter", cascade="all, delete-orphan")
+
+    # 目录查询与键集分页按 (novel_id, order, id) 排序
+    __table_args__ = (
+        Index("ix_chapters_novel_id_order", "novel_id", "order", "id"),
+    )
+    # 每次 UPDATE 自动递增 version，并校验未被并发修改
+    __mapper_args__ = {"version_id_col": version}
+
+    @validates("content")
+    def _sync_word_count(self, key, value):
+        self.word_count = len(value) if value else 0
+        return value
 
 class Character(Base):
     __tablename__ = "characters"
@@ -96,12 +115,98 @@ class ChapterRevision(Base):
     __tablename__ = "chapter_revisions"
 
     id = Column(Integer, primary_key=True, index=True)
-    chapter_id = Column(Integer, ForeignKey("chapters.id"))
-    content = Column(Text)
+    chapter_id = Column(Integer, ForeignKey("chapters.id"), index=True)
+    # Full snapshot; NULL when the revision is stored as a delta
+    content = deferred(Column("content_z", CompressedText))
+    # JSON splice ops against the previous revision of the same chapter; NULL for snapshots
+    delta = deferred(Column("delta_z", CompressedText, nullable=True))
+    content_length = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     chapter = relationship("Chapter", back_populates="revisions")
 
+class ConsistencyCheckCache(Base):
+    __tablename__ = "consistency_check_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True) # Hash of content, world bible, prompt version and model
+    chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=True, index=True)
+    model = Column(String)
+    prompt_version = Column(String)
+    issues = Column(Text) # JSON list of LLM issues
+    stats = Column(Text, nullable=True) # JSON llm_stats of the original run
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    chapter = relationship("Chapter", back_populates="consistency_checks")
+
+class ProofreadJob(Base):
+    """批量校对任务：状态与进度保存在数据库中，任一 worker 都能查询"""
+    __tablename__ = "proofread_jobs"
+
+    id = Column(String, primary_key=True) # uuid4 hex
+    novel_id = Column(Integer, ForeignKey("novels.id"), index=True)
+    start_order = Column(Integer, nullable=True)
+    end_order = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default="running") # running, completed or failed
+    total = Column(Integer, nullable=True) # Chapters in range, known once the index is loaded
+    completed = Column(Integer, nullable=False, default=0)
+    report = Column(Text, nullable=True) # JSON summary report
+    report_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(Float, nullable=False) # Unix time
+    heartbeat_at = Column(Float, nullable=False) # Unix time of the running worker's last progress write
+
+class ProofreadJobResult(Base):
+    """批量校对的逐章结果，seq 为完成顺序，流式接口按 seq 续读"""
+    __tablename__ = "proofread_job_results"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, ForeignKey("proofread_jobs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    data = Column(Text, nullable=False) # JSON result from text_checks.summarize_chapters plus order/title
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "seq", name="uq_proofread_job_results_job_seq"),
+    )
+
+class PromptVariant(Base):
+    __tablename__ = "prompt_variants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task = Column(String, nullable=False) # outline, chapter, summary
+    version = Column(String, nullable=False)
+    messages = Column(Text, nullable=False) # JSON list of [role, template] pairs
+    description = Column(Text, nullable=True)
+    is_active = Column(Integer, nullable=False, default=1)
+    # Running totals shared by all workers; only ever changed by UPDATE ... SET col = col + :delta
+    calls = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    prompt_tokens_sum = Column(Integer, nullable=False, default=0)
+    completion_tokens_sum = Column(Integer, nullable=False, default=0)
+    cost_sum = Column(Float, nullable=False, default=0.0)
+    ratings = Column(Integer, nullable=False, default=0)
+    quality_sum = Column(Float, nullable=False, default=0.0) # Sum of 0-1 feedback scores
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    feedback = relationship("PromptFeedback", back_populates="variant", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        UniqueConstraint("task", "version", name="uq_prompt_variants_task_version"),
+    )
+
+class PromptFeedback(Base):
+    __tablename__ = "prompt_feedback"
+
+    id = Column(Integer, primary_key=True, index=True)
+    variant_id = Column(Integer, ForeignKey("prompt_variants.id"), index=True)
+    score = Column(Float, nullable=False)
+    feedback = Column(Text, nullable=True)
+    chapter_id = Column(Integer, nullable=True) # Set when rated through a generated chapter
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    variant = relationship("PromptVariant", back_populates="feedback")
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -137,6 +242,59 @@ class PublishLog(Base):
     message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class PublishJobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class PublishJob(Base):
+    __tablename__ = "publish_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, unique=True, nullable=False) # The same key is only ever enqueued once
+    platform = Column(String, nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    novel_id = Column(Integer, ForeignKey("novels.id"), index=True)
+    chapter_id = Column(Integer, ForeignKey("chapters.id"))
+    release_at = Column(DateTime(timezone=True), nullable=False) # Scheduled release time (UTC)
+    status = Column(String, nullable=False, default=PublishJobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False) # release_at, pushed back by retry backoff
+    locked_until = Column(DateTime(timezone=True), nullable=True) # Lease of the worker running the job
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # 调度器按 (status, next_attempt_at) 取到期任务
+    __table_args__ = (
+        Index("ix_publish_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class PublishStep(str, enum.Enum):
+    SESSION_READY = "session_ready"
+    EDITOR_OPENED = "editor_opened"
+    SUBMITTING = "submitting" # Recorded right before the submit click; the outcome is unknown until submitted
+    SUBMITTED = "submitted"
+    CONFIRMED = "confirmed"
+
+class PublishRecord(Base):
+    """每个 (平台, 章节) 的发布检查点，用于断点续传与防止重复提交"""
+    __tablename__ = "publish_records"
+
+    id = Column(Integer, primary_key=True, index=True)
+    platform = Column(String, nullable=False)
+    chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
+    content_hash = Column(String, nullable=False) # sha256 of title and content that the step refers to
+    step = Column(String, nullable=False, default=PublishStep.SESSION_READY) # Last completed step
+    remote_url = Column(String, nullable=True) # Chapter URL on the platform once confirmed
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("platform", "chapter_id", name="uq_publish_records_platform_chapter"),
+    )
+
 # 用户模型 - 用于JWT认证
 class User(Base):
     __tablename__ = "users"
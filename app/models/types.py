@@ -0,0 +1,51 @@
+import zlib
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖，未安装时使用 zlib
+    zstandard = None
+
+# 压缩数据的第一个字节标记编码方式，读取时与当前配置无关
+CODEC_RAW = b"r"
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+
+def compress_text(value: str) -> bytes:
+    """按 CONTENT_COMPRESSION 配置压缩文本，短文本原样存储"""
+    raw = value.encode("utf-8")
+    codec = settings.CONTENT_COMPRESSION
+    if codec == "none" or len(raw) < settings.CONTENT_COMPRESSION_MIN_BYTES:
+        return CODEC_RAW + raw
+    if codec == "zstd" and zstandard is not None:
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(raw)
+    return CODEC_ZLIB + zlib.compress(raw, 6)
+
+def decompress_text(value: bytes) -> str:
+    value = bytes(value)
+    codec, payload = value[:1], value[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed content")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    if codec == CODEC_RAW:
+        return payload.decode("utf-8")
+    raise ValueError(f"Unknown content codec: {codec!r}")
+
+class CompressedText(TypeDecorator):
+    """透明压缩的文本列：Python 侧为 str，数据库中为压缩后的二进制"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
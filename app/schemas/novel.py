@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
-from app.models.models import NovelStatus, ChapterStatus
+from app.models.models import NovelStatus, ChapterStatus, Platform, PublishJobStatus
 
 class NovelBase(BaseModel):
     title: str
@@ -41,13 +41,66 @@ class ChapterUpdate(BaseModel):
     content: Optional[str] = None
     summary: Optional[str] = None
     status: Optional[ChapterStatus] = None
+    base_version: Optional[int] = None # 也可以用 If-Match 头传入
+    prompt_version: Optional[str] = None # stream_generate 返回的 prompt 版本，保存生成的正文时带上
 
 class Chapter(ChapterBase):
     id: int
     novel_id: int
     status: ChapterStatus
+    version: Optional[int] = None
+    prompt_version: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+class TextSplice(BaseModel):
+    offset: int # Character offset in the text produced by the previous splice
+    delete: int = 0
+    insert: str = ""
+
+class ChapterContentPatch(BaseModel):
+    """增量保存：splices 与 diff 二选一；base_version 或 If-Match 头指定基准版本"""
+    base_version: Optional[int] = None
+    splices: Optional[List[TextSplice]] = None
+    diff: Optional[str] = None # Unified diff against the base version
+    prompt_version: Optional[str] = None # Prompt version reported by stream_generate for the inserted text
+
+class ChapterPatchAck(BaseModel):
+    id: int
+    version: int
+    word_count: int
+
+class ChapterListItem(BaseModel):
+    """章节目录项：只包含请求的字段，默认不含正文"""
+    id: int
+    title: Optional[str] = None
+    order: Optional[int] = None
+    status: Optional[ChapterStatus] = None
+    word_count: Optional[int] = None
+    updated_at: Optional[datetime] = None
+    summary: Optional[str] = None
+    content: Optional[str] = None
+
+class PublishJobCreate(BaseModel):
+    platform: Platform
+    chapter_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    release_at: Optional[datetime] = None # Naive values are UTC; omitted means now
+    interval_minutes: int = Field(0, ge=0) # Gap between consecutive chapters, in chapter order
+    account_username: Optional[str] = None # Defaults to the platform's first account
+    idempotency_key: Optional[str] = None # Prefix for re-publishing chapters that were queued before
+
+class PublishJob(BaseModel):
+    id: int
+    platform: str
+    chapter_id: int
+    release_at: datetime
+    status: PublishJobStatus
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
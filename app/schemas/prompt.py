@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class PromptVariantCreate(BaseModel):
+    version: str = Field(..., min_length=1, max_length=64)
+    messages: List[List[str]] = Field(..., min_length=1) # [role, template] pairs; role is system, user or ai
+    description: Optional[str] = None
+
+class PromptVariantUpdate(BaseModel):
+    is_active: bool
+
+class PromptFeedbackCreate(BaseModel):
+    score: float = Field(..., ge=0, le=1)
+    feedback: Optional[str] = None
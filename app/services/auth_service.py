@@ -1,13 +1,18 @@
+import uuid
 from datetime import datetime, timedelta, UTC
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from app.core.config import settings
+from sqlalchemy import select, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.models import User
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher
+from app.core.database import release_connection
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码加密上下文（cost 见 settings.BCRYPT_ROUNDS）
+pwd_context = password_hasher.context
 
 # 令牌有效期
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -20,11 +25,11 @@ class AuthService:
         pass
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """验证密码"""
+        """验证密码（同步，在当前线程执行；接口中应使用 password_hasher）"""
         return pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password: str) -> str:
-        """生成密码哈希"""
+        """生成密码哈希（同步，在当前线程执行；接口中应使用 password_hasher）"""
         return pwd_context.hash(password)
 
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -34,7 +39,8 @@ class AuthService:
             expire = datetime.now(UTC) + expires_delta
         else:
             expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire})
+        # jti 作为用户缓存的键
+        to_encode.update({"exp": expire, "iat": datetime.now(UTC), "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
@@ -87,26 +93,88 @@ class AuthService:
         """根据邮箱获取用户"""
         return db.query(User).filter(User.email == email).first()
 
-    def create_user(self, db: Session, username: str, email: str, password: str) -> User:
-        """创建新用户"""
-        hashed_password = self.get_password_hash(password)
+    async def find_user(self, db: AsyncSession, username: Optional[str] = None, email: Optional[str] = None) -> Optional[User]:
+        """按用户名或邮箱查找用户（任一匹配即返回）"""
+        conditions = []
+        if username:
+            conditions.append(User.username == username)
+        if email:
+            conditions.append(User.email == email)
+        if not conditions:
+            return None
+        return (await db.execute(select(User).where(or_(*conditions)).limit(1))).scalar_one_or_none()
+
+    async def create_user(self, db: AsyncSession, username: str, email: str, password: str) -> User:
+        """创建新用户，密码哈希在专用线程池中计算"""
+        # 哈希期间不占用数据库连接
+        await release_connection(db)
+        hashed_password = await password_hasher.hash(password)
         db_user = User(
             username=username,
             email=email,
-            hashed_password=hashed_password
+            hashed_password=hashed_password,
+            is_active=1,
+            is_admin=0
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
         return db_user
 
-    def authenticate_user(self, db: Session, username: str, password: str) -> Optional[User]:
-        """验证用户身份"""
-        user = self.get_user_by_username(db, username)
+    def update_user(self, db: Session, user_id: int, username: Optional[str] = None, email: Optional[str] = None) -> Optional[User]:
+        """更新用户名/邮箱"""
+        user = db.query(User).get(user_id)
         if not user:
             return None
-        if not self.verify_password(password, user.hashed_password):
+        old_username = user.username
+        if username and username != user.username:
+            if self.get_user_by_username(db, username):
+                raise ValueError("用户名已存在")
+            user.username = username
+        if email and email != user.email:
+            if self.get_user_by_email(db, email):
+                raise ValueError("邮箱已存在")
+            user.email = email
+        db.commit()
+        db.refresh(user)
+        user_cache.invalidate_user(old_username)
+        return user
+
+    async def update_password(self, db: AsyncSession, user_id: int, current_password: str, new_password: str) -> bool:
+        """校验当前密码后修改密码"""
+        user = await db.get(User, user_id)
+        if not user:
+            return False
+        await release_connection(db)
+        verified, _ = await password_hasher.verify_and_update(current_password, user.hashed_password)
+        if not verified:
+            return False
+        user.hashed_password = await password_hasher.hash(new_password)
+        await db.commit()
+        user_cache.invalidate_user(user.username)
+        return True
+
+    def set_user_active(self, db: Session, user_id: int, active: bool) -> Optional[User]:
+        """启用/禁用用户，禁用立即生效（清除缓存）"""
+        user = db.query(User).get(user_id)
+        if not user:
+            return None
+        user.is_active = 1 if active else 0
+        db.commit()
+        user_cache.invalidate_user(user.username)
+        return user
+
+    async def authenticate_user(self, db: AsyncSession, username: str, password: str) -> Optional[User]:
+        """验证用户身份；哈希 cost 与当前配置不一致时顺带升级哈希"""
+        user = await self.find_user(db, username=username)
+        if not user or user.username != username:
+            return None
+        await release_connection(db)
+        verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not verified:
             return None
+        if new_hash:
+            user.hashed_password = new_hash
+            await db.commit()
         return user
 
 # 创建认证服务实例
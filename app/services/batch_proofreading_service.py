@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import List, Tuple, Dict, Any, Optional, AsyncGenerator
+from sqlalchemy import select, update, delete
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.tracing import tracer
+from app.models.models import Chapter, ProofreadJob, ProofreadJobResult
+from app.services import text_checks
+from app.services.compute_executor import compute_executor
+
+logger = logging.getLogger(__name__)
+
+class BatchProofreadingService:
+    """整本小说的批量校对任务
+
+    规则检查（语法、敏感词、逻辑规则）是纯CPU工作，按批分发到 compute_executor 的进程池执行；
+    数据库读写放在线程池中，事件循环只负责调度与汇总进度。LLM 一致性检查不在批量任务中执行。
+
+    任务状态、进度与逐章结果写入 proofread_jobs / proofread_job_results 表，多 worker 部署时
+    查询与流式接口可以落在任意 worker 上；运行任务的 worker 每完成一批刷新 heartbeat_at，
+    超过 PROOFREAD_JOB_STALE_SECONDS 没有进展（worker 已退出或重启）的任务按失败返回。
+    """
+
+    def __init__(self):
+        # 持有后台任务的引用，避免运行中被回收
+        self._tasks = set()
+
+    async def start_job(self, novel_id: int, start_order: Optional[int] = None, end_order: Optional[int] = None) -> Dict[str, Any]:
+        """创建并在后台启动一个批量校对任务"""
+        now = time.time()
+        job = ProofreadJob(
+            id=uuid.uuid4().hex, novel_id=novel_id, start_order=start_order, end_order=end_order,
+            status="running", completed=0, started_at=now, heartbeat_at=now
+        )
+        status = await asyncio.get_running_loop().run_in_executor(None, self._create, job)
+        # 任务比发起它的请求活得长，不记入请求的 trace
+        task = asyncio.create_task(tracer.detached(self._run(status["job_id"], novel_id, start_order, end_order, now)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return status
+
+    def _create(self, job: ProofreadJob) -> Dict[str, Any]:
+        """写入新任务，顺带清理超过保留期的旧任务"""
+        cutoff = time.time() - settings.PROOFREAD_JOB_RETENTION
+        with SessionLocal() as db:
+            expired = select(ProofreadJob.id).where(ProofreadJob.heartbeat_at < cutoff)
+            db.execute(delete(ProofreadJobResult).where(ProofreadJobResult.job_id.in_(expired)))
+            db.execute(delete(ProofreadJob).where(ProofreadJob.heartbeat_at < cutoff))
+            db.add(job)
+            db.commit()
+            return self._to_status(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务的对外视图，不包含逐章结果；任务不存在时返回 None"""
+        with SessionLocal() as db:
+            job = db.get(ProofreadJob, job_id)
+            return self._to_status(job) if job is not None else None
+
+    def _to_status(self, job: ProofreadJob) -> Dict[str, Any]:
+        status, error = job.status, job.error
+        if status == "running" and time.time() - job.heartbeat_at > settings.PROOFREAD_JOB_STALE_SECONDS:
+            status, error = "failed", "The worker running this job stopped before it finished"
+        return {
+            "job_id": job.id,
+            "novel_id": job.novel_id,
+            "start_order": job.start_order,
+            "end_order": job.end_order,
+            "status": status,
+            "total": job.total,
+            "completed": job.completed,
+            "report": json.loads(job.report) if job.report else None,
+            "report_path": job.report_path,
+            "error": error,
+            "started_at": job.started_at
+        }
+
+    def _update(self, job_id: str, **values):
+        with SessionLocal() as db:
+            db.execute(update(ProofreadJob).where(ProofreadJob.id == job_id).values(heartbeat_at=time.time(), **values))
+            db.commit()
+
+    def _save_results(self, job_id: str, first_seq: int, results: List[Dict[str, Any]]):
+        """写入一批逐章结果并推进进度，同一事务提交"""
+        with SessionLocal() as db:
+            db.add_all([
+                ProofreadJobResult(job_id=job_id, seq=first_seq + i, data=json.dumps(result, ensure_ascii=False))
+                for i, result in enumerate(results)
+            ])
+            db.execute(
+                update(ProofreadJob).where(ProofreadJob.id == job_id)
+                .values(completed=first_seq - 1 + len(results), heartbeat_at=time.time())
+            )
+            db.commit()
+
+    def _poll(self, job_id: str, after_seq: int) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """任务状态与 seq 大于 after_seq 的结果；先读状态，已结束的任务不会漏掉结果"""
+        status = self.get_job(job_id)
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(ProofreadJobResult.data)
+                .where(ProofreadJobResult.job_id == job_id, ProofreadJobResult.seq > after_seq)
+                .order_by(ProofreadJobResult.seq)
+            ).scalars().all()
+        return status, [json.loads(row) for row in rows]
+
+    def _load_chapter_index(self, novel_id: int, start_order: Optional[int], end_order: Optional[int]) -> List[Tuple[int, int, str]]:
+        """只读取章节的 id/order/title，不加载正文"""
+        db = SessionLocal()
+        try:
+            query = db.query(Chapter.id, Chapter.order, Chapter.title).filter(Chapter.novel_id == novel_id)
+            if start_order is not None:
+                query = query.filter(Chapter.order >= start_order)
+            if end_order is not None:
+                query = query.filter(Chapter.order <= end_order)
+            return [tuple(row) for row in query.order_by(Chapter.order).all()]
+        finally:
+            db.close()
+
+    def _load_contents(self, chapter_ids: List[int]) -> List[Tuple[int, str]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Chapter.id, Chapter.content).filter(Chapter.id.in_(chapter_ids)).all()
+            return [(row[0], row[1] or "") for row in rows]
+        finally:
+            db.close()
+
+    async def _run(self, job_id: str, novel_id: int, start_order: Optional[int], end_order: Optional[int], started_at: float):
+        loop = asyncio.get_running_loop()
+        try:
+            index = await loop.run_in_executor(None, self._load_chapter_index, novel_id, start_order, end_order)
+            await loop.run_in_executor(None, lambda: self._update(job_id, total=len(index)))
+            meta = {chapter_id: (order, title) for chapter_id, order, title in index}
+
+            batch_size = max(1, settings.PROOFREAD_BATCH_SIZE)
+            batches = [
+                [chapter_id for chapter_id, _, _ in index[i:i + batch_size]]
+                for i in range(0, len(index), batch_size)
+            ]
+
+            # 控制同时在途的批次数量，避免一次性把整本书读入内存
+            in_flight = asyncio.Semaphore(compute_executor.max_workers * 2)
+
+            async def process(batch: List[int]) -> List[Dict[str, Any]]:
+                async with in_flight:
+                    chapters = await loop.run_in_executor(None, self._load_contents, batch)
+                    return await compute_executor.run(text_checks.summarize_chapters, chapters, inline=False)
+
+            results: List[Dict[str, Any]] = []
+            for next_done in asyncio.as_completed([process(b) for b in batches]):
+                batch_results = await next_done
+                for result in batch_results:
+                    order, title = meta.get(result["chapter_id"], (None, ""))
+                    result["order"] = order
+                    result["title"] = title
+                await loop.run_in_executor(None, self._save_results, job_id, len(results) + 1, batch_results)
+                results.extend(batch_results)
+
+            report = self._build_report(novel_id, results, started_at)
+            report_path = await loop.run_in_executor(None, self._write_report, novel_id, job_id, report)
+            await loop.run_in_executor(None, lambda: self._update(
+                job_id, status="completed", report=json.dumps(report, ensure_ascii=False), report_path=report_path
+            ))
+        except Exception as e:
+            logger.error(f"Batch proofreading job {job_id} failed: {e}")
+            try:
+                await loop.run_in_executor(None, lambda: self._update(job_id, status="failed", error=str(e)))
+            except Exception as update_error:
+                logger.error(f"Failed to record failure of batch proofreading job {job_id}: {update_error}")
+
+    def _build_report(self, novel_id: int, results: List[Dict[str, Any]], started_at: float) -> Dict[str, Any]:
+        """汇总报告：按 rule_id 统计问题数，并列出问题最多的章节"""
+        counts_by_rule: Dict[str, int] = {}
+        for result in results:
+            for rule_id, count in result["counts"].items():
+                counts_by_rule[rule_id] = counts_by_rule.get(rule_id, 0) + count
+
+        worst = sorted(results, key=lambda r: r["error_count"], reverse=True)[:settings.PROOFREAD_WORST_CHAPTERS]
+        elapsed = time.time() - started_at
+        return {
+            "novel_id": novel_id,
+            # 不含 LLM 一致性检查，需要时对单章调用 consistency_check
+            "checks": text_checks.BATCH_CHECKS,
+            "chapter_count": len(results),
+            "total_errors": sum(counts_by_rule.values()),
+            "counts_by_rule": dict(sorted(counts_by_rule.items(), key=lambda kv: kv[1], reverse=True)),
+            "worst_chapters": [
+                {k: r[k] for k in ("chapter_id", "order", "title", "error_count", "counts")}
+                for r in worst if r["error_count"] > 0
+            ],
+            "elapsed": round(elapsed, 3),
+            "chapters_per_minute": round(len(results) / elapsed * 60, 1) if elapsed > 0 else None
+        }
+
+    def _write_report(self, novel_id: int, job_id: str, report: Dict[str, Any]) -> str:
+        os.makedirs(settings.PROOFREAD_REPORT_DIRECTORY, exist_ok=True)
+        path = os.path.join(settings.PROOFREAD_REPORT_DIRECTORY, f"novel_{novel_id}_{job_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+    async def stream_job(self, job_id: str, poll_interval: float = 0.5) -> AsyncGenerator[Dict[str, Any], None]:
+        """按完成顺序产出逐章结果和进度，任务结束时产出最终报告；任务可以在其他 worker 上运行"""
+        loop = asyncio.get_running_loop()
+        cursor = 0
+        while True:
+            job, results = await loop.run_in_executor(None, self._poll, job_id, cursor)
+            if job is None:
+                # 任务在流式读取期间被清理
+                yield {"status": "failed", "report": None, "error": "Job not found"}
+                return
+            finished = job["status"] != "running"
+            cursor += len(results)
+            if results or finished:
+                yield {
+                    "status": job["status"],
+                    "completed": job["completed"],
+                    "total": job["total"],
+                    "results": results
+                }
+            if finished:
+                yield {"status": job["status"], "report": job["report"], "error": job["error"]}
+                return
+            await asyncio.sleep(poll_interval)
+
+batch_proofreading_service = BatchProofreadingService()
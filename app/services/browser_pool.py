@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple, AsyncIterator
+from app.core.config import settings
+from app.core.security import security_manager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _AccountSession:
+    context: Any
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    verified_at: float = 0.0
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+
+class BrowserPool:
+    """常驻的 Chromium 实例 + 按账号复用的浏览器上下文
+
+    - 整个进程只启动一个浏览器，浏览器断开（崩溃）时在下次使用前重新启动；
+    - 每个 (平台, 账号) 一个上下文，登录后的 storage_state（cookie 等）加密保存到磁盘，
+      进程重启后直接恢复登录态；
+    - 距上次确认登录超过 check_interval 时先检查登录态，失效才重新登录；
+    - 每个平台同时进行的发布数不超过 max_per_platform；空闲过久的上下文会被关闭。
+    """
+
+    def __init__(self, session_dir: str, max_per_platform: int = 2, check_interval: int = 300,
+                 idle_timeout: int = 1800, headless: bool = True):
+        self.session_dir = session_dir
+        self.max_per_platform = max(1, max_per_platform)
+        self.check_interval = check_interval
+        self.idle_timeout = idle_timeout
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+        self._sessions: Dict[Tuple[str, str], _AccountSession] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    # --- 登录态持久化 ---
+
+    def _state_path(self, platform: str, username: str) -> str:
+        digest = hashlib.sha256(username.encode()).hexdigest()[:16]
+        return os.path.join(self.session_dir, f"{platform}-{digest}.state")
+
+    def _load_state(self, platform: str, username: str) -> Optional[Dict[str, Any]]:
+        path = self._state_path(platform, username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.loads(security_manager.decrypt(f.read()))
+        except Exception as e:
+            # 密钥变更或文件损坏时当作未登录处理
+            logger.warning(f"Discarding unreadable session state {path}: {e}")
+            return None
+
+    def _write_state(self, platform: str, username: str, state: Dict[str, Any]):
+        os.makedirs(self.session_dir, exist_ok=True)
+        path = self._state_path(platform, username)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(security_manager.encrypt(json.dumps(state)))
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, path)
+
+    async def _save_state(self, platform: str, username: str, context: Any):
+        state = await context.storage_state()
+        # 加密与文件写入在线程中进行，不阻塞事件循环
+        await asyncio.to_thread(self._write_state, platform, username, state)
+
+    def forget(self, platform: str, username: str):
+        """删除账号保存的登录态（如修改密码后）；已打开的上下文下次使用时会重新检查"""
+        path = self._state_path(platform, username)
+        if os.path.exists(path):
+            os.remove(path)
+        self.invalidate(platform, username)
+
+    def invalidate(self, platform: str, username: str):
+        """下次使用该账号的上下文前重新检查登录态"""
+        entry = self._sessions.get((platform, username))
+        if entry is not None:
+            entry.verified_at = 0.0
+
+    # --- 浏览器与上下文 ---
+
+    async def _get_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._browser is not None:
+            logger.warning("Browser disconnected, relaunching")
+        # 旧浏览器的上下文已随之失效
+        self._sessions.clear()
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    async def _close_idle(self):
+        now = time.monotonic()
+        for key, entry in list(self._sessions.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                self._sessions.pop(key, None)
+                try:
+                    await self._save_state(key[0], key[1], entry.context)
+                    await entry.context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close idle browser context: {e}")
+
+    async def _get_session(self, platform: str, username: str) -> _AccountSession:
+        async with self._lock:
+            browser = await self._get_browser()
+            await self._close_idle()
+            entry = self._sessions.get((platform, username))
+            if entry is None:
+                state = await asyncio.to_thread(self._load_state, platform, username)
+                context = await browser.new_context(storage_state=state) if state else await browser.new_context()
+                entry = _AccountSession(context=context)
+                self._sessions[(platform, username)] = entry
+            entry.in_use += 1
+            return entry
+
+    async def _ensure_logged_in(self, entry: _AccountSession, adapter: Any, username: str, password: str):
+        # 同一账号只允许一个协程检查/登录，其余等待结果
+        async with entry.lock:
+            if time.monotonic() - entry.verified_at < self.check_interval:
+                return
+            if not await adapter.is_logged_in(entry.context):
+                logger.info(f"Logging in to {adapter.platform.value} as {username}")
+                if not await adapter.login(username, password, entry.context):
+                    raise ValueError(f"Login failed for platform {adapter.platform.value}")
+                await self._save_state(adapter.platform.value, username, entry.context)
+            entry.verified_at = time.monotonic()
+
+    @asynccontextmanager
+    async def session(self, adapter: Any, username: str, password: str) -> AsyncIterator[Any]:
+        """获取已登录的浏览器上下文；出错时下次使用前会重新检查登录态"""
+        platform = adapter.platform.value
+        semaphore = self._semaphores.setdefault(platform, asyncio.Semaphore(self.max_per_platform))
+        async with semaphore:
+            entry = await self._get_session(platform, username)
+            try:
+                await self._ensure_logged_in(entry, adapter, username, password)
+                yield entry.context
+            except Exception:
+                entry.verified_at = 0.0
+                raise
+            finally:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    async def close(self):
+        async with self._lock:
+            for (platform, username), entry in list(self._sessions.items()):
+                try:
+                    await self._save_state(platform, username, entry.context)
+                    await entry.context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser context: {e}")
+            self._sessions.clear()
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser: {e}")
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+browser_pool = BrowserPool(
+    session_dir=settings.PUBLISH_SESSION_DIR,
+    max_per_platform=settings.PUBLISH_MAX_CONCURRENCY_PER_PLATFORM,
+    check_interval=settings.PUBLISH_SESSION_CHECK_INTERVAL,
+    idle_timeout=settings.PUBLISH_CONTEXT_IDLE_TIMEOUT,
+    headless=settings.PUBLISH_HEADLESS
+)
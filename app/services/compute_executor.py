@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.core.config import settings
+from app.core.metrics import COMPUTE_QUEUE_DEPTH, COMPUTE_TASK_LATENCY, EVENT_LOOP_LAG
+from app.services import text_checks
+
+logger = logging.getLogger(__name__)
+
+class ComputeExecutor:
+    """CPU密集型文本分析的统一执行器
+
+    所有正则扫描、规则检查等纯CPU工作都通过这里提交到进程池，避免阻塞事件循环。
+    工作进程启动时预加载规则与词典（见 text_checks.init_worker），
+    体积小于 COMPUTE_INLINE_THRESHOLD 的输入直接在当前进程执行，省去进程间通信开销。
+    """
+
+    def __init__(self, max_workers: int = 0, inline_threshold: int = 0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.inline_threshold = inline_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lag_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未完成的任务数"""
+        return self._pending
+
+    def _worker_config(self) -> tuple:
+        return (
+            settings.CONSISTENCY_RULES_PATH or None,
+            settings.CONSISTENCY_RULE_WINDOW,
+            settings.CONSISTENCY_RULE_MAX_DISTANCE
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=text_checks.init_worker,
+                initargs=self._worker_config()
+            )
+        return self._pool
+
+    def _run_inline(self, fn: Callable, *args) -> Any:
+        text_checks.init_worker(*self._worker_config())
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            COMPUTE_TASK_LATENCY.labels(task=getattr(fn, "__name__", "task"), mode="inline").observe(time.perf_counter() - start)
+
+    async def run(self, fn: Callable, *args, size: int = 0, inline: Optional[bool] = None) -> Any:
+        """执行CPU任务
+
+        :param size: 输入规模（通常为字符数），用于决定是否走进程池
+        :param inline: 显式指定是否在当前进程执行
+        """
+        if inline is None:
+            inline = size < self.inline_threshold
+        if inline:
+            return self._run_inline(fn, *args)
+
+        task_name = getattr(fn, "__name__", "task")
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        COMPUTE_QUEUE_DEPTH.inc()
+        try:
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+            COMPUTE_QUEUE_DEPTH.dec()
+            COMPUTE_TASK_LATENCY.labels(task=task_name, mode="process").observe(time.perf_counter() - start)
+
+    def run_sync(self, fn: Callable, *args, size: int = 0) -> Any:
+        """在事件循环之外的线程中（同步接口、脚本）执行CPU任务并等待结果"""
+        if size < self.inline_threshold:
+            return self._run_inline(fn, *args)
+
+        task_name = getattr(fn, "__name__", "task")
+        start = time.perf_counter()
+        self._pending += 1
+        COMPUTE_QUEUE_DEPTH.inc()
+        try:
+            return self._get_pool().submit(fn, *args).result()
+        finally:
+            self._pending -= 1
+            COMPUTE_QUEUE_DEPTH.dec()
+            COMPUTE_TASK_LATENCY.labels(task=task_name, mode="process").observe(time.perf_counter() - start)
+
+    async def warm_up(self):
+        """启动所有工作进程并完成预加载，避免首个请求承担进程启动开销"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*[
+            loop.run_in_executor(pool, text_checks.ping) for _ in range(self.max_workers)
+        ])
+
+    async def _monitor_event_loop_lag(self, interval: float):
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - expected))
+
+    def start_lag_monitor(self, interval: float = 0.5):
+        """周期性采样事件循环延迟"""
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._monitor_event_loop_lag(interval))
+
+    def shutdown(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+compute_executor = ComputeExecutor(
+    max_workers=settings.COMPUTE_WORKERS,
+    inline_threshold=settings.COMPUTE_INLINE_THRESHOLD
+)
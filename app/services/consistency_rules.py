@@ -0,0 +1,120 @@
+import json
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+# 默认规则集位置，可通过 settings.CONSISTENCY_RULES_PATH 覆盖
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "data", "consistency_rules.json")
+
+# 句子结束符与段落结束符
+SENTENCE_DELIMITERS = "。！？!?；;…"
+PARAGRAPH_DELIMITER = "\n"
+
+
+class ConsistencyRuleEngine:
+    """基于有界窗口的共现规则引擎
+
+    旧实现对每条规则执行一次 `A.*?B` 的全文扫描，长章节上代价超线性，
+    且会把相隔上千字的两个词判定为矛盾。这里改为：
+    1. 一次扫描完成分句/分段；
+    2. 用一个合并后的正则一次性扫描出所有规则词的位置列表；
+    3. 每条规则在位置列表上用双指针匹配，只在窗口内判定共现。
+    整体复杂度为 O(文本长度 + 命中词数)。
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], window: int = 2, max_distance: int = 200):
+        """
+        :param rules: 规则列表，每条规则包含 first/second/type/rule_id/message/suggestion
+        :param window: 允许跨越的句子数（1 表示必须在同一句内）
+        :param max_distance: 两个词之间允许的最大字符距离
+        """
+        self.rules = [r for r in rules if r.get("first") and r.get("second")]
+        self.window = max(1, window)
+        self.max_distance = max_distance
+
+        terms = {r["first"] for r in self.rules} | {r["second"] for r in self.rules}
+        # 长词优先，避免短词抢先匹配
+        ordered = sorted(terms, key=len, reverse=True)
+        self._token_pattern = re.compile("|".join(re.escape(t) for t in ordered)) if ordered else None
+        self._boundary_pattern = re.compile(
+            "[" + re.escape(SENTENCE_DELIMITERS) + re.escape(PARAGRAPH_DELIMITER) + "]"
+        )
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None, **kwargs) -> "ConsistencyRuleEngine":
+        """从 JSON 规则文件加载规则集"""
+        with open(path or DEFAULT_RULES_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        rules = data.get("rules", []) if isinstance(data, dict) else data
+        return cls(rules, **kwargs)
+
+    def segment(self, text: str) -> Tuple[List[int], List[int]]:
+        """分句，返回每个句子的结束位置及其所属段落编号"""
+        sentence_ends = []
+        paragraph_ids = []
+        paragraph = 0
+        for m in self._boundary_pattern.finditer(text):
+            sentence_ends.append(m.end())
+            paragraph_ids.append(paragraph)
+            if m.group() == PARAGRAPH_DELIMITER:
+                paragraph += 1
+        # 最后一个句子可能没有结束符
+        sentence_ends.append(len(text) + 1)
+        paragraph_ids.append(paragraph)
+        return sentence_ends, paragraph_ids
+
+    def scan(self, text: str) -> Dict[str, List[Tuple[int, int, int, int]]]:
+        """单次扫描所有规则词，返回 词 -> [(start, end, 句子编号, 段落编号)]"""
+        positions: Dict[str, List[Tuple[int, int, int, int]]] = {}
+        if self._token_pattern is None or not text:
+            return positions
+
+        sentence_ends, paragraph_ids = self.segment(text)
+        sentence = 0
+        for m in self._token_pattern.finditer(text):
+            start = m.start()
+            # 命中位置单调递增，句子指针只需前移
+            while sentence_ends[sentence] <= start:
+                sentence += 1
+            positions.setdefault(m.group(), []).append(
+                (start, m.end(), sentence, paragraph_ids[sentence])
+            )
+        return positions
+
+    def check(self, text: str) -> List[Dict[str, Any]]:
+        """在窗口内评估所有共现规则"""
+        positions = self.scan(text)
+        issues = []
+        for rule in self.rules:
+            firsts = positions.get(rule["first"])
+            seconds = positions.get(rule["second"])
+            if not firsts or not seconds:
+                continue
+
+            j = 0
+            last_end = -1
+            for start, end, sentence, paragraph in firsts:
+                if start < last_end:
+                    continue
+                # 找到第一个位于当前词之后的 second，指针只前移，保证线性
+                while j < len(seconds) and seconds[j][0] < end:
+                    j += 1
+                if j == len(seconds):
+                    break
+                s_start, s_end, s_sentence, s_paragraph = seconds[j]
+                if s_paragraph != paragraph:
+                    continue
+                if s_sentence - sentence >= self.window:
+                    continue
+                if s_end - start > self.max_distance:
+                    continue
+                issues.append({
+                    "type": rule.get("type", rule.get("rule_id", "logic_error")),
+                    "start": start,
+                    "end": s_end,
+                    "message": rule.get("message", ""),
+                    "suggestion": rule.get("suggestion", ""),
+                    "rule_id": rule.get("rule_id", rule.get("type", "logic_error"))
+                })
+                last_end = s_end
+        return issues
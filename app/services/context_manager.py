@@ -1,32 +1,67 @@
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from app.core.config import settings
+from app.core.tracing import tracer
 import os
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 class ContextManager:
     def __init__(self):
+        # 向量化客户端与 Chroma（chromadb）在首次使用或启动预热时才创建/导入
+        self.persist_directory = settings.CHROMA_PERSIST_DIRECTORY
+        self._embeddings = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _build_embeddings(self):
         # Ensure directory exists
-        if not os.path.exists(settings.CHROMA_PERSIST_DIRECTORY):
-            os.makedirs(settings.CHROMA_PERSIST_DIRECTORY)
+        if not os.path.exists(self.persist_directory):
+            os.makedirs(self.persist_directory)
         
         try:
-            self.embeddings = OpenAIEmbeddings(
-                api_key=settings.OPENAI_API_KEY,
-                model="text-embedding-3-small"
-            )
+            from app.services.traced_embeddings import TracedEmbeddings
+            if settings.LLM_BACKEND == "fake":
+                from app.services.fake_llm import FakeEmbeddings
+                embeddings = FakeEmbeddings(latency=settings.FAKE_EMBEDDING_LATENCY)
+            else:
+                from langchain_openai import OpenAIEmbeddings
+                embeddings = OpenAIEmbeddings(
+                    api_key=settings.OPENAI_API_KEY,
+                    model="text-embedding-3-small"
+                )
+            return TracedEmbeddings(embeddings)
         except Exception as e:
             logger.error(f"Failed to initialize OpenAIEmbeddings: {e}")
-            self.embeddings = None
-        
-        self.persist_directory = settings.CHROMA_PERSIST_DIRECTORY
+            return None
+
+    @property
+    def embeddings(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._embeddings = self._build_embeddings()
+                    self._initialized = True
+        return self._embeddings
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self._embeddings = value
+        self._initialized = True
+
+    def warm_up(self):
+        """创建向量化客户端并导入 chromadb（在启动预热线程中调用）"""
+        if self.embeddings:
+            from langchain_community.vectorstores import Chroma
+            import chromadb
+            # 同一目录的客户端在 chromadb 内部共享，之后创建 Chroma 只需几毫秒
+            chromadb.PersistentClient(path=self.persist_directory)
         
     def get_vectorstore(self, collection_name: str):
         if not self.embeddings:
             raise ValueError("Embeddings not initialized")
         
+        from langchain_community.vectorstores import Chroma
         return Chroma(
             collection_name=collection_name,
             embedding_function=self.embeddings,
@@ -40,11 +75,12 @@ class ContextManager:
         
         collection_name = f"novel_{novel_id}"
         try:
-            vectorstore = self.get_vectorstore(collection_name)
-            vectorstore.add_texts(
-                texts=[summary],
-                metadatas=[{"chapter_id": chapter_id, "type": "summary"}]
-            )
+            with tracer.span("vector.add", collection=collection_name):
+                vectorstore = self.get_vectorstore(collection_name)
+                vectorstore.add_texts(
+                    texts=[summary],
+                    metadatas=[{"chapter_id": chapter_id, "type": "summary"}]
+                )
         except Exception as e:
             logger.error(f"Error adding chapter summary: {e}")
         
@@ -56,8 +92,9 @@ class ContextManager:
         
         collection_name = f"novel_{novel_id}"
         try:
-            vectorstore = self.get_vectorstore(collection_name)
-            docs = vectorstore.similarity_search(query, k=k)
+            with tracer.span("vector.search", collection=collection_name, k=k):
+                vectorstore = self.get_vectorstore(collection_name)
+                docs = vectorstore.similarity_search(query, k=k)
             return "\n".join([d.page_content for d in docs])
         except Exception as e:
             # Handle case where collection doesn't exist yet or API call fails
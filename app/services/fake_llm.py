@@ -0,0 +1,131 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+# 生成文本用的词表：输出只由 prompt 与 seed 决定
+_VOCABULARY = [
+    "他", "她", "缓缓", "抬起头", "望向", "远处的", "山峦", "，", "心中", "涌起", "一阵", "说不清的",
+    "情绪", "。", "风", "从", "窗外", "吹来", "灯火", "摇曳", "脚步声", "渐渐", "近了", "「", "」",
+    "这一次", "无论如何", "都不能", "再", "退缩", "长剑", "出鞘", "寒光", "一闪", "城门", "之外",
+    "夜色", "深沉", "众人", "面面相觑", "沉默", "良久", "终于", "开口", "道", "命运", "之", "轮",
+]
+
+
+class FakeLLMError(RuntimeError):
+    """按 error_rate 注入的模拟接口错误"""
+
+
+def _rng(*parts: Any) -> random.Random:
+    digest = hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+class FakeChatModel(BaseChatModel):
+    """确定性的模拟聊天模型，用于压测与本地开发，不调用任何外部接口
+
+    - 相同的 prompt 与 seed 总是得到相同的输出；要求 JSON 的一致性检查 prompt 返回合法的 issues 结构；
+    - ttft 秒后输出第一个 token，之后按 tokens_per_second 逐个输出；
+    - 按 error_rate 在首个 token 之前抛出 FakeLLMError（同一进程内的错误序列也由 seed 决定）；
+    - 流式输出的最后一段附带 usage_metadata，与 ChatOpenAI(stream_usage=True) 一致。
+    """
+
+    model_name: str = "fake"
+    ttft: float = 0.3
+    tokens_per_second: float = 50.0
+    output_tokens: int = 200
+    error_rate: float = 0.0
+    seed: int = 0
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt_text(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self._calls += 1
+            call = self._calls
+        return self.error_rate > 0 and _rng(self.seed, "error", call).random() < self.error_rate
+
+    def _tokens(self, prompt: str) -> List[str]:
+        rng = _rng(self.seed, prompt)
+        if '"issues"' in prompt and "JSON" in prompt:
+            # 一致性检查：输出可被 JsonOutputParser 解析的结果，按字符切分模拟流式
+            body = json.dumps({"issues": [], "overall_score": rng.randint(70, 100)}, ensure_ascii=False)
+            return [body[i:i + 4] for i in range(0, len(body), 4)]
+        return [rng.choice(_VOCABULARY) for _ in range(self.output_tokens)]
+
+    def _usage(self, prompt: str, completion_tokens: int) -> dict:
+        # 中文约 1 字 1 token
+        return {"input_tokens": len(prompt), "output_tokens": completion_tokens, "total_tokens": len(prompt) + completion_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        chunks = list(self._stream(messages, stop, run_manager, **kwargs))
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt_text(messages)
+        tokens = self._tokens(prompt)
+        time.sleep(self.ttft)
+        if self._should_fail():
+            raise FakeLLMError("Simulated LLM backend error")
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, len(tokens))))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = self._prompt_text(messages)
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.ttft)
+        if self._should_fail():
+            raise FakeLLMError("Simulated LLM backend error")
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, len(tokens))))
+
+
+class FakeEmbeddings(Embeddings):
+    """确定性的模拟向量化：向量由文本哈希生成并归一化，每次调用耗时 latency 秒"""
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        rng = _rng("embedding", text)
+        vector = [rng.gauss(0, 1) for _ in range(self.size)]
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
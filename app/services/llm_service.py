@@ -1,25 +1,72 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import PromptTemplate
 from app.core.config import settings
-from app.services.prompts import OUTLINE_PROMPT, CHAPTER_PROMPT, SUMMARY_PROMPT, CONTINUE_PROMPT, IMPROVE_PROMPT, EXPAND_PROMPT
+from app.services import prompts
 from app.services.prompt_manager import prompt_manager
+from app.services.llm_telemetry import llm_telemetry
 from cachetools import TTLCache
 import hashlib
 import asyncio
-from typing import AsyncGenerator
+import threading
+from contextlib import aclosing
+from functools import cached_property
+from typing import Any, AsyncGenerator, Dict, Optional
 
 class LLMService:
     def __init__(self):
-        self.llm = ChatOpenAI(
+        # 模型客户端在首次使用（或启动预热）时才创建：导入 langchain_openai 需要一秒以上
+        self._llm = None
+        self._llm_lock = threading.Lock()
+        # 创建一个TTL缓存，最大1000个条目，过期时间3600秒（1小时）
+        self.cache = TTLCache(maxsize=1000, ttl=3600)
+
+    def _build_llm(self) -> Any:
+        if settings.LLM_BACKEND == "fake":
+            # 离线的确定性模型，用于压测
+            from app.services.fake_llm import FakeChatModel
+            return FakeChatModel(
+                ttft=settings.FAKE_LLM_TTFT,
+                tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+                output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+                error_rate=settings.FAKE_LLM_ERROR_RATE,
+                seed=settings.FAKE_LLM_SEED
+            )
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
             model=settings.OPENAI_MODEL,
             api_key=settings.OPENAI_API_KEY,
             temperature=0.7,
-            streaming=True
+            streaming=True,
+            # 流式响应末尾附带 token 用量，供 llm_telemetry 统计
+            stream_usage=True
         )
-        self.output_parser = StrOutputParser()
-        # 创建一个TTL缓存，最大1000个条目，过期时间3600秒（1小时）
-        self.cache = TTLCache(maxsize=1000, ttl=3600)
+
+    @property
+    def llm(self) -> Any:
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = self._build_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, value: Any):
+        self._llm = value
+
+    @property
+    def model_name(self) -> str:
+        """实际使用的模型名（假模型为 fake），而不是配置中的 OPENAI_MODEL"""
+        llm = self.llm
+        return getattr(llm, "model_name", None) or getattr(llm, "model", None) or settings.OPENAI_MODEL
+
+    @cached_property
+    def output_parser(self):
+        from langchain_core.output_parsers import StrOutputParser
+        return StrOutputParser()
+
+    def warm_up(self):
+        """创建模型客户端，并导入 prompt 模板与输出解析器（在启动预热线程中调用）"""
+        prompts.CHAPTER_PROMPT
+        self.output_parser
+        return self.llm
 
     def _get_cache_key(self, func_name: str, **kwargs) -> str:
         # 生成缓存键，基于函数名和参数的哈希值
@@ -27,44 +74,45 @@ class LLMService:
         key_str = f"{func_name}:{str(sorted_kwargs)}"
         return hashlib.md5(key_str.encode()).hexdigest()
 
-    async def generate_outline(self, title: str, genre: str, style: str, synopsis: str) -> str:
+    async def _generate(self, task: str, input_data: Dict[str, Any], stats: Optional[Dict[str, Any]] = None) -> str:
+        """用注册表选出的 prompt 版本生成，并把耗时、token 与费用记入该版本"""
+        variant = await prompt_manager.select(task)
+        if stats is not None:
+            stats["prompt_version"] = variant.version
+        call: Dict[str, Any] = {}
+        try:
+            message = await llm_telemetry.ainvoke(task, variant.template, self.llm, input_data, stats=call)
+        finally:
+            await prompt_manager.record_call(variant, call)
+        return self.output_parser.invoke(message)
+
+    async def generate_outline(self, title: str, genre: str, style: str, synopsis: str, stats: Optional[Dict[str, Any]] = None) -> str:
         cache_key = self._get_cache_key("generate_outline", title=title, genre=genre, style=style, synopsis=synopsis)
         
         if cache_key in self.cache:
+            llm_telemetry.record_cache_hit("outline", self.model_name)
             return self.cache[cache_key]
         
-        # 使用PromptManager获取最佳模板
-        template = prompt_manager.get_best_template("outline")
-        
-        # 准备上下文
         context = {
             "title": title,
             "genre": genre,
             "style": style,
             "synopsis": synopsis
         }
-        
-        # 生成动态Prompt
-        dynamic_prompt = prompt_manager.generate_dynamic_prompt("outline", context)
-        
-        # 使用动态Prompt创建chain
-        chain = template | self.llm | self.output_parser
-        result = await chain.ainvoke(context)
+        result = await self._generate("outline", context, stats)
         
         self.cache[cache_key] = result
         return result
 
-    async def generate_chapter(self, title: str, style: str, chapter_order: int, chapter_title: str, context: str, chapter_outline: str, world_bible: str = "") -> str:
+    async def generate_chapter(self, title: str, style: str, chapter_order: int, chapter_title: str, context: str, chapter_outline: str, world_bible: str = "", stats: Optional[Dict[str, Any]] = None) -> str:
+        """stats 传入时写入所用的 prompt 版本（prompt_version），缓存命中时不写入"""
         cache_key = self._get_cache_key("generate_chapter", title=title, style=style, chapter_order=chapter_order, 
                                      chapter_title=chapter_title, context=context, chapter_outline=chapter_outline, world_bible=world_bible)
         
         if cache_key in self.cache:
+            llm_telemetry.record_cache_hit("chapter", self.model_name)
             return self.cache[cache_key]
         
-        # 使用PromptManager获取最佳模板
-        template = prompt_manager.get_best_template("chapter")
-        
-        # 准备上下文
         context_data = {
             "title": title,
             "style": style,
@@ -74,48 +122,30 @@ class LLMService:
             "chapter_outline": chapter_outline,
             "world_bible": world_bible
         }
-        
-        # 生成动态Prompt
-        dynamic_prompt = prompt_manager.generate_dynamic_prompt("chapter", context_data)
-        
-        # 使用动态Prompt创建chain
-        chain = template | self.llm | self.output_parser
-        result = await chain.ainvoke(context_data)
+        result = await self._generate("chapter", context_data, stats)
         
         self.cache[cache_key] = result
         return result
 
-    async def generate_summary(self, content: str) -> str:
+    async def generate_summary(self, content: str, stats: Optional[Dict[str, Any]] = None) -> str:
         cache_key = self._get_cache_key("generate_summary", content=content)
         
         if cache_key in self.cache:
+            llm_telemetry.record_cache_hit("summary", self.model_name)
             return self.cache[cache_key]
         
-        # 使用PromptManager获取最佳模板
-        template = prompt_manager.get_best_template("summary")
-        
-        # 准备上下文
-        context = {
-            "content": content
-        }
-        
-        # 生成动态Prompt
-        dynamic_prompt = prompt_manager.generate_dynamic_prompt("summary", context)
-        
-        # 使用动态Prompt创建chain
-        chain = template | self.llm | self.output_parser
-        result = await chain.ainvoke(context)
+        result = await self._generate("summary", {"content": content}, stats)
         
         self.cache[cache_key] = result
         return result
     
-    def evaluate_template(self, template_type: str, score: float, feedback: str = None):
-        """评估模板并记录反馈"""
-        prompt_manager.evaluate_template(template_type, score, feedback)
+    async def evaluate_template(self, template_type: str, version: str, score: float, feedback: str = None, chapter_id: int = None) -> bool:
+        """为某个 prompt 版本记录 0-1 的质量评分"""
+        return await prompt_manager.evaluate_template(template_type, version, score, feedback, chapter_id)
     
-    def get_template_evaluation(self, template_type: str) -> dict:
-        """获取模板评估数据"""
-        return prompt_manager.get_template_evaluation(template_type)
+    async def get_template_evaluation(self, template_type: str) -> dict:
+        """获取各 prompt 版本的评估数据"""
+        return await prompt_manager.get_template_evaluation(template_type)
 
     async def stream_continue_chapter(
         self, 
@@ -137,9 +167,7 @@ class LLMService:
         }
         
         # 使用 CONTINUE_PROMPT
-        chain = CONTINUE_PROMPT | self.llm | self.output_parser
-        
-        async for chunk in chain.astream(context_data):
+        async for chunk in llm_telemetry.astream("continue", prompts.CONTINUE_PROMPT, self.llm, context_data):
             yield chunk
 
     async def stream_improve_text(
@@ -154,8 +182,7 @@ class LLMService:
             "style": style,
             "content": content
         }
-        chain = IMPROVE_PROMPT | self.llm | self.output_parser
-        async for chunk in chain.astream(context_data):
+        async for chunk in llm_telemetry.astream("improve", prompts.IMPROVE_PROMPT, self.llm, context_data):
             yield chunk
 
     async def stream_expand_text(
@@ -170,8 +197,7 @@ class LLMService:
             "style": style,
             "content": content
         }
-        chain = EXPAND_PROMPT | self.llm | self.output_parser
-        async for chunk in chain.astream(context_data):
+        async for chunk in llm_telemetry.astream("expand", prompts.EXPAND_PROMPT, self.llm, context_data):
             yield chunk
 
     async def stream_generate_chapter(
@@ -182,9 +208,16 @@ class LLMService:
         chapter_title: str, 
         context: str, 
         chapter_outline: str, 
-        world_bible: str = ""
+        world_bible: str = "",
+        stats: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
-        """流式生成章节"""
+        """流式生成章节，与 generate_chapter 一样由注册表选择 prompt 版本
+
+        stats 传入时在产出第一段文本之前写入所用的版本（prompt_version）。
+        """
+        variant = await prompt_manager.select("chapter")
+        if stats is not None:
+            stats["prompt_version"] = variant.version
         context_data = {
             "title": title,
             "style": style,
@@ -194,8 +227,15 @@ class LLMService:
             "chapter_outline": chapter_outline,
             "world_bible": world_bible
         }
-        chain = CHAPTER_PROMPT | self.llm | self.output_parser
-        async for chunk in chain.astream(context_data):
-            yield chunk
+        call: Dict[str, Any] = {}
+        try:
+            # 显式关闭内层流，客户端断开时 call 也在记录之前写好
+            async with aclosing(llm_telemetry.astream("chapter", variant.template, self.llm, context_data, stats=call)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            # 客户端中途断开不代表该版本出错，不计入统计
+            if call.get("error") != "cancelled":
+                await prompt_manager.record_call(variant, call)
 
 llm_service = LLMService()
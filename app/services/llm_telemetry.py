@@ -0,0 +1,216 @@
+import json
+import time
+import logging
+from typing import Any, AsyncGenerator, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import (
+    LLM_CALLS, LLM_TTFT, LLM_LATENCY, LLM_INTER_TOKEN, LLM_TOKENS_PER_SECOND, LLM_TOKENS, LLM_COST
+)
+from app.core.request_context import current_request
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 每次调用一行 JSON；配置 LLM_TELEMETRY_LOG 后写入该文件
+call_log = logging.getLogger("app.llm_calls")
+
+
+def _configure_call_log():
+    if not settings.LLM_TELEMETRY_LOG or call_log.handlers:
+        return
+    handler = logging.FileHandler(settings.LLM_TELEMETRY_LOG, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    call_log.addHandler(handler)
+    call_log.setLevel(logging.INFO)
+    call_log.propagate = False
+
+
+class LLMCall:
+    """单次 LLM 调用的计时与用量"""
+
+    def __init__(self, operation: str, model: str):
+        self.operation = operation
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.last_token: Optional[float] = None
+        self.chunks = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.estimated = False
+        self.cache_hit = False
+        self.error: Optional[str] = None
+        # 请求内的调用同时记录为 llm.<operation> 阶段
+        self.span = tracer.start_span(f"llm.{operation}", **{"gen_ai.request.model": model})
+
+    def on_chunk(self, chunk: Any):
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens = (self.prompt_tokens or 0) + usage.get("input_tokens", 0)
+            self.completion_tokens = (self.completion_tokens or 0) + usage.get("output_tokens", 0)
+        if getattr(chunk, "content", None):
+            now = time.perf_counter()
+            if self.first_token is None:
+                self.first_token = now
+            self.last_token = now
+            self.chunks += 1
+
+
+class LLMTelemetry:
+    """包装 LLM 调用，记录首 token 时间、总耗时、token 间隔、token 用量与费用估算
+
+    非流式调用在内部同样使用 astream 并合并分片，因此也能得到首 token 时间。
+    指标按 operation（outline/chapter/summary/continue/improve/expand/consistency）打标签；
+    每次调用另写一行 JSON 日志，带上所属请求的 request_id，便于按请求汇总。
+    """
+
+    def __init__(self, prices: Dict[str, Any]):
+        self.prices = prices
+
+    def _model_name(self, llm: Any) -> str:
+        return getattr(llm, "model_name", None) or getattr(llm, "model", None) or settings.OPENAI_MODEL
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        price = self.prices.get(model)
+        if not price:
+            return None
+        return prompt_tokens / 1000 * price[0] + completion_tokens / 1000 * price[1]
+
+    async def ainvoke(self, operation: str, prompt: Any, llm: Any, input_data: Dict[str, Any], stats: Optional[Dict[str, Any]] = None) -> Any:
+        """调用 prompt | llm，返回合并后的消息
+
+        传入 stats 时写入本次调用的记录（耗时、token 用量、费用、错误），调用失败时同样写入。
+        """
+        call = LLMCall(operation, self._model_name(llm))
+        message = None
+        try:
+            async for chunk in (prompt | llm).astream(input_data):
+                call.on_chunk(chunk)
+                message = chunk if message is None else message + chunk
+            return message
+        except BaseException as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            record = self._finish(call, prompt, input_data, message.content if message is not None else "")
+            if stats is not None:
+                stats.update(record)
+
+    async def astream(self, operation: str, prompt: Any, llm: Any, input_data: Dict[str, Any], stats: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """流式调用 prompt | llm，逐段产出文本；stats 的含义同 ainvoke，在流结束或关闭时写入"""
+        call = LLMCall(operation, self._model_name(llm))
+        parts = []
+        try:
+            async for chunk in (prompt | llm).astream(input_data):
+                call.on_chunk(chunk)
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except GeneratorExit:
+            # 客户端断开，流被提前关闭
+            call.error = "cancelled"
+            raise
+        except BaseException as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            record = self._finish(call, prompt, input_data, "".join(parts))
+            if stats is not None:
+                stats.update(record)
+
+    def record_cache_hit(self, operation: str, model: Optional[str] = None):
+        call = LLMCall(operation, model or settings.OPENAI_MODEL)
+        call.cache_hit = True
+        # 缓存命中不作为阶段记录
+        call.span = None
+        self._finish(call)
+
+    def _estimate_usage(self, call: LLMCall, prompt: Any, input_data: Dict[str, Any], output: str):
+        """接口未返回用量时按字符数粗略估算（中文约 1 字 1 token）"""
+        call.estimated = True
+        if call.prompt_tokens is None:
+            try:
+                call.prompt_tokens = len(prompt.invoke(input_data).to_string())
+            except Exception:
+                call.prompt_tokens = sum(len(str(v)) for v in input_data.values())
+        if call.completion_tokens is None:
+            call.completion_tokens = len(output)
+
+    def _finish(self, call: LLMCall, prompt: Any = None, input_data: Optional[Dict[str, Any]] = None, output: str = "") -> Dict[str, Any]:
+        end = time.perf_counter()
+        op = call.operation
+        if call.cache_hit:
+            result = "cache_hit"
+        elif call.error:
+            result = "error"
+        else:
+            result = "ok"
+        LLM_CALLS.labels(operation=op, model=call.model, result=result).inc()
+
+        record: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "operation": op,
+            "model": call.model,
+            "result": result,
+            "cache_hit": call.cache_hit,
+            **current_request()
+        }
+        if not call.cache_hit:
+            if (call.prompt_tokens is None or call.completion_tokens is None) and prompt is not None:
+                self._estimate_usage(call, prompt, input_data or {}, output)
+            prompt_tokens = call.prompt_tokens or 0
+            completion_tokens = call.completion_tokens or 0
+            latency = end - call.started
+            ttft = call.first_token - call.started if call.first_token is not None else None
+            inter_token = None
+            tokens_per_second = None
+            if call.first_token is not None and call.chunks > 1:
+                generating = call.last_token - call.first_token
+                inter_token = generating / (call.chunks - 1)
+                if generating > 0:
+                    tokens_per_second = completion_tokens / generating
+            cost = self.cost(call.model, prompt_tokens, completion_tokens)
+
+            LLM_LATENCY.labels(operation=op).observe(latency)
+            if ttft is not None:
+                LLM_TTFT.labels(operation=op).observe(ttft)
+            if inter_token is not None:
+                LLM_INTER_TOKEN.labels(operation=op).observe(inter_token)
+            if tokens_per_second is not None:
+                LLM_TOKENS_PER_SECOND.labels(operation=op).observe(tokens_per_second)
+            LLM_TOKENS.labels(operation=op, kind="prompt").observe(prompt_tokens)
+            LLM_TOKENS.labels(operation=op, kind="completion").observe(completion_tokens)
+            if cost is not None:
+                LLM_COST.labels(operation=op, model=call.model).inc(cost)
+
+            record.update({
+                "latency": round(latency, 4),
+                "ttft": round(ttft, 4) if ttft is not None else None,
+                "inter_token": round(inter_token, 5) if inter_token is not None else None,
+                "tokens_per_second": round(tokens_per_second, 1) if tokens_per_second is not None else None,
+                "chunks": call.chunks,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "usage_estimated": call.estimated,
+                "cost_usd": round(cost, 6) if cost is not None else None,
+                "error": call.error
+            })
+
+        if call.span is not None:
+            call.span.attributes.update({
+                "gen_ai.usage.input_tokens": record.get("prompt_tokens"),
+                "gen_ai.usage.output_tokens": record.get("completion_tokens"),
+                "ttft_ms": round(record["ttft"] * 1000, 1) if record.get("ttft") is not None else None
+            })
+            if call.error:
+                call.span.status = "ERROR"
+                call.span.attributes["error.type"] = call.error
+            call.span.finish()
+
+        _configure_call_log()
+        if call_log.handlers:
+            call_log.info(json.dumps(record, ensure_ascii=False))
+        return record
+
+
+llm_telemetry = LLMTelemetry(prices=settings.LLM_PRICES)
@@ -1,14 +1,18 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.models import Novel, Chapter, NovelStatus, ChapterStatus
 from app.services.llm_service import llm_service
 from app.services.context_manager import context_manager
+from app.core.database import release_connection
+from app.core.tracing import tracer
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
 class NovelService:
-    async def create_novel(self, db: Session, title: str, genre: str, style: str, synopsis: str, author_id: int = None):
+    async def create_novel(self, db: AsyncSession, title: str, genre: str, style: str, synopsis: str, author_id: int = None):
         # 1. Create DB entry
         db_novel = Novel(
             title=title,
@@ -16,11 +20,13 @@ class NovelService:
             style=style,
             synopsis=synopsis,
             author_id=author_id,
-            status=NovelStatus.PLANNING
+            status=NovelStatus.PLANNING,
+            outline=None
         )
         db.add(db_novel)
-        db.commit()
-        db.refresh(db_novel)
+        await db.commit()
+        # 异步会话不能懒加载，显式取回服务端生成的列
+        await db.refresh(db_novel, attribute_names=["created_at", "updated_at"])
         
         # 2. Generate Outline (In real app, this should be a background task)
         # For MVP, we do it here but maybe just store the request to generate later?
@@ -28,10 +34,12 @@ class NovelService:
         # Let's keep it simple: return the novel object, let the API trigger generation.
         return db_novel
 
-    async def generate_novel_outline(self, db: Session, novel_id: int):
-        novel = db.query(Novel).filter(Novel.id == novel_id).first()
+    async def generate_novel_outline(self, db: AsyncSession, novel_id: int):
+        novel = await db.get(Novel, novel_id)
         if not novel:
             raise ValueError("Novel not found")
+        # 生成大纲可能耗时数十秒，期间不占用数据库连接
+        await release_connection(db)
             
         try:
             outline = await llm_service.generate_outline(
@@ -42,34 +50,45 @@ class NovelService:
             )
             
             novel.outline = outline
-            db.commit()
-            db.refresh(novel)
+            await db.commit()
             
             return outline
         except Exception as e:
             logger.error(f"Error generating novel outline: {e}")
             raise Exception(f"Failed to generate novel outline: {str(e)}")
 
-    async def create_chapter(self, db: Session, novel_id: int, title: str, order: int, outline_snippet: str):
+    @tracer.traced("novel.create_chapter")
+    async def create_chapter(self, db: AsyncSession, novel_id: int, title: str, order: int, outline_snippet: str):
+        # 生成所需的数据在调用 LLM 之前一次性加载
+        novel = (await db.execute(
+            select(Novel).where(Novel.id == novel_id).options(
+                selectinload(Novel.characters),
+                selectinload(Novel.locations),
+                selectinload(Novel.world_settings)
+            )
+        )).scalar_one()
+
         db_chapter = Chapter(
             novel_id=novel_id,
             title=title,
             order=order,
             status=ChapterStatus.DRAFT,
-            content="" # Empty initially
+            content="", # Empty initially
+            summary=None
         )
         db.add(db_chapter)
-        db.commit()
-        db.refresh(db_chapter)
+        await db.commit()
+        await db.refresh(db_chapter, attribute_names=["created_at", "updated_at"])
+        # 两次 LLM 调用期间不占用数据库连接，生成结果在最后一次短事务中写入
+        await release_connection(db)
         
         # Trigger generation - but handle failures gracefully
         try:
-            novel = db.query(Novel).filter(Novel.id == novel_id).first()
-            
             # Context retrieval
             # Query using outline snippet + title to find relevant previous parts
             query = f"{title} {outline_snippet}"
-            context = await context_manager.query_context(novel_id, query)
+            with tracer.span("context.retrieval"):
+                context = await context_manager.query_context(novel_id, query)
             if not context:
                 context = "暂无前情提要。"
             
@@ -87,6 +106,7 @@ class NovelService:
                 world_bible += "【世界设定】\n" + "\n".join([f"- {s.concept} ({s.category}): {s.description}" for s in world_settings])
             
             try:
+                generation = {}
                 content = await llm_service.generate_chapter(
                     title=novel.title,
                     style=novel.style,
@@ -94,17 +114,21 @@ class NovelService:
                     chapter_title=title,
                     context=context,
                     chapter_outline=outline_snippet,
-                    world_bible=world_bible
+                    world_bible=world_bible,
+                    stats=generation
                 )
                 
                 db_chapter.content = content
+                # 记录所用的 prompt 版本，之后对本章的评分计入该版本
+                db_chapter.prompt_version = generation.get("prompt_version")
                 db_chapter.status = ChapterStatus.REVIEWING
                 
                 try:
                     # Generate summary and store in Vector DB
                     summary = await llm_service.generate_summary(content)
                     db_chapter.summary = summary
-                    await context_manager.add_chapter_summary(novel_id, db_chapter.id, summary)
+                    with tracer.span("context.index"):
+                        await context_manager.add_chapter_summary(novel_id, db_chapter.id, summary)
                 except Exception as e:
                     logger.error(f"Error generating or storing chapter summary: {e}")
                     # Continue even if summary generation fails
@@ -114,8 +138,8 @@ class NovelService:
                 # Continue even if chapter content generation fails
                 pass
             
-            db.commit()
-            db.refresh(db_chapter)
+            await db.commit()
+            await db.refresh(db_chapter, attribute_names=["updated_at"])
         except Exception as e:
             logger.error(f"Unexpected error in create_chapter: {e}")
             # Chapter is already created in DB, so we can still return it
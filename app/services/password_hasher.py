@@ -0,0 +1,74 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    """哈希队列已满，调用方应返回 429"""
+
+
+class PasswordHasher:
+    """独立的有界 bcrypt 执行器
+
+    bcrypt 每次耗时数百毫秒，若在接口线程池中执行，登录高峰会占满 AnyIO 线程池，
+    拖慢所有同步接口。这里使用专用线程池（bcrypt 计算时释放 GIL），
+    排队任务超过 max_queue 时立即拒绝，而不是无限排队。
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, rounds: int = 12):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._pool
+
+    async def _run(self, op: str, fn: Callable, *args) -> Any:
+        # 只在事件循环线程中修改计数，无需加锁
+        if self._pending >= self.max_workers + self.max_queue:
+            PASSWORD_HASH_REJECTED.labels(op=op).inc()
+            raise PasswordHasherBusy()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self._pending += 1
+        PASSWORD_HASH_QUEUE_DEPTH.inc()
+        try:
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.dec()
+            PASSWORD_HASH_LATENCY.labels(op=op).observe(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """校验密码；若哈希使用的 cost 与当前配置不同，同时返回按新配置生成的哈希"""
+        return await self._run("verify", self.context.verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+    rounds=settings.BCRYPT_ROUNDS
+)
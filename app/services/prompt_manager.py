@@ -1,87 +1,340 @@
-from typing import Dict, Any, Optional
-from langchain_core.prompts import PromptTemplate
-from app.services.prompts import OUTLINE_PROMPT, CHAPTER_PROMPT, SUMMARY_PROMPT
+import json
+import time
+import random
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import Base, AsyncSessionLocal
+from app.core.metrics import PROMPT_SELECTIONS
+from app.models.models import PromptVariant, PromptFeedback
+from app.services.prompts import MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# 内置版本：ensure_schema 时写入数据库，已存在的版本不覆盖。版本一经写入不再修改，改动 prompt 请新增版本
+DEFAULT_VARIANTS = {
+    "outline": {
+        "v1": (MESSAGES["OUTLINE_PROMPT"], "原始版本"),
+        "v2-concise": (MESSAGES["OUTLINE_PROMPT_CONCISE"], "精简指令，条目式输出"),
+    },
+    "chapter": {
+        "v1": (MESSAGES["CHAPTER_PROMPT"], "原始版本"),
+        "v2-concise": (MESSAGES["CHAPTER_PROMPT_CONCISE"], "精简指令"),
+    },
+    "summary": {
+        "v1": (MESSAGES["SUMMARY_PROMPT"], "原始版本"),
+        "v2-concise": (MESSAGES["SUMMARY_PROMPT_CONCISE"], "120 字以内的短摘要"),
+    },
+}
+
+# 各任务调用时提供的变量；新增版本只能引用这些变量
+TASK_INPUTS = {
+    "outline": {"title", "genre", "style", "synopsis"},
+    "chapter": {"title", "style", "chapter_order", "chapter_title", "context", "chapter_outline", "world_bible"},
+    "summary": {"content"},
+}
+
+
+def build_template(task: str, messages: Sequence[Sequence[str]]) -> Any:
+    """由 [role, template] 列表构建 ChatPromptTemplate，并校验只引用了该任务提供的变量"""
+    if task not in TASK_INPUTS:
+        raise ValueError(f"Unknown prompt task: {task}")
+    from langchain_core.prompts import ChatPromptTemplate
+    template = ChatPromptTemplate.from_messages([tuple(m) for m in messages])
+    unknown = set(template.input_variables) - TASK_INPUTS[task]
+    if unknown:
+        raise ValueError(f"Unknown variables for {task}: {', '.join(sorted(unknown))}")
+    return template
+
+
+class Variant:
+    """进程内的版本快照：模板在首次使用时构建一次，统计量为最近一次从数据库读取的值加上本进程之后的增量"""
+
+    __slots__ = ("id", "task", "version", "description", "is_active", "messages", "_template", "stats")
+
+    STAT_COLUMNS = (
+        "calls", "errors", "latency_sum", "prompt_tokens_sum", "completion_tokens_sum",
+        "cost_sum", "ratings", "quality_sum"
+    )
+
+    def __init__(self, id: Optional[int], task: str, version: str, messages: Sequence[Sequence[str]], description: Optional[str] = None, is_active: bool = True, template: Any = None):
+        self.id = id
+        self.task = task
+        self.version = version
+        self.description = description
+        self.is_active = is_active
+        self.messages = [list(m) for m in messages]
+        self._template = template
+        self.stats = dict.fromkeys(self.STAT_COLUMNS, 0)
+
+    @property
+    def template(self) -> Any:
+        if self._template is None:
+            self._template = build_template(self.task, self.messages)
+        return self._template
+
+    @property
+    def successes(self) -> int:
+        return self.stats["calls"] - self.stats["errors"]
+
+    def mean(self, column: str) -> Optional[float]:
+        return self.stats[column] / self.successes if self.successes else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        s = self.stats
+        tokens = self.mean("prompt_tokens_sum"), self.mean("completion_tokens_sum")
+        return {
+            "task": self.task,
+            "version": self.version,
+            "description": self.description,
+            "is_active": self.is_active,
+            "messages": self.messages,
+            "calls": s["calls"],
+            "errors": s["errors"],
+            "ratings": s["ratings"],
+            # Beta(1, 1) 先验下的后验均值
+            "quality": round((1 + s["quality_sum"]) / (2 + s["ratings"]), 4),
+            "avg_latency": round(self.mean("latency_sum"), 3) if self.successes else None,
+            "avg_prompt_tokens": round(tokens[0], 1) if self.successes else None,
+            "avg_completion_tokens": round(tokens[1], 1) if self.successes else None,
+            "avg_cost_usd": round(self.mean("cost_sum"), 6) if self.successes else None,
+        }
+
 
 class PromptManager:
-    """管理和优化各种类型的Prompt模板"""
-    
-    def __init__(self):
-        self.templates = {
-            "outline": OUTLINE_PROMPT,
-            "chapter": CHAPTER_PROMPT,
-            "summary": SUMMARY_PROMPT
+    """持久化的多版本 Prompt 注册表
+
+    - 每个任务（outline/chapter/summary）可以有多个版本，保存在 prompt_variants 表中；
+    - 每次生成前用 Thompson 采样选择版本：质量（用户评分，Beta 后验）与成功率各抽样一次，
+      token、耗时与费用取均值（按 prior_calls 次任务平均值收缩，新版本不会因样本少而被高估或低估），
+      按 weights 组合为目标值后取最大者；
+    - 调用结果与评分通过 UPDATE ... SET col = col + :delta 累加，多个 worker 并发写入不会互相覆盖；
+      各进程每 refresh_interval 秒重新读取一次汇总后的统计；
+    - 每个版本的模板（已解析的 ChatPromptTemplate）在本进程中只构建一次；版本不可变，无需失效。
+      渲染只是把输入代入模板，而输入（上下文、世界观、前文）几乎每次都不同，因此不缓存渲染结果。
+    """
+
+    def __init__(self, weights: Dict[str, float], refresh_interval: float = 30.0, prior_calls: float = 5.0, seed: Optional[int] = None):
+        self.weights = weights
+        self.refresh_interval = refresh_interval
+        self.prior_calls = prior_calls
+        self._rng = random.Random(seed)
+        self._variants: Dict[str, List[Variant]] = {}
+        self._loaded_at: Optional[float] = None
+        # 数据库不可用时使用的内置版本
+        self._fallback = {
+            task: Variant(None, task, "v1", versions["v1"][0], versions["v1"][1])
+            for task, versions in DEFAULT_VARIANTS.items()
         }
-        
-        # 模板评估指标
-        self.template_evaluations = {
-            "outline": {"score": 0.85, "usage_count": 100, "feedback": []},
-            "chapter": {"score": 0.82, "usage_count": 85, "feedback": []},
-            "summary": {"score": 0.88, "usage_count": 120, "feedback": []}
+
+    # --- schema ---
+
+    def ensure_schema(self, bind):
+        """创建注册表并写入缺少的内置版本；多个 worker 同时启动时只有一个写入成功"""
+        Base.metadata.create_all(bind=bind, tables=[PromptVariant.__table__, PromptFeedback.__table__])
+        with Session(bind) as db:
+            existing = set(db.execute(select(PromptVariant.task, PromptVariant.version)).tuples())
+            for task, versions in DEFAULT_VARIANTS.items():
+                for version, (messages, description) in versions.items():
+                    if (task, version) not in existing:
+                        db.add(PromptVariant(
+                            task=task, version=version, description=description,
+                            messages=json.dumps([list(m) for m in messages], ensure_ascii=False)
+                        ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+    # --- 加载 ---
+
+    async def refresh(self):
+        """从数据库重新读取全部版本及其汇总统计"""
+        # 先更新时间戳，并发请求不会同时触发刷新
+        self._loaded_at = time.monotonic()
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(select(PromptVariant).order_by(PromptVariant.id))).scalars().all()
+        except Exception as e:
+            logger.warning(f"Failed to load prompt variants, using built-in prompts: {e}")
+            return
+        known = {(v.task, v.version): v for variants in self._variants.values() for v in variants}
+        variants: Dict[str, List[Variant]] = {}
+        for row in rows:
+            variant = known.get((row.task, row.version))
+            if variant is None or variant.id != row.id:
+                messages = json.loads(row.messages)
+                try:
+                    template = build_template(row.task, messages)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping invalid prompt variant {row.task}/{row.version}: {e}")
+                    continue
+                variant = Variant(row.id, row.task, row.version, messages, template=template)
+            variant.description = row.description
+            variant.is_active = bool(row.is_active)
+            variant.stats = {column: getattr(row, column) or 0 for column in Variant.STAT_COLUMNS}
+            variants.setdefault(row.task, []).append(variant)
+        self._variants = variants
+
+    async def _refresh_if_stale(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+            await self.refresh()
+
+    # --- 选择 ---
+
+    def _baseline(self, variants: List[Variant]) -> Dict[str, float]:
+        """任务内所有版本的平均值，作为样本较少的版本的先验"""
+        successes = sum(v.successes for v in variants)
+        return {
+            column: sum(v.stats[column] for v in variants) / successes if successes else 0.0
+            for column in ("latency_sum", "prompt_tokens_sum", "completion_tokens_sum", "cost_sum")
         }
-    
-    def get_template(self, template_type: str) -> PromptTemplate:
-        """获取指定类型的Prompt模板"""
-        return self.templates.get(template_type, OUTLINE_PROMPT)
-    
-    def update_template(self, template_type: str, template: PromptTemplate):
-        """更新指定类型的Prompt模板"""
-        self.templates[template_type] = template
-    
-    def evaluate_template(self, template_type: str, score: float, feedback: Optional[str] = None):
-        """评估模板并记录反馈"""
-        eval_data = self.template_evaluations.get(template_type, {
-            "score": 0.5,
-            "usage_count": 0,
-            "feedback": []
-        })
-        
-        # 更新评分（简单加权平均）
-        eval_data["usage_count"] += 1
-        eval_data["score"] = (eval_data["score"] * (eval_data["usage_count"] - 1) + score) / eval_data["usage_count"]
-        
-        if feedback:
-            eval_data["feedback"].append(feedback)
-        
-        self.template_evaluations[template_type] = eval_data
-    
-    def get_best_template(self, template_type: str) -> PromptTemplate:
-        """获取指定类型的最佳模板"""
-        # 当前版本只支持一个模板，未来可以扩展为多个模板选择
-        return self.templates.get(template_type, OUTLINE_PROMPT)
-    
-    def generate_dynamic_prompt(self, template_type: str, context: Dict[str, Any]) -> str:
-        """根据上下文动态生成Prompt"""
-        template = self.get_best_template(template_type)
-        
-        # 根据内容类型和长度调整Prompt
-        dynamic_params = {
-            "detail_level": "high",
-            "creativity": "medium"
+
+    def _shrunk_mean(self, variant: Variant, column: str, baseline: Dict[str, float]) -> float:
+        k = self.prior_calls
+        return (variant.stats[column] + k * baseline[column]) / (variant.successes + k)
+
+    def _sample_objective(self, variant: Variant, baseline: Dict[str, float]) -> float:
+        s = variant.stats
+        w = self.weights
+        quality = self._rng.betavariate(1 + s["quality_sum"], 1 + s["ratings"] - s["quality_sum"])
+        success = self._rng.betavariate(1 + variant.successes, 1 + s["errors"])
+        tokens = self._shrunk_mean(variant, "prompt_tokens_sum", baseline) + self._shrunk_mean(variant, "completion_tokens_sum", baseline)
+        return (
+            w.get("quality", 1.0) * quality * success
+            - w.get("tokens", 0.0) * tokens / 1000
+            - w.get("latency", 0.0) * self._shrunk_mean(variant, "latency_sum", baseline)
+            - w.get("cost", 0.0) * self._shrunk_mean(variant, "cost_sum", baseline)
+        )
+
+    def _choose(self, task: str) -> Variant:
+        variants = [v for v in self._variants.get(task, []) if v.is_active]
+        if not variants:
+            return self._fallback[task]
+        if len(variants) == 1:
+            return variants[0]
+        baseline = self._baseline(variants)
+        return max(variants, key=lambda v: self._sample_objective(v, baseline))
+
+    async def select(self, task: str) -> Variant:
+        """为一次生成选择版本"""
+        if task not in self._fallback:
+            raise ValueError(f"Unknown prompt task: {task}")
+        await self._refresh_if_stale()
+        variant = self._choose(task)
+        PROMPT_SELECTIONS.labels(task=task, version=variant.version).inc()
+        return variant
+
+    def selection_shares(self, task: str, samples: int = 1000) -> Dict[str, float]:
+        """按当前统计模拟 samples 次选择，估计各版本被选中的比例"""
+        counts: Dict[str, int] = {}
+        for _ in range(samples):
+            version = self._choose(task).version
+            counts[version] = counts.get(version, 0) + 1
+        return {version: round(count / samples, 3) for version, count in counts.items()}
+
+    # --- 统计 ---
+
+    async def _increment(self, variant: Variant, delta: Dict[str, float], feedback: Optional[PromptFeedback] = None):
+        """本进程快照立即生效；数据库中原子累加，其他 worker 在下次刷新时看到"""
+        for column, value in delta.items():
+            variant.stats[column] += value
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(PromptVariant)
+                .where(PromptVariant.id == variant.id)
+                .values({getattr(PromptVariant, column): getattr(PromptVariant, column) + value for column, value in delta.items()})
+            )
+            if feedback is not None:
+                db.add(feedback)
+            await db.commit()
+
+    async def record_call(self, variant: Variant, call: Dict[str, Any]):
+        """记录一次调用的耗时、token 与费用（call 为 llm_telemetry 的调用记录）；失败的调用只计入错误数"""
+        if variant.id is None or not call:
+            return
+        if call.get("error"):
+            delta = {"calls": 1, "errors": 1}
+        else:
+            delta = {
+                "calls": 1,
+                "latency_sum": call.get("latency") or 0.0,
+                "prompt_tokens_sum": call.get("prompt_tokens") or 0,
+                "completion_tokens_sum": call.get("completion_tokens") or 0,
+                "cost_sum": call.get("cost_usd") or 0.0,
+            }
+        try:
+            await self._increment(variant, delta)
+        except Exception as e:
+            # 统计写入失败不影响生成结果
+            logger.warning(f"Failed to record prompt stats for {variant.task}/{variant.version}: {e}")
+
+    def get_variant(self, task: str, version: str) -> Optional[Variant]:
+        for variant in self._variants.get(task, []):
+            if variant.version == version:
+                return variant
+        return None
+
+    async def evaluate_template(self, task: str, version: str, score: float, feedback: Optional[str] = None, chapter_id: Optional[int] = None) -> bool:
+        """记录 0-1 的质量评分；版本不存在时返回 False"""
+        if not 0 <= score <= 1:
+            raise ValueError("Score must be between 0 and 1")
+        await self._refresh_if_stale()
+        variant = self.get_variant(task, version)
+        if variant is None:
+            return False
+        await self._increment(
+            variant, {"ratings": 1, "quality_sum": score},
+            PromptFeedback(variant_id=variant.id, score=score, feedback=feedback, chapter_id=chapter_id)
+        )
+        return True
+
+    # --- 管理 ---
+
+    async def get_template_evaluation(self, task: str) -> Dict[str, Any]:
+        """任务下各版本的汇总统计与当前的选择比例"""
+        if task not in self._fallback:
+            raise ValueError(f"Unknown prompt task: {task}")
+        await self.refresh()
+        return {
+            "task": task,
+            "weights": self.weights,
+            "selection_shares": self.selection_shares(task),
+            "variants": [v.to_dict() for v in self._variants.get(task, [])]
         }
-        
-        # 调整详细程度和创造力参数
-        if template_type == "chapter":
-            content_length = len(context.get("chapter_outline", ""))
-            if content_length > 500:
-                dynamic_params["detail_level"] = "medium"
-            
-            # 根据小说风格调整创造力
-            style = context.get("style", "").lower()
-            if style in ["fantasy", "science fiction", "scifi"]:
-                dynamic_params["creativity"] = "high"
-            elif style in ["mystery", "thriller"]:
-                dynamic_params["creativity"] = "medium"
-            else:
-                dynamic_params["creativity"] = "low"
-        
-        # 合并动态参数到上下文
-        dynamic_context = {**context, **dynamic_params}
-        
-        return template.format_prompt(**dynamic_context).text
-    
-    def get_template_evaluation(self, template_type: str) -> Dict[str, Any]:
-        """获取模板评估数据"""
-        return self.template_evaluations.get(template_type, {})
+
+    async def add_variant(self, task: str, version: str, messages: List[List[str]], description: Optional[str] = None) -> Variant:
+        """新增版本；模板引用了未知变量或版本已存在时抛出 ValueError"""
+        build_template(task, messages)
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(PromptVariant(task=task, version=version, description=description, messages=json.dumps(messages, ensure_ascii=False)))
+                await db.commit()
+        except IntegrityError:
+            raise ValueError(f"Prompt version {task}/{version} already exists")
+        await self.refresh()
+        return self.get_variant(task, version)
+
+    async def set_active(self, task: str, version: str, active: bool) -> Optional[Variant]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(PromptVariant)
+                .where(PromptVariant.task == task, PromptVariant.version == version)
+                .values(is_active=int(active))
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            return None
+        await self.refresh()
+        return self.get_variant(task, version)
+
 
 # 创建单例实例
-prompt_manager = PromptManager()
+prompt_manager = PromptManager(
+    weights=settings.PROMPT_OBJECTIVE_WEIGHTS,
+    refresh_interval=settings.PROMPT_STATS_REFRESH,
+    prior_calls=settings.PROMPT_PRIOR_CALLS
+)
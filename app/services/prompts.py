@@ -1,6 +1,10 @@
-from langchain_core.prompts import ChatPromptTemplate
+from typing import Any, Dict, List, Tuple
 
-OUTLINE_PROMPT = ChatPromptTemplate.from_messages([
+# 各模板的 (role, template) 列表。ChatPromptTemplate 在首次访问 XXX_PROMPT 时才构建：
+# 导入 langchain_core.prompts 会连带导入 langsmith（约 0.6 秒），不应计入应用的导入时间
+MESSAGES: Dict[str, List[Tuple[str, str]]] = {}
+
+MESSAGES["OUTLINE_PROMPT"] = [
     ("system", "你是一个专业的小说家，擅长构思精彩的故事情节。"),
     ("user", """请根据以下信息生成一份详细的小说大纲：
     标题：{title}
@@ -14,9 +18,9 @@ OUTLINE_PROMPT = ChatPromptTemplate.from_messages([
     3. 规划大概的章节数和每章的主要剧情点（至少规划前10章）。
     
     输出格式请保持结构化。""")
-])
+]
 
-CHAPTER_PROMPT = ChatPromptTemplate.from_messages([
+MESSAGES["CHAPTER_PROMPT"] = [
     ("system", "你是一个高产且文笔优美的小说家。你的写作风格是：{style}。"),
     ("user", """请撰写小说《{title}》的第 {chapter_order} 章：{chapter_title}。
     
@@ -36,18 +40,53 @@ CHAPTER_PROMPT = ChatPromptTemplate.from_messages([
     4. 严格遵守世界观设定，不要出现OOC（角色性格崩坏）或逻辑矛盾。
     
     开始写作：""")
-])
+]
 
-SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+MESSAGES["SUMMARY_PROMPT"] = [
     ("system", "你是一个专业的编辑，擅长总结故事剧情。"),
     ("user", """请将以下章节内容总结为一段简练的摘要（200字以内），保留关键情节和人物动态：
     
     {content}
     
     摘要：""")
-])
+]
+
+# 精简版本：指令更短、摘要要求更紧，输入与输出 token 都更少；由 prompt_manager 与原版本一起按效果选择
+MESSAGES["OUTLINE_PROMPT_CONCISE"] = [
+    ("system", "你是一个专业的小说家。只输出大纲本身，不写多余的说明。"),
+    ("user", """小说《{title}》，类型：{genre}，风格：{style}。
+简介：{synopsis}
+
+用条目列出：
+1. 核心冲突与高潮；
+2. 主要角色及一句话设定；
+3. 前10章，每章一句话剧情。""")
+]
+
+MESSAGES["CHAPTER_PROMPT_CONCISE"] = [
+    ("system", "你是一个小说家，文风：{style}。严格遵守世界观设定与本章大纲，人物不得OOC，只输出正文。"),
+    ("user", """《{title}》第 {chapter_order} 章：{chapter_title}
+
+【世界观】
+{world_bible}
+
+【前情】
+{context}
+
+【本章大纲】
+{chapter_outline}
 
-CONTINUE_PROMPT = ChatPromptTemplate.from_messages([
+写约2000字的正文：""")
+]
+
+MESSAGES["SUMMARY_PROMPT_CONCISE"] = [
+    ("system", "你是小说编辑，只输出摘要。"),
+    ("user", """用不超过120字概括下文的关键情节与人物变化：
+
+{content}""")
+]
+
+MESSAGES["CONTINUE_PROMPT"] = [
     ("system", "你是一个专业的小说家。请根据现有内容和世界观设定，续写接下来的剧情。"),
     ("user", """请根据上下文续写小说内容（约200-500字）。
     
@@ -70,9 +109,12 @@ CONTINUE_PROMPT = ChatPromptTemplate.from_messages([
     4. 直接输出续写的内容，不要包含任何解释性文字。
     
     续写内容：""")
-])
+]
 
-CONSISTENCY_CHECK_PROMPT = ChatPromptTemplate.from_messages([
+# 修改 CONSISTENCY_CHECK_PROMPT 时递增版本号，使已缓存的检查结果失效
+CONSISTENCY_CHECK_PROMPT_VERSION = "2"
+
+MESSAGES["CONSISTENCY_CHECK_PROMPT"] = [
     ("system", "你是一个严谨的小说逻辑检查员。你的任务是发现文本中的逻辑漏洞、设定冲突和时间线错误。"),
     ("user", """请分析以下小说章节内容，检查是否存在逻辑一致性问题。
     
@@ -98,15 +140,16 @@ CONSISTENCY_CHECK_PROMPT = ChatPromptTemplate.from_messages([
                 "severity": "high" | "medium" | "low",
                 "description": "详细描述问题所在",
                 "suggestion": "修改建议",
+                "quote": "存在问题的原文句子（逐字引用）",
                 "location": "问题在文中的大概位置"
             }}
         ],
         "overall_score": 0-100
     }}
     """)
-])
+]
 
-IMPROVE_PROMPT = ChatPromptTemplate.from_messages([
+MESSAGES["IMPROVE_PROMPT"] = [
     ("system", "你是一个卓越的小说编辑，擅长润色文字，提升文笔，使表达更生动、感人、专业。"),
     ("user", """请对以下小说片段进行润色和优化。
 
@@ -124,9 +167,9 @@ IMPROVE_PROMPT = ChatPromptTemplate.from_messages([
     5. 直接输出润色后的内容，不要包含任何解释性文字。
 
     润色结果：""")
-])
+]
 
-EXPAND_PROMPT = ChatPromptTemplate.from_messages([
+MESSAGES["EXPAND_PROMPT"] = [
     ("system", "你是一个富有想象力的小说家，擅长扩充细节，使故事情节更加丰满。"),
     ("user", """请对以下小说片段进行细节扩充和丰富。
 
@@ -144,5 +187,16 @@ EXPAND_PROMPT = ChatPromptTemplate.from_messages([
     5. 直接输出扩充后的内容，不要包含任何解释性文字。
 
     扩充结果：""")
-])
+]
+
+_templates: Dict[str, Any] = {}
+
 
+def __getattr__(name: str) -> Any:
+    if name not in MESSAGES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    template = _templates.get(name)
+    if template is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        template = _templates[name] = ChatPromptTemplate.from_messages(MESSAGES[name])
+    return template
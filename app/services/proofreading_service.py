@@ -1,86 +1,86 @@
-import re
-from typing import List, Tuple, Dict, Any
-from app.models.models import ChapterStatus, Chapter, Comment, ChapterRevision
+import json
+import time
+import hashlib
+import asyncio
+import logging
+from functools import cached_property
+from typing import List, Tuple, Dict, Any, Optional, AsyncGenerator
+from app.models.models import ChapterStatus, Chapter, Comment, ChapterRevision, ConsistencyCheckCache
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from app.services.llm_service import llm_service
+from app.services.llm_telemetry import llm_telemetry
+from app.services import text_checks
+from app.services.compute_executor import compute_executor
+from app.services.revision_service import revision_service
+from app.core.config import settings
+from app.core.database import release_connection
 
-from app.services.prompts import CONSISTENCY_CHECK_PROMPT
-from langchain_core.output_parsers import JsonOutputParser
+from app.services import prompts
+from app.services.prompts import CONSISTENCY_CHECK_PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# 长章节分块时优先在这些位置切分
+CHUNK_BREAK_CHARS = "。！？\n"
 
 class ProofreadingService:
     def __init__(self):
-        self.sensitive_words = ["暴力", "血腥", "涉黄"]
-        self.output_parser = JsonOutputParser()
+        self.sensitive_words = text_checks.SENSITIVE_WORDS
         # 使用简单的基于规则的检查，无需Java依赖
         # 未来可以替换为language_tool_python.LanguageTool('zh-CN')
 
+    @cached_property
+    def output_parser(self):
+        # langchain_core 的解析器在首次一致性检查时才导入
+        from langchain_core.output_parsers import JsonOutputParser
+        return JsonOutputParser()
+
     def filter_sensitive(self, text: str) -> List[Tuple[str, int]]:
-        found = []
-        for w in self.sensitive_words:
-            for m in re.finditer(re.escape(w), text):
-                found.append((w, m.start()))
-        return found
+        return text_checks.filter_sensitive(text, self.sensitive_words)
 
     async def grammar_check(self, text: str) -> Dict[str, Any]:
-        # 增强的语法检查功能
-        corrections = []
-        
-        # 常见中文语法问题规则
-        patterns = [
-            # 重复词语
-            (r'的的+', '重复使用"的"', '的', 'duplicate_word'),
-            (r'了了+', '重复使用"了"', '了', 'duplicate_word'),
-            (r'是是+', '重复使用"是"', '是', 'duplicate_word'),
-            (r'啊啊+', '重复使用"啊"', '啊', 'duplicate_word'),
-            (r'哦哦+', '重复使用"哦"', '哦', 'duplicate_word'),
-            (r'嗯嗯+', '重复使用"嗯"', '嗯', 'duplicate_word'),
-            
-            # 常见标点错误
-            (r'，+', '多个逗号连续使用', '，', 'punctuation_error'),
-            (r'。+', '多个句号连续使用', '。', 'punctuation_error'),
-            (r'、+', '多个顿号连续使用', '、', 'punctuation_error'),
-            
-            # 常见语法错误
-            (r'的得', '"的"和"得"使用错误', '的', 'grammar_error'),
-            (r'得了了', '"得"和"了"使用错误', '得了', 'grammar_error'),
-            (r'是在', '"是"和"在"使用错误', '是', 'grammar_error'),
-            
-            # 其他常见错误
-            (r'一个一个', '重复使用"一个"', '一个', 'redundant_phrase'),
-            (r'非常非常', '重复使用"非常"', '非常', 'redundant_phrase'),
-            (r'很很', '重复使用"很"', '很', 'redundant_phrase'),
-            (r'更加更加', '重复使用"更加"', '更加', 'redundant_phrase'),
-            (r'越来越越来越', '重复使用"越来越"', '越来越', 'redundant_phrase'),
-            (r'可以可以', '重复使用"可以"', '可以', 'redundant_phrase'),
-            (r'应该应该', '重复使用"应该"', '应该', 'redundant_phrase'),
-            (r'可能可能', '重复使用"可能"', '可能', 'redundant_phrase'),
-            (r'必须必须', '重复使用"必须"', '必须', 'redundant_phrase'),
-            (r'需要需要', '重复使用"需要"', '需要', 'redundant_phrase'),
-        ]
-        
-        for pattern, message, suggestion, rule_id in patterns:
-            for m in re.finditer(pattern, text):
-                corrections.append({
-                    "start": m.start(),
-                    "end": m.end(),
-                    "message": message,
-                    "suggestion": suggestion,
-                    "rule_id": rule_id
-                })
-        
-        return {
-            "text": text,
-            "corrections": corrections,
-            "error_count": len(corrections)
-        }
+        # 增强的语法检查功能，规则见 text_checks.GRAMMAR_PATTERNS；在计算进程池中执行
+        return await compute_executor.run(text_checks.grammar_check, text, size=len(text))
+
+    async def proofread_text(self, text: str) -> Dict[str, Any]:
+        """敏感词过滤 + 语法检查，作为一个计算任务提交"""
+        return await compute_executor.run(text_checks.proofread, text, size=len(text))
+
+    async def analyze_logical_consistency(self, text: str, context: str = "", world_bible: str = "", title: str = "", mode: str = "auto", db: Optional[AsyncSession] = None, chapter_id: Optional[int] = None) -> Dict[str, Any]:
+        """增强的逻辑一致性分析功能
 
-    async def analyze_logical_consistency(self, text: str, context: str = "", world_bible: str = "", title: str = "") -> Dict[str, Any]:
-        """增强的逻辑一致性分析功能"""
+        mode: auto（超过 CONSISTENCY_CHUNK_SIZE 时分块并发检查）或 single（整章一次调用，用于对比）
+        传入 db 时，LLM 检查结果按内容/世界观/Prompt版本/模型持久化缓存
+        """
         # 1. 基于规则的初步逻辑检查
-        rule_based_issues = self._rule_based_logical_check(text, context)
+        rule_based_issues = await self._rule_based_logical_check(text, context)
         
-        # 2. 使用LLM进行深度逻辑分析
-        llm_issues = await self._llm_based_logical_check(text, context, world_bible, title)
+        # 2. 使用LLM进行深度逻辑分析（优先命中持久化缓存）
+        cached = False
+        cache_key = self._consistency_cache_key(text, world_bible, title, mode)
+        entry = None
+        if db is not None:
+            entry = (await db.execute(
+                select(ConsistencyCheckCache).where(ConsistencyCheckCache.cache_key == cache_key)
+            )).scalar_one_or_none()
+        
+        if entry is not None:
+            cached = True
+            llm_telemetry.record_cache_hit("consistency", entry.model or None)
+            llm_issues = json.loads(entry.issues or "[]")
+            llm_stats = json.loads(entry.stats or "{}")
+        else:
+            llm_stats: Dict[str, Any] = {}
+            if db is not None:
+                # LLM 检查期间不占用连接，结果在新的短事务中写入
+                await release_connection(db)
+            llm_issues = await self._llm_based_logical_check(text, context, world_bible, title, mode=mode, stats=llm_stats)
+            # 部分块失败的结果不完整，不写入缓存
+            if db is not None and not llm_stats.get("failed_chunks"):
+                await self._store_consistency_result(db, cache_key, chapter_id, llm_issues, llm_stats)
         
         # 3. 合并结果
         all_issues = rule_based_issues + llm_issues
@@ -89,112 +89,175 @@ class ProofreadingService:
             "text": text,
             "context": context,
             "issues": all_issues,
-            "issue_count": len(all_issues)
+            "issue_count": len(all_issues),
+            "llm_stats": llm_stats,
+            "cached": cached
         }
+
+    def _consistency_cache_key(self, text: str, world_bible: str, title: str, mode: str) -> str:
+        """缓存键：任一输入（章节内容、世界观、Prompt版本、后端与实际使用的模型、分块参数）变化都会得到新键"""
+        parts = {
+            "content": hashlib.sha256(text.encode()).hexdigest(),
+            "world_bible": hashlib.sha256(f"{title}\n{world_bible}".encode()).hexdigest(),
+            "prompt_version": CONSISTENCY_CHECK_PROMPT_VERSION,
+            "backend": settings.LLM_BACKEND,
+            "model": llm_service.model_name,
+            "mode": mode,
+            "chunking": [settings.CONSISTENCY_CHUNK_SIZE, settings.CONSISTENCY_CHUNK_OVERLAP]
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    async def _store_consistency_result(self, db: AsyncSession, cache_key: str, chapter_id: Optional[int], issues: List[Dict[str, Any]], stats: Dict[str, Any]):
+        """写入检查结果，并清理同一章节已失效的旧结果"""
+        try:
+            if chapter_id is not None:
+                await db.execute(delete(ConsistencyCheckCache).where(
+                    ConsistencyCheckCache.chapter_id == chapter_id,
+                    ConsistencyCheckCache.cache_key != cache_key
+                ).execution_options(synchronize_session=False))
+            db.add(ConsistencyCheckCache(
+                cache_key=cache_key,
+                chapter_id=chapter_id,
+                model=llm_service.model_name,
+                prompt_version=CONSISTENCY_CHECK_PROMPT_VERSION,
+                issues=json.dumps(issues, ensure_ascii=False),
+                stats=json.dumps(stats)
+            ))
+            await db.commit()
+        except IntegrityError:
+            # 并发请求已写入相同结果
+            await db.rollback()
     
-    def _rule_based_logical_check(self, text: str, context: str) -> List[Dict[str, Any]]:
-        """基于规则的逻辑一致性检查"""
-        issues = []
+    async def _rule_based_logical_check(self, text: str, context: str) -> List[Dict[str, Any]]:
+        """基于规则的逻辑一致性检查（时间/地点/人物状态矛盾），在计算进程池中执行"""
+        return await compute_executor.run(text_checks.logical_rule_check, text, size=len(text))
+
+    def _split_into_chunks(self, text: str, chunk_size: int, overlap: int) -> List[Tuple[int, str]]:
+        """将长文本切分为相互重叠的块，返回 (起始偏移, 块内容)"""
+        if len(text) <= chunk_size:
+            return [(0, text)]
         
-        # 规则1：时间矛盾检测
-        time_patterns = [
-            (r'昨天.*?今天', '同一天内的时间矛盾', '检查时间描述的一致性'),
-            (r'上午.*?下午', '同一天内的时间矛盾', '检查时间顺序的合理性'),
-            (r'年初.*?年底', '同一年内的时间矛盾', '检查时间跨度的合理性'),
-        ]
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            if end < len(text):
+                # 尽量在句末切分，避免把一句话拆到两个块里
+                cut = max(text.rfind(c, start + chunk_size // 2, end) for c in CHUNK_BREAK_CHARS)
+                if cut != -1:
+                    end = cut + 1
+            chunks.append((start, text[start:end]))
+            if end >= len(text):
+                break
+            start = max(end - overlap, start + 1)
+        return chunks
+
+    def _issue_key(self, issue: Dict[str, Any]) -> Tuple:
+        """用于跨块去重的键：优先使用原文引用和偏移"""
+        if issue.get("quote"):
+            return ("quote", issue["quote"], issue.get("offset"))
+        return ("message", issue.get("type"), issue.get("message"))
+
+    async def _check_chunk(self, offset: int, chunk: str, world_bible: str, title: str, semaphore: asyncio.Semaphore) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """对单个文本块执行一次 CONSISTENCY_CHECK_PROMPT 调用"""
+        input_data = {
+            "title": title or "未知标题",
+            "world_bible": world_bible or "暂无详细设定",
+            "content": chunk
+        }
         
-        for pattern, message, suggestion in time_patterns:
-            for m in re.finditer(pattern, text):
-                issues.append({
-                    "type": "time_conflict",
-                    "start": m.start(),
-                    "end": m.end(),
-                    "message": message,
-                    "suggestion": suggestion,
-                    "rule_id": "time_conflict"
-                })
+        async with semaphore:
+            message = await llm_telemetry.ainvoke("consistency", prompts.CONSISTENCY_CHECK_PROMPT, llm_service.llm, input_data)
         
-        # 规则2：地点矛盾检测
-        location_patterns = [
-            (r'北京.*?上海', '短时间内的地点矛盾', '检查地点转换的合理性'),
-            (r'家里.*?办公室', '短时间内的地点矛盾', '检查地点转换的合理性'),
-            (r'室内.*?室外', '短时间内的地点矛盾', '检查地点转换的合理性'),
-        ]
+        result = self.output_parser.invoke(message)
+        usage = getattr(message, "usage_metadata", None) or {}
         
-        for pattern, message, suggestion in location_patterns:
-            for m in re.finditer(pattern, text):
-                issues.append({
-                    "type": "location_conflict",
-                    "start": m.start(),
-                    "end": m.end(),
-                    "message": message,
-                    "suggestion": suggestion,
-                    "rule_id": "location_conflict"
-                })
+        # 标准化输出格式，并把块内位置换算为全文偏移
+        formatted_issues = []
+        for issue in result.get("issues", []):
+            quote = issue.get("quote", "")
+            position = chunk.find(quote) if quote else -1
+            formatted_issues.append({
+                "type": issue.get("type", "logic_error"),
+                "message": issue.get("description", "未描述的问题"),
+                "suggestion": issue.get("suggestion", ""),
+                "severity": issue.get("severity", "medium"),
+                "quote": quote,
+                "offset": offset + position if position != -1 else None
+            })
         
-        # 规则3：人物状态矛盾检测
-        character_patterns = [
-            (r'死了.*?活着', '人物状态矛盾', '检查人物状态描述的一致性'),
-            (r'生病了.*?健康', '人物状态矛盾', '检查人物状态描述的一致性'),
-            (r'在睡觉.*?在工作', '人物状态矛盾', '检查人物状态描述的一致性'),
-        ]
+        return formatted_issues, {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0)
+        }
+
+    async def stream_llm_logical_check(self, text: str, world_bible: str = "", title: str = "", mode: str = "auto", stats: Optional[Dict[str, Any]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """分块并发执行LLM逻辑检查，每完成一个块就产出该块新增（已去重）的问题"""
+        if mode == "single":
+            chunks = [(0, text)]
+        else:
+            chunks = self._split_into_chunks(text, settings.CONSISTENCY_CHUNK_SIZE, settings.CONSISTENCY_CHUNK_OVERLAP)
         
-        for pattern, message, suggestion in character_patterns:
-            for m in re.finditer(pattern, text):
-                issues.append({
-                    "type": "character_conflict",
-                    "start": m.start(),
-                    "end": m.end(),
-                    "message": message,
-                    "suggestion": suggestion,
-                    "rule_id": "character_conflict"
-                })
+        stats = stats if stats is not None else {}
+        stats.update({
+            "mode": "single" if len(chunks) == 1 else "chunked",
+            "chunk_count": len(chunks),
+            "failed_chunks": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        })
+        started = time.perf_counter()
         
-        return issues
-    
-    async def _llm_based_logical_check(self, text: str, context: str, world_bible: str = "", title: str = "") -> List[Dict[str, Any]]:
-        """基于LLM的深度逻辑分析，包含世界观设定检查"""
+        semaphore = asyncio.Semaphore(settings.CONSISTENCY_MAX_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(self._check_chunk(offset, chunk, world_bible, title, semaphore))
+            for offset, chunk in chunks
+        ]
         
+        seen = set()
+        completed = 0
         try:
-            # 准备 Prompt 数据
-            input_data = {
-                "title": title or "未知标题",
-                "world_bible": world_bible or "暂无详细设定",
-                "content": text
-            }
-            
-            # 使用 CONSISTENCY_CHECK_PROMPT 创建 Chain
-            chain = CONSISTENCY_CHECK_PROMPT | llm_service.llm | self.output_parser
-            
-            # 执行分析
-            result = await chain.ainvoke(input_data)
-            
-            # 处理返回结果
-            issues = result.get("issues", [])
-            
-            # 标准化输出格式
-            formatted_issues = []
-            for issue in issues:
-                formatted_issues.append({
-                    "type": issue.get("type", "logic_error"),
-                    "message": issue.get("description", "未描述的问题"),
-                    "suggestion": issue.get("suggestion", ""),
-                    "severity": issue.get("severity", "medium"),
-                    "quote": issue.get("quote", "")
-                })
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    issues, usage = await next_done
+                except Exception as e:
+                    logger.error(f"Consistency check failed for chunk: {e}")
+                    stats["failed_chunks"] += 1
+                    issues, usage = [], {}
+                completed += 1
+                stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                stats["completion_tokens"] += usage.get("completion_tokens", 0)
                 
-            return formatted_issues
-            
-        except Exception as e:
-            print(f"Consistency check failed: {e}")
-            return []
-
-    def add_revision(self, db: Session, chapter: Chapter, content: str) -> ChapterRevision:
-        rev = ChapterRevision(chapter_id=chapter.id, content=content)
-        db.add(rev)
-        db.commit()
-        db.refresh(rev)
-        return rev
+                new_issues = []
+                for issue in issues:
+                    key = self._issue_key(issue)
+                    if key not in seen:
+                        seen.add(key)
+                        new_issues.append(issue)
+                
+                yield {
+                    "completed": completed,
+                    "chunk_count": len(chunks),
+                    "issues": new_issues
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+            stats["elapsed"] = round(time.perf_counter() - started, 3)
+    
+    async def _llm_based_logical_check(self, text: str, context: str, world_bible: str = "", title: str = "", mode: str = "auto", stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """基于LLM的深度逻辑分析，包含世界观设定检查"""
+        formatted_issues = []
+        async for partial in self.stream_llm_logical_check(text, world_bible, title, mode=mode, stats=stats):
+            formatted_issues.extend(partial["issues"])
+        
+        # 按在文中的位置排序，无法定位的问题排在最后
+        formatted_issues.sort(key=lambda i: (i["offset"] is None, i["offset"] or 0))
+        return formatted_issues
+
+    def add_revision(self, db: Session, chapter: Chapter, content: str, commit: bool = True) -> ChapterRevision:
+        # 修订以增量链存储，见 RevisionService
+        return revision_service.add_revision(db, chapter, content, commit)
 
     def add_comment(self, db: Session, chapter: Chapter, author: str, body: str) -> Comment:
         c = Comment(chapter_id=chapter.id, author=author, body=body)
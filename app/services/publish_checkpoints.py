@@ -0,0 +1,162 @@
+import time
+import hashlib
+import logging
+from typing import Any, Callable, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import PUBLISH_STEP_LATENCY
+from app.models.models import Chapter, PublishRecord, PublishStep
+
+logger = logging.getLogger(__name__)
+
+
+class PublishStepError(Exception):
+    """某个发布步骤重试后仍失败；已记录的检查点保留，下次从该步骤继续"""
+
+
+def content_hash(chapter: Chapter) -> str:
+    return hashlib.sha256(f"{chapter.title}\n{chapter.content or ''}".encode("utf-8")).hexdigest()
+
+
+class PublishCheckpoints:
+    """分步骤、可恢复的章节发布流程
+
+    登录态由 browser_pool 保证（session_ready），之后依次为：打开编辑器 -> 提交 -> 确认。
+    每个 (平台, 章节) 在 publish_records 中有一条记录，保存正文哈希与最后完成的步骤：
+    - 相同内容已确认发布时直接返回，不会重复提交；
+    - 点击提交前先记录 submitting，提交结果不明（异常、进程中断）时先到平台上查找该章节，
+      找不到才重新提交；
+    - 已提交但未确认（submitted）时只做查找确认，永远不会再次提交；
+    - 已提交或已发布后内容又有修改时，不会作为新章节再发一次：submitted/confirmed 直接拒绝，
+      submitting 先到平台上查找，确认旧版本没有发出去才按新内容重新发布。
+    每个步骤单独重试，失败时不必从头登录、打开编辑器。
+    """
+
+    def __init__(self, step_attempts: int = 3, step_retry_delay: float = 1.0):
+        self.step_attempts = max(1, step_attempts)
+        self.step_retry_delay = step_retry_delay
+
+    # --- 检查点 ---
+
+    async def get_record(self, platform: str, chapter_id: int) -> Optional[PublishRecord]:
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(PublishRecord).where(PublishRecord.platform == platform, PublishRecord.chapter_id == chapter_id)
+            )).scalar_one_or_none()
+
+    async def _checkpoint(self, record: PublishRecord, step: PublishStep, remote_url: Optional[str] = None) -> PublishRecord:
+        async with AsyncSessionLocal() as db:
+            existing = (await db.execute(
+                select(PublishRecord).where(
+                    PublishRecord.platform == record.platform, PublishRecord.chapter_id == record.chapter_id
+                )
+            )).scalar_one_or_none()
+            if existing is None:
+                existing = PublishRecord(platform=record.platform, chapter_id=record.chapter_id)
+                db.add(existing)
+            existing.content_hash = record.content_hash
+            existing.step = step.value
+            existing.remote_url = remote_url
+            try:
+                await db.commit()
+            except IntegrityError:
+                # 另一个 worker 同时创建了记录：以其为准
+                await db.rollback()
+                raise PublishStepError(f"Chapter {record.chapter_id} is being published by another worker")
+        return existing
+
+    # --- 步骤 ---
+
+    async def _step(self, platform: str, step: str, fn: Callable, *args) -> Any:
+        """单个步骤的重试，带指数退避与随机抖动"""
+        start = time.perf_counter()
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.step_attempts),
+                wait=wait_random_exponential(multiplier=self.step_retry_delay, max=self.step_retry_delay * 10),
+                reraise=True
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        logger.info(f"Retrying publish step {step} on {platform} (attempt {attempt.retry_state.attempt_number})")
+                    return await fn(*args)
+        finally:
+            PUBLISH_STEP_LATENCY.labels(platform=platform, step=step).observe(time.perf_counter() - start)
+
+    async def _find(self, adapter: Any, chapter: Chapter, context: Any) -> Optional[str]:
+        return await self._step(adapter.platform.value, "find_published", adapter.find_published, chapter, context)
+
+    async def _check_not_posted(self, adapter: Any, chapter: Chapter, context: Any, record: PublishRecord):
+        """内容变更后重新发布前，确认旧版本没有出现在平台上；平台上已有时拒绝重复发布"""
+        platform = adapter.platform.value
+        posted = record.step in (PublishStep.SUBMITTED.value, PublishStep.CONFIRMED.value)
+        if not posted and record.step == PublishStep.SUBMITTING.value:
+            posted = bool(await self._find(adapter, chapter, context))
+        if posted:
+            raise PublishStepError(
+                f"Chapter {chapter.id} was already posted to {platform} with different content; "
+                f"edit it on the platform instead of publishing it again"
+            )
+
+    async def run(self, adapter: Any, chapter: Chapter, context: Any) -> Optional[str]:
+        """在已登录的上下文中发布章节，返回平台上的章节地址（平台不提供时为 None）"""
+        platform = adapter.platform.value
+        digest = content_hash(chapter)
+        record = await self.get_record(platform, chapter.id)
+        if record is not None and record.content_hash == digest and record.step == PublishStep.CONFIRMED.value:
+            logger.info(f"Chapter {chapter.id} already published to {platform}, skipping")
+            return record.remote_url
+
+        if record is not None and record.content_hash != digest:
+            await self._check_not_posted(adapter, chapter, context, record)
+        if record is None or record.content_hash != digest:
+            record = PublishRecord(platform=platform, chapter_id=chapter.id, content_hash=digest)
+            record = await self._checkpoint(record, PublishStep.SESSION_READY)
+
+        # 上次提交结果不明：先确认平台上是否已有该章节
+        if record.step in (PublishStep.SUBMITTING.value, PublishStep.SUBMITTED.value):
+            remote_url = await self._find(adapter, chapter, context)
+            if remote_url:
+                await self._checkpoint(record, PublishStep.CONFIRMED, remote_url)
+                return remote_url
+            if record.step == PublishStep.SUBMITTED.value:
+                raise PublishStepError(f"Chapter {chapter.id} was submitted to {platform} but is not visible yet")
+
+        for attempt in range(1, self.step_attempts + 1):
+            page = await self._step(platform, "open_editor", adapter.open_editor, chapter, context)
+            try:
+                await self._checkpoint(record, PublishStep.EDITOR_OPENED)
+                record = await self._checkpoint(record, PublishStep.SUBMITTING)
+                try:
+                    # 提交不能盲目重试：失败后先查找，确认未生效才重新打开编辑器再提交
+                    await adapter.submit(page, chapter)
+                except Exception as e:
+                    logger.warning(f"Submitting chapter {chapter.id} to {platform} failed: {e}")
+                    remote_url = await self._find(adapter, chapter, context)
+                    if remote_url:
+                        await self._checkpoint(record, PublishStep.CONFIRMED, remote_url)
+                        return remote_url
+                    if attempt == self.step_attempts:
+                        raise PublishStepError(f"Submit failed for platform {platform}: {e}")
+                    continue
+                record = await self._checkpoint(record, PublishStep.SUBMITTED)
+                try:
+                    remote_url = await adapter.confirm(page, chapter)
+                except Exception as e:
+                    logger.warning(f"Confirming chapter {chapter.id} on {platform} failed: {e}")
+                    remote_url = await self._find(adapter, chapter, context)
+                    if not remote_url:
+                        raise PublishStepError(f"Chapter {chapter.id} was submitted to {platform} but could not be confirmed")
+                await self._checkpoint(record, PublishStep.CONFIRMED, remote_url)
+                return remote_url
+            finally:
+                await page.close()
+
+
+publish_checkpoints = PublishCheckpoints(
+    step_attempts=settings.PUBLISH_STEP_ATTEMPTS,
+    step_retry_delay=settings.PUBLISH_STEP_RETRY_DELAY
+)
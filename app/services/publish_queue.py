@@ -0,0 +1,356 @@
+import time
+import random
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import PUBLISH_JOB_RESULTS, PUBLISH_JOBS_CLAIMED
+from app.models.models import Account, Chapter, Novel, PublishJob, PublishJobStatus, PublishLog
+from app.services.browser_pool import browser_pool
+from app.services.publishing_adapters import account_service, get_adapter
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value: datetime) -> datetime:
+    """不带时区的时间按 UTC 处理"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class PublishQueue:
+    """持久化的定时发布队列
+
+    任务保存在 publish_jobs 表中，进程重启不会丢失。调度器定期领取到期任务：
+    先查出候选 id，再用带条件的 UPDATE 抢占（pending 且到期，或租约已过期的 running），
+    多个 worker 同时运行时每个任务只会被一个 worker 领到。每次领取 attempts 加一，作为本次领取的令牌：
+    续租与写回结果都带上该条件，租约过期被其他 worker 重新领取后，原 worker 的写入不会生效。
+    领到的任务按 (平台, 账号) 分组，每组只打开一次浏览器会话依次发布，每发布一章前为组内所有
+    尚未发布的任务续租，排队等待限速的任务不会因租约过期被重复领取；同一平台的发布按 PUBLISH_RATE_PER_MINUTE 限速，
+    失败按指数退避加随机抖动重试，每次尝试的结果都写入 PublishLog。
+    """
+
+    def __init__(self, batch_size: int = 50, poll_interval: float = 5.0, lease_seconds: int = 600,
+                 max_attempts: int = 5, retry_base_delay: float = 30.0, retry_max_delay: float = 3600.0,
+                 rate_per_minute: float = 6.0):
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.rate_per_minute = rate_per_minute
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        # 平台 -> 下一次允许发布的时刻（time.monotonic）
+        self._next_slot: Dict[str, float] = {}
+
+    # --- 入队 ---
+
+    async def find_account(self, db: AsyncSession, platform: str, username: Optional[str] = None) -> Optional[Account]:
+        query = select(Account).where(Account.platform == platform)
+        if username is not None:
+            query = query.where(Account.username == username)
+        return (await db.execute(query.order_by(Account.id).limit(1))).scalar_one_or_none()
+
+    async def enqueue(self, db: AsyncSession, novel_id: int, account: Account, chapter_ids: List[int],
+                      release_at: Optional[datetime] = None, interval_seconds: int = 0,
+                      idempotency_key: Optional[str] = None) -> List[PublishJob]:
+        """按章节顺序入队，第 i 章在 release_at + i * interval_seconds 发布
+
+        每个任务的幂等键为 平台:账号:章节（调用方传入 idempotency_key 时再加上该前缀），
+        重复提交返回已有任务而不会重复发布。
+        """
+        chapters = (await db.execute(
+            select(Chapter.id, Chapter.order)
+            .where(Chapter.novel_id == novel_id, Chapter.id.in_(chapter_ids))
+            .order_by(Chapter.order, Chapter.id)
+        )).all()
+        found = {row.id for row in chapters}
+        missing = [chapter_id for chapter_id in chapter_ids if chapter_id not in found]
+        if missing:
+            raise ValueError(f"Chapters not found in this novel: {missing}")
+
+        prefix = f"{account.platform}:{account.id}" + (f":{idempotency_key}" if idempotency_key else "")
+        start = as_utc(release_at) if release_at else utcnow()
+        keys = {row.id: f"{prefix}:{row.id}" for row in chapters}
+
+        for attempt in range(2):
+            existing = {
+                job.idempotency_key: job for job in (await db.execute(
+                    select(PublishJob).where(PublishJob.idempotency_key.in_(list(keys.values())))
+                )).scalars()
+            }
+            new_jobs = []
+            for i, row in enumerate(chapters):
+                if keys[row.id] in existing:
+                    continue
+                when = start + timedelta(seconds=i * interval_seconds)
+                new_jobs.append(PublishJob(
+                    idempotency_key=keys[row.id],
+                    platform=account.platform,
+                    account_id=account.id,
+                    novel_id=novel_id,
+                    chapter_id=row.id,
+                    release_at=when,
+                    next_attempt_at=when,
+                    status=PublishJobStatus.PENDING.value,
+                    attempts=0
+                ))
+            db.add_all(new_jobs)
+            try:
+                await db.commit()
+                break
+            except IntegrityError:
+                # 并发提交了相同的幂等键：回滚后重新读取已有任务
+                await db.rollback()
+                if attempt:
+                    raise
+
+        if new_jobs:
+            self.notify()
+        jobs = existing | {job.idempotency_key: job for job in new_jobs}
+        return [jobs[keys[row.id]] for row in chapters]
+
+    async def list_jobs(self, db: AsyncSession, novel_id: int, status: Optional[str] = None,
+                        limit: int = 50, offset: int = 0) -> List[PublishJob]:
+        query = select(PublishJob).where(PublishJob.novel_id == novel_id)
+        if status is not None:
+            query = query.where(PublishJob.status == status)
+        query = query.order_by(PublishJob.release_at, PublishJob.id).limit(limit).offset(offset)
+        return list((await db.execute(query)).scalars())
+
+    async def cancel(self, db: AsyncSession, novel_id: int, job_id: int) -> bool:
+        """只能取消尚未开始的任务"""
+        result = await db.execute(
+            update(PublishJob)
+            .where(PublishJob.id == job_id, PublishJob.novel_id == novel_id,
+                   PublishJob.status == PublishJobStatus.PENDING.value)
+            .values(status=PublishJobStatus.CANCELLED.value)
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+    # --- 调度 ---
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """有新任务入队时唤醒调度器，立即发布已到期的任务"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_due()
+            except Exception as e:
+                logger.error(f"Publish queue dispatch failed: {e}")
+                claimed = 0
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _claimable(self, now: datetime):
+        return or_(
+            and_(PublishJob.status == PublishJobStatus.PENDING.value, PublishJob.next_attempt_at <= now),
+            and_(PublishJob.status == PublishJobStatus.RUNNING.value, PublishJob.locked_until < now)
+        )
+
+    async def _claim(self) -> List[PublishJob]:
+        now = utcnow()
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(
+                select(PublishJob.id).where(self._claimable(now))
+                .order_by(PublishJob.next_attempt_at, PublishJob.id).limit(self.batch_size)
+            )).scalars().all()
+            if not ids:
+                return []
+            claimed = (await db.execute(
+                update(PublishJob)
+                .where(PublishJob.id.in_(ids), self._claimable(now))
+                .values(
+                    status=PublishJobStatus.RUNNING.value,
+                    locked_until=now + timedelta(seconds=self.lease_seconds),
+                    attempts=PublishJob.attempts + 1
+                )
+                .returning(PublishJob.id)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            await db.commit()
+            if not claimed:
+                return []
+            PUBLISH_JOBS_CLAIMED.inc(len(claimed))
+            return list((await db.execute(
+                select(PublishJob).where(PublishJob.id.in_(claimed))
+                .order_by(PublishJob.release_at, PublishJob.id)
+            )).scalars())
+
+    async def dispatch_due(self) -> int:
+        """领取并发布一批到期任务，返回领取的任务数"""
+        jobs = await self._claim()
+        groups: Dict[Tuple[str, int], List[PublishJob]] = defaultdict(list)
+        for job in jobs:
+            groups[(job.platform, job.account_id)].append(job)
+        await asyncio.gather(*[self._publish_group(platform, account_id, group) for (platform, account_id), group in groups.items()])
+        return len(jobs)
+
+    async def _wait_for_slot(self, platform: str, jobs: List[PublishJob]) -> List[PublishJob]:
+        """等待平台限速的发布时段；等待期间每半个租约周期续租一次，返回仍属于本 worker 的任务"""
+        delay = 0.0
+        if self.rate_per_minute > 0:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(platform, 0.0))
+            self._next_slot[platform] = slot + 60.0 / self.rate_per_minute
+            delay = slot - now
+        while delay > 0 and jobs:
+            step = min(delay, self.lease_seconds / 2)
+            await asyncio.sleep(step)
+            delay -= step
+            if delay > 0:
+                jobs = await self._renew_leases(jobs)
+        return await self._renew_leases(jobs)
+
+    async def _load_account(self, account_id: int) -> Optional[Account]:
+        async with AsyncSessionLocal() as db:
+            return await db.get(Account, account_id)
+
+    async def _load_chapter(self, chapter_id: int) -> Optional[Chapter]:
+        # 会话关闭后对象仍可读取（expire_on_commit=False），发布期间不占用连接
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(Chapter)
+                .options(undefer(Chapter.content), joinedload(Chapter.novel).load_only(Novel.id, Novel.title))
+                .where(Chapter.id == chapter_id)
+            )).scalar_one_or_none()
+
+    def _owned(self, job: PublishJob):
+        """本次领取仍然有效：任务在运行中，且没有被其他 worker 重新领取"""
+        return and_(PublishJob.id == job.id, PublishJob.status == PublishJobStatus.RUNNING.value,
+                    PublishJob.attempts == job.attempts)
+
+    async def _renew_leases(self, jobs: List[PublishJob]) -> List[PublishJob]:
+        """为仍属于本 worker 的任务续租，返回续租成功的任务"""
+        if not jobs:
+            return []
+        async with AsyncSessionLocal() as db:
+            renewed = set((await db.execute(
+                update(PublishJob).where(or_(*[self._owned(job) for job in jobs]))
+                .values(locked_until=utcnow() + timedelta(seconds=self.lease_seconds))
+                .returning(PublishJob.id)
+                .execution_options(synchronize_session=False)
+            )).scalars().all())
+            await db.commit()
+        lost = [job.id for job in jobs if job.id not in renewed]
+        if lost:
+            logger.warning(f"Publish job leases lost to another worker: {lost}")
+        return [job for job in jobs if job.id in renewed]
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _record(self, job: PublishJob, error: Optional[Exception]):
+        values = {"locked_until": None}
+        if error is None:
+            values.update(status=PublishJobStatus.SUCCEEDED.value, last_error=None)
+            result = "success"
+        elif job.attempts >= self.max_attempts:
+            values.update(status=PublishJobStatus.FAILED.value, last_error=str(error))
+            result = "failed"
+        else:
+            values.update(
+                status=PublishJobStatus.PENDING.value,
+                last_error=str(error),
+                next_attempt_at=utcnow() + timedelta(seconds=self._retry_delay(job.attempts))
+            )
+            result = "retry"
+        async with AsyncSessionLocal() as db:
+            updated = (await db.execute(
+                update(PublishJob).where(self._owned(job)).values(**values)
+                .execution_options(synchronize_session=False)
+            )).rowcount
+            if not updated:
+                # 租约已过期并被重新领取，任务状态由新的领取者写回；本次尝试仍记入日志
+                logger.warning(f"Publish job {job.id} was reclaimed before attempt {job.attempts} finished")
+                result = "lease_lost"
+            db.add(PublishLog(
+                platform=job.platform,
+                novel_id=job.novel_id,
+                chapter_id=job.chapter_id,
+                status="success" if error is None else "failed",
+                message=None if error is None else f"attempt {job.attempts}/{self.max_attempts}: {error}"
+            ))
+            await db.commit()
+        PUBLISH_JOB_RESULTS.labels(platform=job.platform, result=result).inc()
+
+    async def _publish_group(self, platform: str, account_id: int, jobs: List[PublishJob]):
+        """同一账号的任务共用一个浏览器会话依次发布"""
+        pending = list(jobs)
+        try:
+            adapter = get_adapter(platform)
+            account = await self._load_account(account_id)
+            if account is None:
+                raise ValueError(f"Account {account_id} not found")
+            password = account_service.get_password(account)
+            async with browser_pool.session(adapter, account.username, password) as context:
+                while pending:
+                    pending = await self._wait_for_slot(platform, pending)
+                    if not pending:
+                        break
+                    job = pending[0]
+                    error = None
+                    try:
+                        chapter = await self._load_chapter(job.chapter_id)
+                        if chapter is None:
+                            raise ValueError(f"Chapter {job.chapter_id} not found")
+                        if not await adapter.publish_chapter(chapter, context):
+                            raise ValueError(f"Publish failed for platform {platform}")
+                    except Exception as e:
+                        error = e
+                        # 可能是登录失效，下一组使用前重新检查
+                        browser_pool.invalidate(platform, account.username)
+                    pending.pop(0)
+                    await self._record(job, error)
+        except Exception as e:
+            # 登录失败或浏览器不可用：本组剩余任务全部按失败处理（会按退避重试）
+            logger.error(f"Publish group {platform}/{account_id} failed: {e}")
+            for job in pending:
+                await self._record(job, e)
+
+
+publish_queue = PublishQueue(
+    batch_size=settings.PUBLISH_QUEUE_BATCH_SIZE,
+    poll_interval=settings.PUBLISH_QUEUE_POLL_INTERVAL,
+    lease_seconds=settings.PUBLISH_QUEUE_LEASE_SECONDS,
+    max_attempts=settings.PUBLISH_MAX_ATTEMPTS,
+    retry_base_delay=settings.PUBLISH_RETRY_BASE_DELAY,
+    retry_max_delay=settings.PUBLISH_RETRY_MAX_DELAY,
+    rate_per_minute=settings.PUBLISH_RATE_PER_MINUTE
+)
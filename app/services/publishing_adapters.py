@@ -1,12 +1,11 @@
-import os
-import time
-import asyncio
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from tenacity import retry, stop_after_attempt, wait_fixed
-from playwright.async_api import async_playwright
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_not_exception_type
 from app.models.models import Account, Platform, Novel, Chapter, PublishLog, ChapterStatus
+from app.core.config import settings
 from app.core.security import security_manager
+from app.services.browser_pool import browser_pool
+from app.services.publish_checkpoints import publish_checkpoints, PublishStepError
 
 class AccountService:
     def encrypt(self, s: str) -> str:
@@ -25,6 +24,8 @@ class AccountService:
         if existing_acc:
             existing_acc.enc_password = self.encrypt(password)
             db.commit()
+            # 密码变更后旧的登录态不再可信
+            browser_pool.forget(platform.value, username)
             db.refresh(existing_acc)
             return existing_acc
             
@@ -46,20 +47,56 @@ class AccountService:
 account_service = AccountService()
 
 class PublisherAdapter:
-    def __init__(self, platform: Platform):
+    def __init__(self, platform: Platform, login_url: str = "", publish_url: str = ""):
         self.platform = platform
-        self.login_url = ""
-        self.publish_url = ""
+        self.login_url = login_url
+        self.publish_url = publish_url
+
+    async def is_logged_in(self, context: Any) -> bool:
+        """检查已保存的会话是否仍然有效：打开作者后台，未被重定向到登录页即视为已登录"""
+        page = await context.new_page()
+        try:
+            await page.goto(self.publish_url)
+            return not page.url.startswith(self.login_url)
+        except Exception:
+            return False
+        finally:
+            await page.close()
 
     async def login(self, username: str, password: str, context: Any) -> bool:
         """登录逻辑，需要子类实现"""
         raise NotImplementedError
 
-    async def publish_chapter(self, chapter: Chapter, context: Any) -> bool:
-        """发布章节逻辑，需要子类实现"""
+    # --- 发布步骤，需要子类实现；由 publish_checkpoints 编排、分别重试 ---
+
+    async def open_editor(self, chapter: Chapter, context: Any) -> Any:
+        """打开该小说的新章节编辑页，返回页面"""
         raise NotImplementedError
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+    async def submit(self, page: Any, chapter: Chapter):
+        """填写并提交章节"""
+        raise NotImplementedError
+
+    async def confirm(self, page: Any, chapter: Chapter) -> Optional[str]:
+        """等待提交成功，返回平台上的章节地址"""
+        raise NotImplementedError
+
+    async def find_published(self, chapter: Chapter, context: Any) -> Optional[str]:
+        """在作品章节列表中查找同名章节，找到时返回其地址；用于判断结果不明的提交是否已生效"""
+        raise NotImplementedError
+
+    async def publish_chapter(self, chapter: Chapter, context: Any) -> bool:
+        await publish_checkpoints.run(self, chapter, context)
+        return True
+
+    # 步骤已各自重试，这里只重试登录、浏览器等会话层面的失败
+    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_not_exception_type(PublishStepError), reraise=True)
+    async def _publish_with_session(self, chapter: Chapter, username: str, password: str):
+        # 复用浏览器池中的登录态；失败重试时不会重新启动浏览器，只在登录失效时重新登录
+        async with browser_pool.session(self, username, password) as context:
+            if not await self.publish_chapter(chapter, context):
+                raise ValueError(f"Publish failed for platform {self.platform.value}")
+
     async def publish(self, db: Session, chapter: Chapter) -> PublishLog:
         status = "success"
         message = None
@@ -70,25 +107,8 @@ class PublisherAdapter:
             if not acc:
                 raise ValueError(f"No account found for platform {self.platform.value}")
 
-            username = acc.username
             password = account_service.decrypt(acc.enc_password)
-
-            async with async_playwright() as p:
-                # 启动浏览器
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context()
-                page = await context.new_page()
-
-                # 登录
-                if not await self.login(username, password, context):
-                    raise ValueError(f"Login failed for platform {self.platform.value}")
-
-                # 发布章节
-                if not await self.publish_chapter(chapter, context):
-                    raise ValueError(f"Publish failed for platform {self.platform.value}")
-
-                # 关闭浏览器
-                await browser.close()
+            await self._publish_with_session(chapter, acc.username, password)
 
         except Exception as e:
             status = "failed"
@@ -102,9 +122,7 @@ class PublisherAdapter:
 
 class QidianAdapter(PublisherAdapter):
     def __init__(self):
-        super().__init__(Platform.QIDIAN)
-        self.login_url = "https://passport.qidian.com/"
-        self.publish_url = "https://author.qidian.com/"
+        super().__init__(Platform.QIDIAN, settings.QIDIAN_LOGIN_URL, settings.QIDIAN_AUTHOR_URL)
 
     async def login(self, username: str, password: str, context: Any) -> bool:
         """起点中文网登录逻辑"""
@@ -116,41 +134,60 @@ class QidianAdapter(PublisherAdapter):
             await page.fill("input[name='username']", username)
             await page.fill("input[name='password']", password)
             await page.click("button[type='submit']")
-            await page.wait_for_url("**/author.qidian.com/**", timeout=30000)
+            await page.wait_for_url(f"{self.publish_url}**", timeout=30000)
             await page.close()
             return True
         except Exception as e:
             await page.close()
             raise e
 
-    async def publish_chapter(self, chapter: Chapter, context: Any) -> bool:
-        """起点中文网发布章节逻辑"""
+    # 这里需要根据实际发布页面的HTML结构调整选择器
+
+    async def _open_novel(self, chapter: Chapter, context: Any) -> Any:
         page = await context.new_page()
-        await page.goto(self.publish_url)
-        
-        # 这里需要根据实际发布页面的HTML结构调整选择器
         try:
-            # 进入小说管理页面
+            await page.goto(self.publish_url)
             await page.click("text=我的作品")
             await page.click(f"text={chapter.novel.title}")
+            return page
+        except Exception:
+            await page.close()
+            raise
+
+    async def open_editor(self, chapter: Chapter, context: Any) -> Any:
+        """起点中文网：进入作品管理页并打开新章节编辑器"""
+        page = await self._open_novel(chapter, context)
+        try:
             await page.click("text=发布新章节")
-            
-            # 填写章节信息
-            await page.fill("input[name='chapterTitle']", chapter.title)
-            await page.fill("textarea[name='chapterContent']", chapter.content)
-            await page.click("button[type='submit']")
-            await page.wait_for_url("**/chapter/**", timeout=30000)
+            await page.wait_for_selector("input[name='chapterTitle']", timeout=30000)
+            return page
+        except Exception:
             await page.close()
-            return True
-        except Exception as e:
+            raise
+
+    async def submit(self, page: Any, chapter: Chapter):
+        await page.fill("input[name='chapterTitle']", chapter.title)
+        await page.fill("textarea[name='chapterContent']", chapter.content)
+        await page.click("button[type='submit']")
+
+    async def confirm(self, page: Any, chapter: Chapter) -> Optional[str]:
+        await page.wait_for_url("**/chapter/**", timeout=30000)
+        return page.url
+
+    async def find_published(self, chapter: Chapter, context: Any) -> Optional[str]:
+        page = await self._open_novel(chapter, context)
+        try:
+            # 标题完全相同的链接；get_by_role 会处理引号等特殊字符，"第1章" 不会匹配到 "第1章（修订）"
+            link = page.get_by_role("link", name=chapter.title, exact=True)
+            if await link.count() == 0:
+                return None
+            return await link.first.get_attribute("href") or page.url
+        finally:
             await page.close()
-            raise e
 
 class JinjiangAdapter(PublisherAdapter):
     def __init__(self):
-        super().__init__(Platform.JINJIANG)
-        self.login_url = "https://login.jjwxc.net/"
-        self.publish_url = "https://author.jjwxc.net/"
+        super().__init__(Platform.JINJIANG, settings.JINJIANG_LOGIN_URL, settings.JINJIANG_AUTHOR_URL)
 
     async def login(self, username: str, password: str, context: Any) -> bool:
         """晋江文学城登录逻辑"""
@@ -162,32 +199,63 @@ class JinjiangAdapter(PublisherAdapter):
             await page.fill("input[name='loginname']", username)
             await page.fill("input[name='password']", password)
             await page.click("button[type='submit']")
-            await page.wait_for_url("**/author.jjwxc.net/**", timeout=30000)
+            await page.wait_for_url(f"{self.publish_url}**", timeout=30000)
             await page.close()
             return True
         except Exception as e:
             await page.close()
             raise e
 
-    async def publish_chapter(self, chapter: Chapter, context: Any) -> bool:
-        """晋江文学城发布章节逻辑"""
+    # 这里需要根据实际发布页面的HTML结构调整选择器
+
+    async def _open_novel(self, chapter: Chapter, context: Any) -> Any:
         page = await context.new_page()
-        await page.goto(self.publish_url)
-        
-        # 这里需要根据实际发布页面的HTML结构调整选择器
         try:
-            # 进入小说管理页面
+            await page.goto(self.publish_url)
             await page.click("text=我的文章")
             await page.click(f"text={chapter.novel.title}")
+            return page
+        except Exception:
+            await page.close()
+            raise
+
+    async def open_editor(self, chapter: Chapter, context: Any) -> Any:
+        """晋江文学城：进入文章管理页并打开更新章节编辑器"""
+        page = await self._open_novel(chapter, context)
+        try:
             await page.click("text=更新章节")
-            
-            # 填写章节信息
-            await page.fill("input[name='chapter_title']", chapter.title)
-            await page.fill("textarea[name='chapter_content']", chapter.content)
-            await page.click("button[type='submit']")
-            await page.wait_for_url("**/chapter/**", timeout=30000)
+            await page.wait_for_selector("input[name='chapter_title']", timeout=30000)
+            return page
+        except Exception:
             await page.close()
-            return True
-        except Exception as e:
+            raise
+
+    async def submit(self, page: Any, chapter: Chapter):
+        await page.fill("input[name='chapter_title']", chapter.title)
+        await page.fill("textarea[name='chapter_content']", chapter.content)
+        await page.click("button[type='submit']")
+
+    async def confirm(self, page: Any, chapter: Chapter) -> Optional[str]:
+        await page.wait_for_url("**/chapter/**", timeout=30000)
+        return page.url
+
+    async def find_published(self, chapter: Chapter, context: Any) -> Optional[str]:
+        page = await self._open_novel(chapter, context)
+        try:
+            # 标题完全相同的链接；get_by_role 会处理引号等特殊字符，"第1章" 不会匹配到 "第1章（修订）"
+            link = page.get_by_role("link", name=chapter.title, exact=True)
+            if await link.count() == 0:
+                return None
+            return await link.first.get_attribute("href") or page.url
+        finally:
             await page.close()
-            raise e
+
+ADAPTERS = {
+    Platform.QIDIAN.value: QidianAdapter,
+    Platform.JINJIANG.value: JinjiangAdapter,
+}
+
+def get_adapter(platform: str) -> PublisherAdapter:
+    if platform not in ADAPTERS:
+        raise ValueError(f"Unsupported platform {platform}")
+    return ADAPTERS[platform]()
@@ -0,0 +1,155 @@
+import json
+import difflib
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Chapter, ChapterRevision
+
+def make_delta(base: str, target: str) -> List[list]:
+    """生成把 base 变为 target 的替换操作列表 [[start, end, 替换文本], ...]
+
+    先去掉公共前后缀（自动保存通常只改动一处），再对中间部分按行比较。
+    """
+    limit = min(len(base), len(target))
+    prefix = 0
+    while prefix < limit and base[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+
+    base_mid = base[prefix:len(base) - suffix]
+    target_mid = target[prefix:len(target) - suffix]
+    if not base_mid and not target_mid:
+        return []
+
+    base_lines = base_mid.splitlines(keepends=True)
+    target_lines = target_mid.splitlines(keepends=True)
+    if len(base_lines) <= 1 or len(target_lines) <= 1:
+        return [[prefix, prefix + len(base_mid), target_mid]]
+
+    # 行起始偏移，用于把行号换算为字符位置
+    offsets = [0]
+    for line in base_lines:
+        offsets.append(offsets[-1] + len(line))
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            ops.append([prefix + offsets[i1], prefix + offsets[i2], "".join(target_lines[j1:j2])])
+    return ops
+
+def apply_delta(base: str, ops: List[list]) -> str:
+    pieces = []
+    position = 0
+    for start, end, replacement in ops:
+        pieces.append(base[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(base[position:])
+    return "".join(pieces)
+
+class RevisionService:
+    """章节修订历史：增量链 + 定期全量快照
+
+    每个修订要么保存完整内容（快照），要么保存相对上一修订的增量。
+    每 REVISION_SNAPSHOT_INTERVAL 个修订强制一次快照，任意修订的重建最多
+    回放 REVISION_SNAPSHOT_INTERVAL - 1 个增量。
+    """
+
+    def _latest_snapshot(self, db: Session, chapter_id: int, up_to_id: Optional[int] = None) -> Optional[ChapterRevision]:
+        query = db.query(ChapterRevision).filter(
+            ChapterRevision.chapter_id == chapter_id,
+            ChapterRevision.delta.is_(None)
+        )
+        if up_to_id is not None:
+            query = query.filter(ChapterRevision.id <= up_to_id)
+        return query.order_by(ChapterRevision.id.desc()).first()
+
+    def reconstruct(self, db: Session, revision: ChapterRevision) -> str:
+        """从最近的快照开始回放增量，重建指定修订的内容"""
+        if revision.delta is None:
+            return revision.content or ""
+        snapshot = self._latest_snapshot(db, revision.chapter_id, revision.id)
+        content = (snapshot.content or "") if snapshot else ""
+        deltas = db.query(ChapterRevision.delta).filter(
+            ChapterRevision.chapter_id == revision.chapter_id,
+            ChapterRevision.id > (snapshot.id if snapshot else 0),
+            ChapterRevision.id <= revision.id
+        ).order_by(ChapterRevision.id).all()
+        for (delta,) in deltas:
+            content = apply_delta(content, json.loads(delta))
+        return content
+
+    def add_revision(self, db: Session, chapter: Chapter, content: str, commit: bool = True) -> ChapterRevision:
+        """追加一个修订
+
+        增量相对当前最新修订计算，因此应与章节的版本检查更新处于同一事务（commit=False，由调用方提交）：
+        并发保存时后一个事务在更新章节时即失败，不会基于同一个最新修订各算一份增量。
+        """
+        latest = db.query(ChapterRevision).filter(
+            ChapterRevision.chapter_id == chapter.id
+        ).order_by(ChapterRevision.id.desc()).first()
+
+        delta = None
+        if latest is not None:
+            snapshot = self._latest_snapshot(db, chapter.id)
+            since_snapshot = db.query(ChapterRevision).filter(
+                ChapterRevision.chapter_id == chapter.id,
+                ChapterRevision.id > (snapshot.id if snapshot else 0)
+            ).count()
+            if since_snapshot + 1 < settings.REVISION_SNAPSHOT_INTERVAL:
+                ops = make_delta(self.reconstruct(db, latest), content)
+                encoded = json.dumps(ops, ensure_ascii=False)
+                # 改动过大时增量不划算，直接存快照
+                if len(encoded) < len(content) // 2:
+                    delta = encoded
+
+        rev = ChapterRevision(
+            chapter_id=chapter.id,
+            content=None if delta is not None else content,
+            delta=delta,
+            content_length=len(content)
+        )
+        db.add(rev)
+        if commit:
+            db.commit()
+            db.refresh(rev)
+        else:
+            db.flush()
+        return rev
+
+    def list_revisions(self, db: Session, chapter_id: int) -> List[Dict[str, Any]]:
+        rows = db.query(
+            ChapterRevision.id, ChapterRevision.created_at, ChapterRevision.content_length,
+            ChapterRevision.delta.is_(None).label("is_snapshot")
+        ).filter(ChapterRevision.chapter_id == chapter_id).order_by(ChapterRevision.id).all()
+        return [
+            {
+                "id": row.id,
+                "number": number,
+                "created_at": row.created_at,
+                "content_length": row.content_length,
+                "is_snapshot": bool(row.is_snapshot)
+            }
+            for number, row in enumerate(rows, start=1)
+        ]
+
+    def get_revision(self, db: Session, chapter_id: int, revision_id: int) -> Optional[ChapterRevision]:
+        return db.query(ChapterRevision).filter(
+            ChapterRevision.chapter_id == chapter_id,
+            ChapterRevision.id == revision_id
+        ).first()
+
+    def diff(self, db: Session, from_revision: ChapterRevision, to_revision: ChapterRevision) -> str:
+        """两个修订之间的统一格式 diff"""
+        before = self.reconstruct(db, from_revision).splitlines(keepends=True)
+        after = self.reconstruct(db, to_revision).splitlines(keepends=True)
+        return "".join(difflib.unified_diff(
+            before, after,
+            fromfile=f"revision {from_revision.id}",
+            tofile=f"revision {to_revision.id}"
+        ))
+
+revision_service = RevisionService()
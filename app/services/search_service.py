@@ -0,0 +1,325 @@
+import re
+import html
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from sqlalchemy import event, text, select, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, undefer, object_session
+from app.core.config import settings
+from app.core.tracing import tracer
+from app.models.models import Chapter, Character, Location
+from app.services import search_tokenizer
+from app.services.search_tokenizer import get_jieba
+
+logger = logging.getLogger(__name__)
+
+# 引号内为短语，其余按空白切分为词项，所有子句之间为 AND 关系
+QUERY_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+# 本事务中正文有变更、提交后需要重新索引的章节：session.info 中的 chapter_id 集合
+PENDING_KEY = "search_reindex"
+
+
+class SearchService:
+    """章节全文检索
+
+    正文用 jieba 精确模式分词后以空格拼接，写入独立的索引表：
+    SQLite 使用 FTS5 虚表（unicode61 按空格切分），PostgreSQL 使用 'simple' 配置的 tsvector + GIN 索引。
+    章节正文变更的事务提交后再重新分词并写入索引：在事件循环中时作为后台任务，
+    分词通过 compute_executor 在进程池中完成；片段高亮基于原文生成。
+    分词词典为 jieba 默认词典加上该小说当前的角色名、地点名（见 search_tokenizer），
+    各 worker 对同一本小说的切分结果一致；名字变化前写入的章节可通过 rebuild() 重建索引。
+    """
+
+    def __init__(self):
+        # 进行中的后台索引任务，保留引用避免被回收
+        self._tasks: set = set()
+
+    # --- 分词 ---
+
+    def _terms_stmt(self, novel_id: int):
+        return (
+            select(Character.name).where(Character.novel_id == novel_id)
+            .union_all(select(Location.name).where(Location.novel_id == novel_id))
+        )
+
+    def novel_terms(self, connection: Connection, novel_id: int) -> Tuple[str, ...]:
+        """小说当前的角色名与地点名，作为分词词典的补充"""
+        return search_tokenizer.normalize_terms(connection.execute(self._terms_stmt(novel_id)).scalars().all())
+
+    def tokenize(self, content: str, terms: Tuple[str, ...] = ()) -> List[str]:
+        return search_tokenizer.tokenize(content, terms)
+
+    def warm_up(self):
+        """加载 jieba 词典（在启动预热线程中调用）"""
+        get_jieba().initialize()
+
+    def parse_query(self, query: str, terms: Tuple[str, ...] = ()) -> List[List[str]]:
+        """把查询拆成子句，每个子句是需要相邻出现的词序列"""
+        clauses = []
+        for phrase, term in QUERY_PATTERN.findall(query or ""):
+            tokens = self.tokenize(phrase or term, terms)
+            if tokens:
+                clauses.append(tokens)
+        return clauses
+
+    # --- 索引 ---
+
+    def ensure_schema(self, bind):
+        """创建索引表；已存在时不做任何事"""
+        with bind.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS chapter_search ("
+                    "chapter_id INTEGER PRIMARY KEY REFERENCES chapters(id) ON DELETE CASCADE, "
+                    "novel_id INTEGER NOT NULL, tsv tsvector NOT NULL)"
+                ))
+                connection.execute(text("CREATE INDEX IF NOT EXISTS ix_chapter_search_tsv ON chapter_search USING GIN (tsv)"))
+                connection.execute(text("CREATE INDEX IF NOT EXISTS ix_chapter_search_novel_id ON chapter_search (novel_id)"))
+            else:
+                connection.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS chapter_fts USING fts5("
+                    "tokens, novel_id UNINDEXED, tokenize='unicode61 remove_diacritics 0')"
+                ))
+
+    def _index_statements(self, dialect: str) -> List[Any]:
+        if dialect == "postgresql":
+            return [text(
+                "INSERT INTO chapter_search (chapter_id, novel_id, tsv) "
+                "VALUES (:chapter_id, :novel_id, to_tsvector('simple', :tokens)) "
+                "ON CONFLICT (chapter_id) DO UPDATE SET novel_id = EXCLUDED.novel_id, tsv = EXCLUDED.tsv"
+            )]
+        return [
+            text("DELETE FROM chapter_fts WHERE rowid = :chapter_id"),
+            text("INSERT INTO chapter_fts (rowid, tokens, novel_id) VALUES (:chapter_id, :tokens, :novel_id)")
+        ]
+
+    def index_chapter(self, connection: Connection, chapter_id: int, novel_id: int, content: Optional[str], terms: Optional[Tuple[str, ...]] = None):
+        """在当前线程中分词并写入索引（rebuild 使用）"""
+        if terms is None:
+            terms = self.novel_terms(connection, novel_id)
+        with tracer.span("search.tokenize", chars=len(content or "")):
+            tokens = search_tokenizer.index_tokens(content or "", terms)
+        params = {"chapter_id": chapter_id, "novel_id": novel_id, "tokens": tokens}
+        for statement in self._index_statements(connection.dialect.name):
+            connection.execute(statement, params)
+
+    def remove_chapter(self, connection: Connection, chapter_id: int):
+        table, column = ("chapter_search", "chapter_id") if connection.dialect.name == "postgresql" else ("chapter_fts", "rowid")
+        connection.execute(text(f"DELETE FROM {table} WHERE {column} = :chapter_id"), {"chapter_id": chapter_id})
+
+    def _chapter_stmt(self, chapter_id: int):
+        return select(Chapter.novel_id, Chapter.content, Chapter.version).where(Chapter.id == chapter_id)
+
+    def _version_stmt(self, chapter_id: int):
+        return select(Chapter.version).where(Chapter.id == chapter_id)
+
+    def schedule_reindex(self, chapter_ids: Iterable[int]):
+        """事务提交后调用：在事件循环中时作为后台任务执行，否则在当前线程中执行"""
+        chapter_ids = sorted(chapter_ids)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self.reindex_sync(chapter_ids)
+            return
+        task = loop.create_task(tracer.detached(self.reindex(chapter_ids)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """等待进行中的后台索引任务完成（测试与关闭时使用）"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def reindex(self, chapter_ids: List[int]):
+        """读取最新正文，在进程池中分词后写入索引；期间章节再次被修改时交给下一次索引"""
+        from app.core.database import AsyncSessionLocal
+        from app.services.compute_executor import compute_executor
+        for chapter_id in chapter_ids:
+            try:
+                async with AsyncSessionLocal() as db:
+                    row = (await db.execute(self._chapter_stmt(chapter_id))).first()
+                    if row is None:
+                        continue
+                    novel_id, content, version = row
+                    terms = search_tokenizer.normalize_terms((await db.execute(self._terms_stmt(novel_id))).scalars().all())
+                    # 分词期间不占用连接
+                    await db.commit()
+                    with tracer.span("search.tokenize", chars=len(content or "")):
+                        tokens = await compute_executor.run(search_tokenizer.index_tokens, content or "", terms, size=len(content or ""))
+                    if (await db.execute(self._version_stmt(chapter_id))).scalar() != version:
+                        continue
+                    params = {"chapter_id": chapter_id, "novel_id": novel_id, "tokens": tokens}
+                    for statement in self._index_statements(db.bind.dialect.name):
+                        await db.execute(statement, params)
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Search indexing of chapter {chapter_id} failed: {e}")
+
+    def reindex_sync(self, chapter_ids: List[int]):
+        """同 reindex，用于事件循环之外的线程（同步接口、脚本）"""
+        from app.core.database import SessionLocal
+        from app.services.compute_executor import compute_executor
+        for chapter_id in chapter_ids:
+            try:
+                with SessionLocal() as db:
+                    row = db.execute(self._chapter_stmt(chapter_id)).first()
+                    if row is None:
+                        continue
+                    novel_id, content, version = row
+                    terms = self.novel_terms(db.connection(), novel_id)
+                    db.commit()
+                    with tracer.span("search.tokenize", chars=len(content or "")):
+                        tokens = compute_executor.run_sync(search_tokenizer.index_tokens, content or "", terms, size=len(content or ""))
+                    if db.execute(self._version_stmt(chapter_id)).scalar() != version:
+                        continue
+                    params = {"chapter_id": chapter_id, "novel_id": novel_id, "tokens": tokens}
+                    for statement in self._index_statements(db.bind.dialect.name):
+                        db.execute(statement, params)
+                    db.commit()
+            except Exception as e:
+                logger.warning(f"Search indexing of chapter {chapter_id} failed: {e}")
+
+    def rebuild(self, db: Session, novel_id: Optional[int] = None, batch_size: int = 200) -> int:
+        """重建索引（全部或单本小说），返回处理的章节数"""
+        connection = db.connection()
+        query = select(Chapter.id).order_by(Chapter.id)
+        if novel_id is not None:
+            query = query.where(Chapter.novel_id == novel_id)
+        ids = db.execute(query).scalars().all()
+        terms_by_novel: Dict[int, Tuple[str, ...]] = {}
+        for i in range(0, len(ids), batch_size):
+            rows = db.execute(
+                select(Chapter.id, Chapter.novel_id, Chapter.content).where(Chapter.id.in_(ids[i:i + batch_size]))
+            ).all()
+            for chapter_id, chapter_novel_id, content in rows:
+                if chapter_novel_id not in terms_by_novel:
+                    terms_by_novel[chapter_novel_id] = self.novel_terms(connection, chapter_novel_id)
+                self.index_chapter(connection, chapter_id, chapter_novel_id, content, terms_by_novel[chapter_novel_id])
+        db.commit()
+        return len(ids)
+
+    # --- 查询 ---
+
+    def _fts5_query(self, clauses: List[List[str]]) -> str:
+        return " AND ".join('"' + " ".join(t.replace('"', '""') for t in tokens) + '"' for tokens in clauses)
+
+    def _tsquery(self, clauses: List[List[str]]) -> str:
+        def lexeme(token: str) -> str:
+            return "'" + token.replace("\\", "\\\\").replace("'", "''") + "'"
+        return " & ".join("(" + " <-> ".join(lexeme(t) for t in tokens) + ")" for tokens in clauses)
+
+    def search(self, db: Session, novel_id: int, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """按相关度分页返回命中的章节及高亮片段"""
+        connection = db.connection()
+        clauses = self.parse_query(query, self.novel_terms(connection, novel_id))
+        result = {"query": query, "total": 0, "offset": offset, "limit": limit, "results": []}
+        if not clauses:
+            return result
+
+        params = {"novel_id": novel_id, "limit": limit, "offset": offset}
+        if connection.dialect.name == "postgresql":
+            params["q"] = self._tsquery(clauses)
+            where = "FROM chapter_search s, to_tsquery('simple', :q) q WHERE s.novel_id = :novel_id AND s.tsv @@ q"
+            count_sql = f"SELECT count(*) {where}"
+            page_sql = f"SELECT s.chapter_id, ts_rank(s.tsv, q) AS score {where} ORDER BY score DESC, s.chapter_id LIMIT :limit OFFSET :offset"
+        else:
+            params["q"] = self._fts5_query(clauses)
+            where = "FROM chapter_fts WHERE chapter_fts MATCH :q AND novel_id = :novel_id"
+            count_sql = f"SELECT count(*) {where}"
+            # bm25 越小越相关，对外统一为越大越相关
+            page_sql = f"SELECT rowid AS chapter_id, -bm25(chapter_fts) AS score {where} ORDER BY bm25(chapter_fts), rowid LIMIT :limit OFFSET :offset"
+
+        result["total"] = connection.execute(text(count_sql), params).scalar() or 0
+        hits: List[Tuple[int, float]] = [(row[0], row[1]) for row in connection.execute(text(page_sql), params)]
+        if not hits:
+            return result
+
+        chapters = {
+            ch.id: ch for ch in db.execute(
+                select(Chapter).options(undefer(Chapter.content)).where(Chapter.id.in_([h[0] for h in hits]))
+            ).scalars()
+        }
+        pattern = self._highlight_pattern(clauses)
+        for chapter_id, score in hits:
+            ch = chapters.get(chapter_id)
+            if ch is None:
+                continue
+            snippet, match_count = self.snippet(ch.content or "", pattern)
+            result["results"].append({
+                "chapter_id": ch.id,
+                "order": ch.order,
+                "title": ch.title,
+                "score": round(float(score), 4),
+                "match_count": match_count,
+                "snippet": snippet
+            })
+        return result
+
+    def _highlight_pattern(self, clauses: List[List[str]]) -> re.Pattern:
+        # 词与词之间允许出现空白或标点（索引中标点已被丢弃）
+        alternatives = [r"[\W_]*".join(re.escape(t) for t in tokens) for tokens in clauses]
+        return re.compile("|".join(sorted(alternatives, key=len, reverse=True)), re.IGNORECASE)
+
+    def snippet(self, content: str, pattern: re.Pattern) -> Tuple[str, int]:
+        """在原文中截取第一处命中前后的文字，命中部分以 <mark> 包裹（其余内容已做 HTML 转义）"""
+        context = settings.SEARCH_SNIPPET_CHARS
+        matches = list(pattern.finditer(content))
+        if not matches:
+            return html.escape(content[:context * 2]), 0
+        start = max(0, matches[0].start() - context)
+        end = min(len(content), matches[0].end() + context)
+        parts = ["…" if start > 0 else ""]
+        cursor = start
+        for m in matches:
+            if m.start() >= end:
+                break
+            if m.start() < cursor:
+                continue
+            parts.append(html.escape(content[cursor:m.start()]))
+            parts.append("<mark>" + html.escape(m.group()) + "</mark>")
+            cursor = m.end()
+        parts.append(html.escape(content[cursor:max(cursor, end)]))
+        parts.append("…" if end < len(content) else "")
+        return "".join(parts), len(matches)
+
+
+search_service = SearchService()
+
+
+# --- 增量更新：正文变更的章节在事务提交后重新索引，分词不在 flush 中进行 ---
+
+def _mark_for_reindex(target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_KEY, set()).add(target.id)
+
+@event.listens_for(Chapter, "after_insert")
+def _index_new_chapter(mapper, connection, target):
+    _mark_for_reindex(target)
+
+@event.listens_for(Chapter, "after_update")
+def _reindex_chapter(mapper, connection, target):
+    # 只有正文被修改时才重新分词；未加载的延迟列不会产生历史记录
+    if inspect(target).attrs.content.history.has_changes():
+        _mark_for_reindex(target)
+
+@event.listens_for(Chapter, "after_delete")
+def _unindex_chapter(mapper, connection, target):
+    search_service.remove_chapter(connection, target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.get(PENDING_KEY, set()).discard(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _reindex_committed(session):
+    chapter_ids = session.info.pop(PENDING_KEY, None)
+    if chapter_ids:
+        search_service.schedule_reindex(chapter_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
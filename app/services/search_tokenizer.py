@@ -0,0 +1,68 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+from app.core.config import settings
+
+# 纯CPU的分词函数，不访问数据库，可在计算进程池中执行
+
+WORD_CHAR = re.compile(r"\w")
+
+_jieba = None
+# 词项元组 -> 带有这些词的 jieba.Tokenizer，按最近使用淘汰
+_tokenizers: "OrderedDict[Tuple[str, ...], object]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_jieba():
+    """首次分词时才导入 jieba；词典（约 1 秒）在启动预热或首次分词时加载"""
+    global _jieba
+    if _jieba is None:
+        import jieba
+        jieba.setLogLevel(logging.WARNING)
+        _jieba = jieba
+    return _jieba
+
+
+def get_tokenizer(terms: Tuple[str, ...] = ()):
+    """返回 默认词典 + terms 的分词器
+
+    默认分词器（jieba.dt）从不修改；每组词项使用独立的 Tokenizer，复制默认词典后再加入词项，
+    因此分词结果只取决于传入的词项，与进程先前处理过哪些小说无关。
+    """
+    jieba = get_jieba()
+    if not terms:
+        return jieba.dt
+    with _lock:
+        tokenizer = _tokenizers.get(terms)
+        if tokenizer is not None:
+            _tokenizers.move_to_end(terms)
+            return tokenizer
+        base = jieba.dt
+        base.check_initialized()
+        tokenizer = jieba.Tokenizer()
+        # 共享词条字符串，只复制字典本身（约 15MB），省去重新加载词典文件
+        tokenizer.FREQ = dict(base.FREQ)
+        tokenizer.total = base.total
+        tokenizer.initialized = True
+        for term in terms:
+            tokenizer.add_word(term)
+        _tokenizers[terms] = tokenizer
+        while len(_tokenizers) > max(1, settings.SEARCH_TOKENIZER_CACHE_SIZE):
+            _tokenizers.popitem(last=False)
+        return tokenizer
+
+
+def normalize_terms(names: Sequence[str]) -> Tuple[str, ...]:
+    """去重排序后的词项；单字名不加入词典"""
+    return tuple(sorted({name for name in names if name and len(name) > 1}))
+
+
+def tokenize(content: str, terms: Tuple[str, ...] = ()) -> List[str]:
+    return [t for t in get_tokenizer(terms).lcut(content or "") if WORD_CHAR.search(t)]
+
+
+def index_tokens(content: str, terms: Tuple[str, ...] = ()) -> str:
+    """写入索引表的文本：词项以空格拼接"""
+    return " ".join(tokenize(content, terms))
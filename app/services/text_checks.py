@@ -0,0 +1,131 @@
+import re
+from typing import List, Tuple, Dict, Any, Optional
+from app.services.consistency_rules import ConsistencyRuleEngine
+
+# 纯CPU的文本检查函数，不依赖数据库或LLM，可在独立进程中执行
+
+SENSITIVE_WORDS = ["暴力", "血腥", "涉黄"]
+
+# 常见中文语法问题规则：(正则, 提示, 建议, rule_id)
+GRAMMAR_PATTERNS = [
+    # 重复词语
+    (r'的的+', '重复使用"的"', '的', 'duplicate_word'),
+    (r'了了+', '重复使用"了"', '了', 'duplicate_word'),
+    (r'是是+', '重复使用"是"', '是', 'duplicate_word'),
+    (r'啊啊+', '重复使用"啊"', '啊', 'duplicate_word'),
+    (r'哦哦+', '重复使用"哦"', '哦', 'duplicate_word'),
+    (r'嗯嗯+', '重复使用"嗯"', '嗯', 'duplicate_word'),
+    
+    # 常见标点错误
+    (r'，+', '多个逗号连续使用', '，', 'punctuation_error'),
+    (r'。+', '多个句号连续使用', '。', 'punctuation_error'),
+    (r'、+', '多个顿号连续使用', '、', 'punctuation_error'),
+    
+    # 常见语法错误
+    (r'的得', '"的"和"得"使用错误', '的', 'grammar_error'),
+    (r'得了了', '"得"和"了"使用错误', '得了', 'grammar_error'),
+    (r'是在', '"是"和"在"使用错误', '是', 'grammar_error'),
+    
+    # 其他常见错误
+    (r'一个一个', '重复使用"一个"', '一个', 'redundant_phrase'),
+    (r'非常非常', '重复使用"非常"', '非常', 'redundant_phrase'),
+    (r'很很', '重复使用"很"', '很', 'redundant_phrase'),
+    (r'更加更加', '重复使用"更加"', '更加', 'redundant_phrase'),
+    (r'越来越越来越', '重复使用"越来越"', '越来越', 'redundant_phrase'),
+    (r'可以可以', '重复使用"可以"', '可以', 'redundant_phrase'),
+    (r'应该应该', '重复使用"应该"', '应该', 'redundant_phrase'),
+    (r'可能可能', '重复使用"可能"', '可能', 'redundant_phrase'),
+    (r'必须必须', '重复使用"必须"', '必须', 'redundant_phrase'),
+    (r'需要需要', '重复使用"需要"', '需要', 'redundant_phrase'),
+]
+
+_COMPILED_GRAMMAR_PATTERNS = [
+    (re.compile(pattern), message, suggestion, rule_id)
+    for pattern, message, suggestion, rule_id in GRAMMAR_PATTERNS
+]
+
+
+# 每个工作进程内的规则引擎，由 init_worker 预加载
+_rule_engine: Optional[ConsistencyRuleEngine] = None
+_rule_engine_config: Optional[tuple] = None
+
+
+def init_worker(rules_path: Optional[str] = None, window: int = 2, max_distance: int = 200):
+    """进程池初始化：加载逻辑规则集，预热已编译的正则"""
+    global _rule_engine, _rule_engine_config
+    config = (rules_path, window, max_distance)
+    if _rule_engine is None or _rule_engine_config != config:
+        _rule_engine = ConsistencyRuleEngine.from_file(rules_path, window=window, max_distance=max_distance)
+        _rule_engine_config = config
+
+
+def ping() -> bool:
+    """用于预热工作进程"""
+    return _rule_engine is not None
+
+
+def filter_sensitive(text: str, words: List[str] = SENSITIVE_WORDS) -> List[Tuple[str, int]]:
+    found = []
+    for w in words:
+        for m in re.finditer(re.escape(w), text):
+            found.append((w, m.start()))
+    return found
+
+
+def grammar_check(text: str) -> Dict[str, Any]:
+    corrections = []
+    for pattern, message, suggestion, rule_id in _COMPILED_GRAMMAR_PATTERNS:
+        for m in pattern.finditer(text):
+            corrections.append({
+                "start": m.start(),
+                "end": m.end(),
+                "message": message,
+                "suggestion": suggestion,
+                "rule_id": rule_id
+            })
+    
+    return {
+        "text": text,
+        "corrections": corrections,
+        "error_count": len(corrections)
+    }
+
+
+def logical_rule_check(text: str) -> List[Dict[str, Any]]:
+    """基于规则的逻辑一致性检查（时间/地点/人物状态矛盾）"""
+    if _rule_engine is None:
+        init_worker()
+    return _rule_engine.check(text)
+
+
+def proofread(text: str) -> Dict[str, Any]:
+    """单章校对：敏感词 + 语法检查，一次提交完成"""
+    return {"sensitive": filter_sensitive(text), "grammar": grammar_check(text)}
+
+
+# 批量校对包含的检查；LLM 一致性检查耗时且计费，只在单章接口中执行
+BATCH_CHECKS = ["grammar", "sensitive_word", "logic_rules"]
+
+
+def summarize_chapters(chapters: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """批量检查章节（语法、敏感词与逻辑规则，与单章的规则检查一致），只返回统计结果，减少跨进程传输的数据量"""
+    results = []
+    for chapter_id, text in chapters:
+        text = text or ""
+        counts: Dict[str, int] = {}
+        for correction in grammar_check(text)["corrections"]:
+            counts[correction["rule_id"]] = counts.get(correction["rule_id"], 0) + 1
+        sensitive = filter_sensitive(text)
+        if sensitive:
+            counts["sensitive_word"] = len(sensitive)
+        logic_issues = logical_rule_check(text)
+        for issue in logic_issues:
+            counts[issue["rule_id"]] = counts.get(issue["rule_id"], 0) + 1
+        results.append({
+            "chapter_id": chapter_id,
+            "counts": counts,
+            "error_count": sum(counts.values()),
+            "logic_issue_count": len(logic_issues),
+            "word_count": len(text)
+        })
+    return results
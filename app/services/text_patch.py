@@ -0,0 +1,64 @@
+import re
+from typing import List, Tuple
+
+# 文本补丁：供增量保存使用，任何不匹配都抛出 ValueError，由接口层转换为 422
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+def apply_splices(text: str, ops: List[Tuple[int, int, str]]) -> str:
+    """依次应用 (offset, delete, insert) 操作，每个 offset 基于上一个操作之后的文本"""
+    for offset, delete, insert in ops:
+        if offset < 0 or delete < 0 or offset + delete > len(text):
+            raise ValueError(f"Splice out of range: offset={offset}, delete={delete}, length={len(text)}")
+        text = text[:offset] + insert + text[offset + delete:]
+    return text
+
+def _parse_hunks(diff: str) -> List[Tuple[int, int, List[Tuple[str, str]]]]:
+    hunks = []
+    lines = None
+    for raw in diff.splitlines(keepends=True):
+        header = _HUNK_HEADER.match(raw)
+        if header:
+            old_start = int(header.group(1))
+            old_count = int(header.group(2)) if header.group(2) is not None else 1
+            lines = []
+            hunks.append((old_start, old_count, lines))
+        elif lines is None:
+            # 跳过 ---/+++ 等文件头
+            continue
+        elif raw.startswith("\\"):
+            # "\ No newline at end of file"：上一行没有换行符
+            if lines:
+                tag, content = lines[-1]
+                lines[-1] = (tag, content[:-1] if content.endswith("\n") else content)
+        elif raw[:1] in (" ", "-", "+"):
+            lines.append((raw[0], raw[1:]))
+        elif raw in ("\n", ""):
+            # 部分工具会把空的上下文行写成空行
+            lines.append((" ", raw))
+        else:
+            raise ValueError(f"Malformed diff line: {raw!r}")
+    return hunks
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """严格应用统一格式 diff，上下文不匹配时拒绝"""
+    source = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    for old_start, old_count, lines in _parse_hunks(diff):
+        start = old_start - 1 if old_count > 0 else old_start
+        if start < position or start > len(source):
+            raise ValueError(f"Hunk at line {old_start} is out of order or out of range")
+        result.extend(source[position:start])
+        position = start
+        for tag, content in lines:
+            if tag == "+":
+                result.append(content)
+                continue
+            if position >= len(source) or source[position] != content:
+                raise ValueError(f"Diff context does not match at line {position + 1}")
+            if tag == " ":
+                result.append(content)
+            position += 1
+    result.extend(source[position:])
+    return "".join(result)
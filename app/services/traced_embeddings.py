@@ -0,0 +1,19 @@
+from langchain_core.embeddings import Embeddings
+from app.core.tracing import tracer
+
+# 由 context_manager 在创建向量化客户端时导入，导入 main 时不加载 langchain_core
+
+
+class TracedEmbeddings(Embeddings):
+    """把向量化调用记录为 embedding 阶段，与向量库自身的检索/写入耗时区分开"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        with tracer.span("embedding", count=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with tracer.span("embedding", count=1):
+            return self.embeddings.embed_query(text)
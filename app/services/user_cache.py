@@ -0,0 +1,142 @@
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Set
+from cachetools import TLRUCache
+from app.core.config import settings
+from app.core.metrics import USER_CACHE_REQUESTS
+from app.models.models import User
+
+logger = logging.getLogger(__name__)
+
+# 缓存的用户字段；不包含密码哈希
+USER_CACHE_FIELDS = ("id", "username", "email", "is_active", "is_admin")
+
+
+class _IndexedTLRUCache(TLRUCache):
+    """过期或被淘汰的条目通过 on_remove 通知调用方，用于同步清理用户索引"""
+
+    def __init__(self, maxsize: int, ttu, on_remove):
+        super().__init__(maxsize=maxsize, ttu=ttu)
+        self._on_remove = on_remove
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, value in expired:
+            self._on_remove(key, value)
+        return expired
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_remove(key, value)
+        return key, value
+
+
+class UserCache:
+    """访问令牌 -> 用户 的短期缓存
+
+    键为令牌的 jti（旧令牌没有 jti 时用 用户名:签发时间）。每个条目的有效期取
+    USER_CACHE_TTL 与令牌剩余有效期中的较小值，因此不会长于 ACCESS_TOKEN_EXPIRE_MINUTES。
+    默认缓存在进程内；配置 USER_CACHE_REDIS 后改用 Redis，失效操作对所有 worker 生效。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 60, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._local = _IndexedTLRUCache(maxsize, lambda key, value, now: now + value["ttl"], self._unindex)
+        # 用户名 -> 该用户的缓存键，用于按用户失效；条目过期或被淘汰时同步移除，大小不超过缓存本身
+        self._keys_by_user: Dict[str, Set[str]] = {}
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+            except ImportError:
+                logger.warning("redis is not installed, falling back to the in-process user cache")
+
+    def _unindex(self, key: str, entry: Dict[str, Any]):
+        username = entry["user"]["username"]
+        keys = self._keys_by_user.get(username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[username]
+
+    @staticmethod
+    def token_key(payload: Dict[str, Any]) -> Optional[str]:
+        if payload.get("jti"):
+            return payload["jti"]
+        issued = payload.get("iat") or payload.get("exp")
+        if payload.get("sub") is None or issued is None:
+            return None
+        return f"{payload['sub']}:{issued}"
+
+    def _entry_ttl(self, payload: Dict[str, Any]) -> float:
+        ttl = min(self.ttl, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        if payload.get("exp") is not None:
+            ttl = min(ttl, payload["exp"] - time.time())
+        return ttl
+
+    def get(self, payload: Dict[str, Any]) -> Optional[User]:
+        key = self.token_key(payload)
+        data = None
+        if key is not None and self.ttl > 0:
+            if self._redis is not None:
+                try:
+                    raw = self._redis.get(f"user_cache:{key}")
+                    data = json.loads(raw) if raw else None
+                except Exception as e:
+                    logger.warning(f"User cache lookup failed: {e}")
+            else:
+                with self._lock:
+                    entry = self._local.get(key)
+                data = entry["user"] if entry else None
+        USER_CACHE_REQUESTS.labels(result="hit" if data else "miss").inc()
+        return User(**data) if data else None
+
+    def set(self, payload: Dict[str, Any], user: User):
+        key = self.token_key(payload)
+        ttl = self._entry_ttl(payload)
+        if key is None or ttl <= 0:
+            return
+        data = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline()
+                pipe.set(f"user_cache:{key}", json.dumps(data), px=int(ttl * 1000))
+                pipe.sadd(f"user_cache_keys:{user.username}", key)
+                pipe.expire(f"user_cache_keys:{user.username}", int(self.ttl) + 1)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"User cache write failed: {e}")
+            return
+        with self._lock:
+            self._local[key] = {"user": data, "ttl": ttl}
+            self._keys_by_user.setdefault(user.username, set()).add(key)
+
+    def invalidate_user(self, username: str):
+        """用户被禁用、修改密码或资料后调用，丢弃该用户的所有缓存条目"""
+        if self._redis is not None:
+            try:
+                keys = self._redis.smembers(f"user_cache_keys:{username}")
+                names = [f"user_cache:{k.decode() if isinstance(k, bytes) else k}" for k in keys]
+                self._redis.delete(*names, f"user_cache_keys:{username}")
+            except Exception as e:
+                logger.warning(f"User cache invalidation failed: {e}")
+            return
+        with self._lock:
+            for key in self._keys_by_user.pop(username, set()):
+                self._local.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._keys_by_user.clear()
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_MAXSIZE,
+    ttl=settings.USER_CACHE_TTL,
+    redis_url=settings.REDIS_URL if settings.USER_CACHE_REDIS else None
+)
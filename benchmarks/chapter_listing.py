@@ -0,0 +1,99 @@
+"""章节目录接口的响应体积与耗时：1000 章的小说，对比带正文的旧格式与默认的投影格式
+
+    python benchmarks/chapter_listing.py
+    python benchmarks/chapter_listing.py --chapters 1000 --chars 3000 --runs 10
+
+在临时 SQLite 数据库中生成数据，通过 TestClient 在进程内调用接口；每种方式按 X-Next-Cursor
+翻页取完全部章节，报告总字节数与耗时中位数。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = [
+    ("include_content=true", {"include_content": "true"}),
+    ("default projection", {}),
+    ("fields=id,title", {"fields": "id,title"}),
+]
+
+
+def _setup(chapters: int, chars: int):
+    tmp = tempfile.mkdtemp(prefix="novel-listing-")
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "DATABASE_URL": f"sqlite:///{tmp}/listing.db",
+        "CHROMA_PERSIST_DIRECTORY": f"{tmp}/chroma",
+        "LLM_BACKEND": "fake",
+        "PUBLISH_QUEUE_ENABLED": "false",
+        "WARM_UP_SERVICES": "false",
+        "BCRYPT_ROUNDS": "4",
+    })
+    sys.path.insert(0, ROOT)
+    import main
+    from app.init_db import init_db
+    from app.core.database import SessionLocal
+    from app.models.models import Chapter
+    init_db()
+
+    from fastapi.testclient import TestClient
+    client = TestClient(main.app)
+    client.post("/api/v1/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+    token = client.post("/api/v1/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    novel_id = client.post("/api/v1/novels/", json={"title": "T", "genre": "g", "style": "s", "synopsis": "x"}, headers=headers).json()["id"]
+
+    body = ("夜色深沉，城门之外传来脚步声。他缓缓抬起头，望向远处的山峦。" * (chars // 30 + 1))[:chars]
+    with SessionLocal() as db:
+        db.add_all([
+            Chapter(novel_id=novel_id, title=f"第{i}章", order=i, content=body, summary=body[:200])
+            for i in range(1, chapters + 1)
+        ])
+        db.commit()
+    return client, headers, novel_id
+
+
+def fetch_all(client, headers: Dict[str, str], novel_id: int, params: Dict[str, str]) -> Tuple[int, int, int]:
+    """返回 (章节数, 响应总字节数, 请求次数)"""
+    count = size = requests = 0
+    cursor = None
+    while True:
+        query = {**params, "limit": "1000", **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/api/v1/novels/{novel_id}/chapters", params=query, headers=headers)
+        response.raise_for_status()
+        count += len(response.json())
+        size += len(response.content)
+        requests += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return count, size, requests
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=1000)
+    parser.add_argument("--chars", type=int, default=3000, help="Characters per chapter body")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    client, headers, novel_id = _setup(args.chapters, args.chars)
+    print(f"{args.chapters} chapters x {args.chars} chars, median of {args.runs} runs\n")
+    print(f"{'listing':24} {'chapters':>8} {'requests':>8} {'payload':>12} {'median':>10}")
+    for name, params in VARIANTS:
+        fetch_all(client, headers, novel_id, params)
+        timings: List[float] = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            count, size, requests = fetch_all(client, headers, novel_id, params)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:24} {count:>8} {requests:>8} {size / 1024:>10.1f}KB {statistics.median(timings) * 1000:>8.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
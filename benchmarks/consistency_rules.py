@@ -0,0 +1,113 @@
+"""规则一致性检查：有界窗口的规则引擎对比旧的逐条 `A.*?B` 全文扫描
+
+    python benchmarks/consistency_rules.py
+    python benchmarks/consistency_rules.py --chars 100000 --runs 5 --no-legacy
+
+对内置规则集构造几类长文本（单段落最坏情况、正常分段的正文、规则词密集的正文），
+分别计时规则引擎与旧实现（每条规则一个非贪婪正则，会把相隔很远的两个词判为矛盾），并给出各自报出的问题数。
+旧实现在最坏情况下是超线性的，10 万字约需数十秒，可以用 --no-legacy 跳过。
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.consistency_rules import ConsistencyRuleEngine  # noqa: E402
+
+FILLER = "他推开门，屋里没有点灯，只有窗外的雪光映在地上"
+
+
+def _worst_case(chars: int, rng: random.Random) -> str:
+    """单个段落中大量出现规则的前一个词，却没有后一个词：旧正则每次都要扫到文末"""
+    piece = "昨天" + FILLER + "，"
+    return (piece * (chars // len(piece) + 1))[:chars]
+
+
+def _prose(chars: int, rng: random.Random) -> str:
+    """正常分段的正文，规则词零散出现，偶尔在同一句内构成矛盾"""
+    words = ["昨天", "今天", "上午", "下午", "北京", "上海", "室内", "室外"]
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = FILLER[:rng.randint(8, len(FILLER))]
+        if rng.random() < 0.3:
+            sentence = rng.choice(words) + sentence
+        if rng.random() < 0.1:
+            sentence += rng.choice(words)
+        sentence += "。" + ("\n" if rng.random() < 0.2 else "")
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def _dense(chars: int, rng: random.Random) -> str:
+    """规则词密集、很少换段的正文"""
+    words = ["昨天", "今天", "上午", "下午", "年初", "年底", "北京", "上海", "家里", "办公室"]
+    parts = []
+    size = 0
+    while size < chars:
+        piece = rng.choice(words) + FILLER[:rng.randint(2, 12)] + rng.choice("，。") + ("\n" if rng.random() < 0.01 else "")
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:chars]
+
+
+CASES: Dict[str, Callable[[int, random.Random], str]] = {
+    "worst case (1 paragraph)": _worst_case,
+    "prose": _prose,
+    "dense terms": _dense,
+}
+
+
+def _legacy_check(rules: List[dict], text: str) -> int:
+    """旧实现：每条规则一次非贪婪的全文正则扫描"""
+    count = 0
+    for rule in rules:
+        pattern = re.compile(re.escape(rule["first"]) + ".*?" + re.escape(rule["second"]))
+        count += sum(1 for _ in pattern.finditer(text))
+    return count
+
+
+def _time(fn: Callable[[], int], runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=100000, help="Characters per input")
+    parser.add_argument("--runs", type=int, default=5, help="Engine runs per input (median is reported)")
+    parser.add_argument("--no-legacy", action="store_true", help="Skip the old per-rule regex scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = ConsistencyRuleEngine.from_file()
+    rng = random.Random(args.seed)
+
+    print(f"{len(engine.rules)} rules, {args.chars} chars per input, window={engine.window}, max_distance={engine.max_distance}\n")
+    print(f"{'input':28} {'engine':>10} {'issues':>7} {'legacy':>10} {'issues':>7}")
+    for name, build in CASES.items():
+        text = build(args.chars, rng)
+        engine_time, engine_issues = _time(lambda: len(engine.check(text)), args.runs)
+        if args.no_legacy:
+            legacy = f"{'-':>10} {'-':>7}"
+        else:
+            legacy_time, legacy_issues = _time(lambda: _legacy_check(engine.rules, text), 1)
+            legacy = f"{legacy_time * 1000:>8.1f}ms {legacy_issues:>7}"
+        print(f"{name:28} {engine_time * 1000:>8.2f}ms {engine_issues:>7} {legacy}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
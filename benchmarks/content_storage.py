@@ -0,0 +1,184 @@
+"""正文压缩存储：各 CONTENT_COMPRESSION 设置下的存储体积、取行耗时与目录/状态接口的内存峰值
+
+    python benchmarks/content_storage.py
+    python benchmarks/content_storage.py --chapters 500 --chars 5000 --runs 10 --codec zlib --codec zstd
+
+每种编码在独立的子进程和临时 SQLite 数据库中生成同一本小说（正文由随机句子拼成，压缩率接近真实文本），
+通过 TestClient 在进程内调用接口，报告：
+- 正文列的总字节数与 VACUUM 后的数据库文件大小；
+- 读取单章（取行并解压）、章节目录（默认投影与 include_content=true）、修改章节状态的耗时中位数；
+- 同一批请求期间 tracemalloc 记录的 Python 内存峰值。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODECS = ["none", "zlib", "zstd"]
+
+SENTENCES = [
+    "夜色深沉，城门之外传来脚步声", "他缓缓抬起头，望向远处的山峦", "风从北方吹来，带着雪的气味",
+    "林舟握紧了剑柄，却没有拔出来", "客栈里的灯火一盏接一盏熄灭", "她说这条路从来没有人走完过",
+    "马蹄声在石板路上渐渐远去", "老人把信折好，放进了袖子里", "城墙上的旗帜被雨水打湿",
+    "没有人知道那天夜里发生了什么", "他想起了离家那年的春天", "钟声响了三下，又归于寂静",
+]
+
+
+def _body(rng: random.Random, chars: int) -> str:
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = rng.choice(SENTENCES) + rng.choice("。，！？") + ("\n" if rng.random() < 0.15 else "")
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def _setup(codec: str, chapters: int, chars: int):
+    tmp = tempfile.mkdtemp(prefix="novel-storage-")
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "DATABASE_URL": f"sqlite:///{tmp}/storage.db",
+        "CHROMA_PERSIST_DIRECTORY": f"{tmp}/chroma",
+        "LLM_BACKEND": "fake",
+        "PUBLISH_QUEUE_ENABLED": "false",
+        "WARM_UP_SERVICES": "false",
+        "BCRYPT_ROUNDS": "4",
+        "CONTENT_COMPRESSION": codec,
+    })
+    sys.path.insert(0, ROOT)
+    import main
+    from app.init_db import init_db
+    from app.core.database import SessionLocal
+    from app.models.models import Chapter
+    init_db()
+
+    from fastapi.testclient import TestClient
+    client = TestClient(main.app)
+    client.post("/api/v1/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+    token = client.post("/api/v1/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    novel_id = client.post("/api/v1/novels/", json={"title": "T", "genre": "g", "style": "s", "synopsis": "x"}, headers=headers).json()["id"]
+
+    rng = random.Random(0)
+    with SessionLocal() as db:
+        db.add_all([
+            Chapter(novel_id=novel_id, title=f"第{i}章", order=i, content=_body(rng, chars), word_count=chars)
+            for i in range(1, chapters + 1)
+        ])
+        db.commit()
+    return client, headers, novel_id, f"{tmp}/storage.db"
+
+
+def _storage(db_path: str) -> Tuple[int, int]:
+    """返回 (正文列总字节数, VACUUM 后的数据库文件大小)"""
+    from sqlalchemy import text
+    from app.core.database import engine
+    with engine.connect() as conn:
+        column = conn.execute(text("SELECT SUM(LENGTH(content_z)) FROM chapters")).scalar()
+        conn.execute(text("VACUUM"))
+    return column, os.path.getsize(db_path)
+
+
+def _measure(fn: Callable[[], None], runs: int) -> Tuple[float, int]:
+    """返回 (耗时中位数, 期间的内存峰值)"""
+    fn()
+    timings: List[float] = []
+    tracemalloc.start()
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def child(codec: str, chapters: int, chars: int, runs: int) -> Dict[str, float]:
+    client, headers, novel_id, db_path = _setup(codec, chapters, chars)
+    column_bytes, file_bytes = _storage(db_path)
+    ids = [c["id"] for c in client.get(f"/api/v1/novels/{novel_id}/chapters", params={"limit": "1000", "fields": "id"}, headers=headers).json()]
+
+    def list_chapters(params: Dict[str, str]) -> Callable[[], None]:
+        def fetch():
+            cursor = None
+            while True:
+                query = {**params, "limit": "1000", **({"cursor": cursor} if cursor else {})}
+                response = client.get(f"/api/v1/novels/{novel_id}/chapters", params=query, headers=headers)
+                response.raise_for_status()
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    return
+        return fetch
+
+    rng = random.Random(1)
+
+    def get_chapter():
+        client.get(f"/api/v1/novels/chapters/{rng.choice(ids)}", headers=headers).raise_for_status()
+
+    # draft -> reviewing，之后在 rejected 与 reviewing 之间往返
+    status_ids = ids[:runs + 1]
+    for chapter_id in status_ids:
+        client.post(f"/api/v1/novels/{novel_id}/chapters/{chapter_id}/status/reviewing", headers=headers).raise_for_status()
+    targets = {chapter_id: "rejected" for chapter_id in status_ids}
+    status_rng = random.Random(2)
+
+    def change_status():
+        chapter_id = status_rng.choice(status_ids)
+        client.post(f"/api/v1/novels/{novel_id}/chapters/{chapter_id}/status/{targets[chapter_id]}", headers=headers).raise_for_status()
+        targets[chapter_id] = "reviewing" if targets[chapter_id] == "rejected" else "rejected"
+
+    result = {"column_bytes": column_bytes, "file_bytes": file_bytes}
+    for name, fn, n in (
+        ("get_chapter", get_chapter, runs * 10),
+        ("list", list_chapters({}), runs),
+        ("list_content", list_chapters({"include_content": "true"}), runs),
+        ("status", change_status, runs * 10),
+    ):
+        result[name], result[f"{name}_peak"] = _measure(fn, n)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=500)
+    parser.add_argument("--chars", type=int, default=5000, help="Characters per chapter body")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--codec", action="append", choices=CODECS, help="CONTENT_COMPRESSION values to compare (default: all)")
+    parser.add_argument("--child", choices=CODECS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.chapters, args.chars, args.runs)))
+        return 0
+
+    results = {}
+    for codec in args.codec or CODECS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", codec, "--chapters", str(args.chapters), "--chars", str(args.chars), "--runs", str(args.runs)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        results[codec] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.chapters} chapters x {args.chars} chars, median of {args.runs} runs (x10 for single-chapter and status requests)\n")
+    print(f"{'codec':8} {'content':>10} {'db file':>10} {'get':>9} {'list':>9} {'list+body':>10} {'status':>9}   peak memory (list / list+body / status)")
+    for codec, r in results.items():
+        print(
+            f"{codec:8} {r['column_bytes'] / 1024 / 1024:>8.2f}MB {r['file_bytes'] / 1024 / 1024:>8.2f}MB "
+            f"{r['get_chapter'] * 1000:>7.2f}ms {r['list'] * 1000:>7.1f}ms {r['list_content'] * 1000:>8.1f}ms {r['status'] * 1000:>7.2f}ms   "
+            f"{r['list_peak'] / 1024:.0f}KB / {r['list_content_peak'] / 1024:.0f}KB / {r['status_peak'] / 1024:.0f}KB"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""端到端压测：以目标并发驱动真实的 FastAPI 应用，按接口统计吞吐与 p50/p95/p99
+
+默认在临时目录中启动一个 uvicorn 实例（SQLite + LLM_BACKEND=fake，不调用 OpenAI），
+也可以用 --url 指向已启动的服务（该服务需自行配置 LLM_BACKEND=fake）。
+
+    python benchmarks/loadtest.py --concurrency 8 --duration 30
+    python benchmarks/loadtest.py --baseline benchmarks/baselines/fake-c8.json
+    python benchmarks/loadtest.py --save-baseline benchmarks/baselines/fake-c8.json
+
+与基线对比时，任一接口 p95 变慢超过 --tolerance（且超过 --min-delta-ms），
+或总吞吐下降超过 --tolerance，退出码为 1。
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = "/api/v1"
+
+# 模拟模型参数：比默认值快，使一次压测在几十秒内完成
+FAKE_ENV = {
+    "FAKE_LLM_TTFT": "0.2",
+    "FAKE_LLM_TOKENS_PER_SECOND": "200",
+    "FAKE_LLM_OUTPUT_TOKENS": "100",
+    "FAKE_LLM_ERROR_RATE": "0",
+    "FAKE_EMBEDDING_LATENCY": "0.01",
+}
+
+CHAPTER_TEXT = "夜色深沉，城门之外传来脚步声。他缓缓抬起头，望向远处的山峦，心中涌起一阵说不清的情绪。" * 40
+
+# (场景, 权重)
+SCENARIOS = [
+    ("get_chapter", 20),
+    ("list_chapters", 10),
+    ("search", 5),
+    ("world_crud", 10),
+    ("proofread", 5),
+    ("consistency_check", 5),
+    ("stream_improve", 5),
+    ("stream_continue", 5),
+    ("create_chapter", 3),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法百分位"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.ttfb: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    def add(self, endpoint: str, seconds: float, ok: bool, ttfb: Optional[float] = None):
+        if not self.recording:
+            return
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if ttfb is not None:
+            self.ttfb.setdefault(endpoint, []).append(ttfb)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, values in sorted(self.samples.items()):
+            ms = [v * 1000 for v in values]
+            stats = {
+                "count": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(ms, 50), 1),
+                "p95_ms": round(percentile(ms, 95), 1),
+                "p99_ms": round(percentile(ms, 99), 1),
+            }
+            if endpoint in self.ttfb:
+                ttfb = [v * 1000 for v in self.ttfb[endpoint]]
+                stats["ttfb_p50_ms"] = round(percentile(ttfb, 50), 1)
+                stats["ttfb_p95_ms"] = round(percentile(ttfb, 95), 1)
+            endpoints[endpoint] = stats
+        total = sum(len(v) for v in self.samples.values())
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class Worker:
+    """一个虚拟用户：拥有自己的小说、章节与角色，按权重循环执行场景"""
+
+    def __init__(self, client: httpx.AsyncClient, headers: Dict[str, str], recorder: Recorder, seed: int):
+        self.client = client
+        self.headers = headers
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.novel_id = 0
+        self.chapter_ids: List[int] = []
+        self.next_order = 100
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.add(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    async def stream(self, endpoint: str, url: str, body: Dict[str, Any]):
+        start = time.perf_counter()
+        ttfb = None
+        ok = False
+        try:
+            async with self.client.stream("POST", url, headers=self.headers, json=body) as response:
+                ok = response.status_code < 400
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start
+                    if '"error"' in line:
+                        ok = False
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.add(endpoint, time.perf_counter() - start, ok, ttfb)
+
+    async def setup(self):
+        response = await self.client.post(f"{API}/novels/", headers=self.headers, json={
+            "title": f"压测小说{uuid.uuid4().hex[:6]}", "genre": "玄幻", "style": "fantasy", "synopsis": "压测用"
+        })
+        response.raise_for_status()
+        self.novel_id = response.json()["id"]
+        for order in range(1, 4):
+            response = await self.client.post(f"{API}/novels/{self.novel_id}/chapters", headers=self.headers, json={
+                "title": f"第{order}章", "order": order, "outline_snippet": "主角进城"
+            })
+            response.raise_for_status()
+            chapter = response.json()
+            chapter_id = chapter["id"]
+            await self.client.put(f"{API}/novels/chapters/{chapter_id}", headers=self.headers, json={
+                "content": CHAPTER_TEXT, "base_version": chapter["version"]
+            })
+            self.chapter_ids.append(chapter_id)
+        await self.client.post(f"{API}/novels/{self.novel_id}/characters", headers=self.headers, json={
+            "name": "林风", "role": "主角", "description": "少年剑客"
+        })
+
+    async def run_scenario(self, name: str):
+        novel = f"{API}/novels/{self.novel_id}"
+        chapter_id = self.rng.choice(self.chapter_ids)
+        if name == "get_chapter":
+            await self.call("GET /novels/chapters/{id}", "GET", f"{API}/novels/chapters/{chapter_id}")
+        elif name == "list_chapters":
+            await self.call("GET /novels/{id}/chapters", "GET", f"{novel}/chapters")
+        elif name == "search":
+            await self.call("GET /novels/{id}/search", "GET", f"{novel}/search", params={"q": "城门"})
+        elif name == "world_crud":
+            response = await self.call("POST /novels/{id}/characters", "POST", f"{novel}/characters", json={
+                "name": f"路人{self.rng.randint(1, 9999)}", "role": "配角", "description": "路过的商人"
+            })
+            await self.call("GET /novels/{id}/characters", "GET", f"{novel}/characters")
+            if response is not None and response.status_code < 400:
+                character_id = response.json()["id"]
+                await self.call("PUT /characters/{id}", "PUT", f"{API}/characters/{character_id}", json={
+                    "name": "路人", "role": "配角", "description": "改过的描述"
+                })
+                await self.call("DELETE /characters/{id}", "DELETE", f"{API}/characters/{character_id}")
+        elif name == "proofread":
+            await self.call("POST /chapters/{id}/proofread", "POST", f"{novel}/chapters/{chapter_id}/proofread")
+        elif name == "consistency_check":
+            await self.call("POST /chapters/{id}/consistency_check", "POST", f"{novel}/chapters/{chapter_id}/consistency_check")
+        elif name == "stream_improve":
+            await self.stream("POST /chapters/{id}/stream_improve", f"{novel}/chapters/{chapter_id}/stream_improve",
+                              {"content": CHAPTER_TEXT[:200]})
+        elif name == "stream_continue":
+            await self.stream("POST /chapters/{id}/stream_continue", f"{novel}/chapters/{chapter_id}/stream_continue",
+                              {"preceding_text": CHAPTER_TEXT[:300], "following_text": ""})
+        elif name == "create_chapter":
+            self.next_order += 1
+            await self.call("POST /novels/{id}/chapters", "POST", f"{novel}/chapters", json={
+                "title": f"第{self.next_order}章", "order": self.next_order, "outline_snippet": "主角出城"
+            })
+
+    async def loop(self, deadline: float):
+        names = [name for name, _ in SCENARIOS]
+        weights = [weight for _, weight in SCENARIOS]
+        while time.perf_counter() < deadline:
+            await self.run_scenario(self.rng.choices(names, weights)[0])
+
+
+async def authenticate(client: httpx.AsyncClient) -> Dict[str, str]:
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+    response = await client.post(f"{API}/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password
+    })
+    response.raise_for_status()
+    response = await client.post(f"{API}/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_load(url: str, concurrency: int, duration: float, warmup: float, seed: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        headers = await authenticate(client)
+        workers = [Worker(client, headers, recorder, seed + i) for i in range(concurrency)]
+        await asyncio.gather(*(worker.setup() for worker in workers))
+
+        start = time.perf_counter()
+        deadline = start + warmup + duration
+        tasks = [asyncio.create_task(worker.loop(deadline)) for worker in workers]
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*tasks)
+        return recorder.report(time.perf_counter() - measured_from)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, extra_env: Dict[str, str]) -> (subprocess.Popen, str, str):
+    """在临时目录中初始化数据库并启动 uvicorn，返回 (进程, 地址, 临时目录)"""
+    tmp = tempfile.mkdtemp(prefix="novel-bench-")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+        "CHROMA_PERSIST_DIRECTORY": f"{tmp}/chroma",
+        "PROOFREAD_REPORT_DIRECTORY": f"{tmp}/reports",
+        "PUBLISH_SESSION_DIR": f"{tmp}/sessions",
+        "PUBLISH_QUEUE_ENABLED": "false",
+        "LLM_BACKEND": "fake",
+        **FAKE_ENV,
+        **extra_env,
+    }
+    subprocess.run([sys.executable, "-m", "app.init_db"], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(f"{tmp}/server.log", "w")
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup, see {tmp}/server.log")
+        try:
+            if httpx.get(f"{url}/", timeout=1).status_code == 200:
+                return process, url, tmp
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Server did not become ready, see {tmp}/server.log")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """返回相对基线的退化项"""
+    regressions = []
+    for endpoint, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(endpoint)
+        if current is None:
+            regressions.append(f"{endpoint}: no samples")
+            continue
+        limit = base["p95_ms"] * (1 + tolerance)
+        if current["p95_ms"] > limit and current["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            regressions.append(f"{endpoint}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tolerance:.0%})")
+        if current["errors"] > base.get("errors", 0) and current["errors"] / current["count"] > 0.01:
+            regressions.append(f"{endpoint}: {current['errors']} errors")
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps (-{tolerance:.0%})")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{result['requests']} requests in {result['elapsed_s']}s, "
+          f"{result['throughput_rps']} req/s, {result['errors']} errors\n")
+    header = f"{'endpoint':42} {'count':>6} {'err':>4} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'ttfb p50':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, s in result["endpoints"].items():
+        ttfb = f"{s['ttfb_p50_ms']:>9}" if "ttfb_p50_ms" in s else f"{'':>9}"
+        print(f"{endpoint:42} {s['count']:>6} {s['errors']:>4} {s['rps']:>7} "
+              f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} {ttfb}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Existing server; by default a temporary uvicorn instance is started")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds excluded from the results")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--baseline", help="Compare against this JSON result")
+    parser.add_argument("--save-baseline", help="Write the result as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative p95/throughput regression")
+    parser.add_argument("--min-delta-ms", type=float, default=50, help="Ignore p95 regressions smaller than this")
+    parser.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE for the started server")
+    args = parser.parse_args()
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    process = None
+    url = args.url
+    if url is None:
+        process, url, tmp = start_server(args.server_workers, extra_env)
+        print(f"Started server at {url} (data in {tmp})")
+    try:
+        result = asyncio.run(run_load(url, args.concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    result["config"] = {
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "server_workers": args.server_workers,
+        "fake_llm": {**FAKE_ENV, **{k: v for k, v in extra_env.items() if k.startswith("FAKE_")}},
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+    }
+    print_report(result)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
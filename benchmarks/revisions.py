@@ -0,0 +1,120 @@
+"""章节修订历史的存储体积与重建耗时：增量链 + 定期快照，对比每次保存完整副本
+
+    python benchmarks/revisions.py
+    python benchmarks/revisions.py --revisions 500 --chars 20000 --interval 20
+
+在临时 SQLite 数据库中模拟一章被反复自动保存（每次改动一两处），通过 RevisionService 写入修订；
+报告数据库中修订内容的实际字节数（压缩后）、写入耗时，以及重建每个修订与 diff 接口的耗时。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import tempfile
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setup(interval: int):
+    tmp = tempfile.mkdtemp(prefix="novel-revisions-")
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "DATABASE_URL": f"sqlite:///{tmp}/revisions.db",
+        "CHROMA_PERSIST_DIRECTORY": f"{tmp}/chroma",
+        "REVISION_SNAPSHOT_INTERVAL": str(interval),
+    })
+    sys.path.insert(0, ROOT)
+    from app.core.database import engine, Base
+    from app.models import models  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+
+
+def _edits(chars: int, revisions: int, seed: int) -> List[str]:
+    """一章正文的 revisions 个版本，每个版本在随机位置改写、插入或删除一小段"""
+    rng = random.Random(seed)
+    sentence = "夜色深沉，城门之外传来脚步声。他缓缓抬起头，望向远处的山峦。\n"
+    text = (sentence * (chars // len(sentence) + 1))[:chars]
+    versions = []
+    for _ in range(revisions):
+        for _ in range(rng.randint(1, 2)):
+            start = rng.randrange(len(text))
+            end = min(len(text), start + rng.randrange(40))
+            text = text[:start] + rng.choice(["", "一阵风吹过，", "灯火摇曳。\n", "他沉默良久"]) + text[end:]
+        versions.append(text)
+    return versions
+
+
+def _stored_bytes(db, chapter_id: int) -> int:
+    from sqlalchemy import text
+    return db.execute(
+        text("SELECT COALESCE(SUM(LENGTH(content_z)), 0) + COALESCE(SUM(LENGTH(delta_z)), 0) FROM chapter_revisions WHERE chapter_id = :id"),
+        {"id": chapter_id}
+    ).scalar()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=500)
+    parser.add_argument("--chars", type=int, default=20000, help="Characters in the chapter body")
+    parser.add_argument("--interval", type=int, default=20, help="REVISION_SNAPSHOT_INTERVAL")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    _setup(args.interval)
+    from app.core.database import SessionLocal
+    from app.core.config import settings
+    from app.models.models import Chapter, ChapterRevision
+    from app.services.revision_service import revision_service
+
+    versions = _edits(args.chars, args.revisions, args.seed)
+    with SessionLocal() as db:
+        chain = Chapter(title="增量链", order=1, content=versions[0])
+        copies = Chapter(title="完整副本", order=2, content=versions[0])
+        db.add_all([chain, copies])
+        db.commit()
+
+        write_timings = []
+        for content in versions:
+            start = time.perf_counter()
+            revision_service.add_revision(db, chain, content)
+            write_timings.append(time.perf_counter() - start)
+            # 对照组：每次保存一份完整内容（同样经过 CompressedText 压缩）
+            db.add(ChapterRevision(chapter_id=copies.id, content=content, content_length=len(content)))
+        db.commit()
+
+        chain_bytes = _stored_bytes(db, chain.id)
+        copy_bytes = _stored_bytes(db, copies.id)
+
+        revisions = db.query(ChapterRevision).filter(ChapterRevision.chapter_id == chain.id).order_by(ChapterRevision.id).all()
+        rebuild_timings = []
+        for revision, expected in zip(revisions, versions):
+            db.expire_all()
+            start = time.perf_counter()
+            content = revision_service.reconstruct(db, revision)
+            rebuild_timings.append(time.perf_counter() - start)
+            assert content == expected, f"revision {revision.id} rebuilt incorrectly"
+
+        diff_timings = []
+        for i in range(0, len(revisions) - 1, max(1, len(revisions) // 50)):
+            start = time.perf_counter()
+            revision_service.diff(db, revisions[i], revisions[i + 1])
+            diff_timings.append(time.perf_counter() - start)
+
+        snapshots = sum(1 for r in revisions if r.delta is None)
+
+    print(f"{args.revisions} revisions of a {args.chars}-char chapter, snapshot interval {args.interval}, "
+          f"CONTENT_COMPRESSION={settings.CONTENT_COMPRESSION}\n")
+    print(f"{'storage':24} {'bytes':>12}")
+    print(f"{'full copy per save':24} {copy_bytes / 1024:>10.1f}KB")
+    print(f"{'delta chain':24} {chain_bytes / 1024:>10.1f}KB  ({copy_bytes / max(chain_bytes, 1):.1f}x smaller, {snapshots} snapshots)\n")
+    print(f"{'operation':24} {'median':>10} {'max':>10}")
+    for name, timings in (("add_revision", write_timings), ("reconstruct", rebuild_timings), ("diff (adjacent)", diff_timings)):
+        print(f"{name:24} {statistics.median(timings) * 1000:>8.2f}ms {max(timings) * 1000:>8.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""冷启动检查：在全新进程中导入 main，报告导入耗时最多的包，并断言启动预算
+
+    python benchmarks/startup.py                  # 导入耗时（5 次取中位数）与最慢的包
+    python benchmarks/startup.py --budget 1.5     # 超过预算时退出码为 1
+    python benchmarks/startup.py --serve          # 另测 uvicorn 从启动到响应第一个请求的时间
+
+LAZY_MODULES 中的依赖应在首次使用或启动预热时才导入，导入 main 时出现即视为失败。
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = [
+    "langchain_openai", "openai", "chromadb", "langchain_community", "langchain_core", "langsmith", "jieba", "playwright"
+]
+
+_CHILD = """
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+loaded = [m for m in {lazy!r} if m in sys.modules]
+print(f"{{elapsed}}|{{','.join(loaded)}}")
+"""
+
+
+def _env() -> Dict[str, str]:
+    tmp = tempfile.mkdtemp(prefix="novel-startup-")
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "startup-check"),
+        "DATABASE_URL": f"sqlite:///{tmp}/startup.db",
+        "CHROMA_PERSIST_DIRECTORY": f"{tmp}/chroma",
+        "PUBLISH_QUEUE_ENABLED": "false",
+    }
+
+
+def measure_import(env: Dict[str, str]) -> Tuple[float, List[str], str]:
+    """返回 (导入耗时, 已加载的延迟模块, -X importtime 输出)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(lazy=LAZY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    elapsed, loaded = result.stdout.strip().splitlines()[-1].split("|")
+    return float(elapsed), [m for m in loaded.split(",") if m], result.stderr
+
+
+def top_packages(importtime: str, limit: int) -> List[Tuple[str, float]]:
+    """按顶层包汇总 -X importtime 的自身耗时（秒）"""
+    totals: Dict[str, float] = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def measure_serve(env: Dict[str, str]) -> float:
+    """uvicorn 从启动进程到 / 返回 200 的时间"""
+    import httpx
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < 120:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        raise RuntimeError("Server did not become ready")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="Median seconds allowed for `import main`")
+    parser.add_argument("--serve", action="store_true", help="Also measure uvicorn time to first response")
+    parser.add_argument("--serve-budget", type=float, default=5.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = _env()
+    # 第一次运行生成 .pyc，不计入结果
+    measure_import(env)
+    runs = [measure_import(env) for _ in range(args.runs)]
+    timings = [elapsed for elapsed, _, _ in runs]
+    median = statistics.median(timings)
+    _, loaded, importtime = runs[timings.index(min(timings, key=lambda t: abs(t - median)))]
+
+    print(f"import main: median {median:.2f}s (min {min(timings):.2f}s, max {max(timings):.2f}s, {args.runs} runs)\n")
+    print(f"{'package':32} {'self time':>10}")
+    for package, seconds in top_packages(importtime, args.top):
+        print(f"{package:32} {seconds * 1000:>8.1f}ms")
+
+    failures = []
+    if median > args.budget:
+        failures.append(f"import main took {median:.2f}s, budget {args.budget:.2f}s")
+    if loaded:
+        failures.append(f"modules that should load lazily were imported: {', '.join(loaded)}")
+    if args.serve:
+        ready = measure_serve(env)
+        print(f"\nuvicorn ready after {ready:.2f}s")
+        if ready > args.serve_budget:
+            failures.append(f"uvicorn took {ready:.2f}s to serve the first request, budget {args.serve_budget:.2f}s")
+
+    if failures:
+        print("\nCold-start check failed:")
+        for line in failures:
+            print(f"  - {line}")
+        return 1
+    print("\nCold-start check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,6 +24,42 @@ export interface Chapter {
   content: string;
   order: number;
   status: string;
+  version?: number;
+}
+
+// Table-of-contents entry; the listing never includes chapter bodies
+export interface ChapterListItem {
+  id: number;
+  title: string;
+  order: number;
+  status: string;
+  word_count: number;
+  updated_at?: string;
+}
+
+// Error thrown for non-2xx responses; status lets callers tell e.g. a version conflict (409) apart
+export class ApiError extends Error {
+  status: number;
+  detail: any;
+
+  constructor(message: string, status: number, detail?: any) {
+    super(message);
+    this.name = 'ApiError';
+    this.status = status;
+    this.detail = detail;
+  }
+}
+
+export interface TextSplice {
+  offset: number;
+  delete: number;
+  insert: string;
+}
+
+export interface ChapterPatchAck {
+  id: number;
+  version: number;
+  word_count: number;
 }
 
 export interface NovelCreate {
@@ -133,6 +169,12 @@ class ApiClient {
 
   // Generic request method
   private async request<T>(url: string, options: RequestInit = {}): Promise<T> {
+    const response = await this.send(url, options);
+    return (await response.json()) as T;
+  }
+
+  // Sends the request and returns the raw response once it is known to be successful
+  private async send(url: string, options: RequestInit = {}): Promise<Response> {
     const fullUrl = `${this.baseURL}${url}`;
     
     // Simulate network delay
@@ -188,11 +230,10 @@ class ApiClient {
         errorMessage = `HTTP Error! Status: ${response.status}`;
       }
         
-        throw new Error(errorMessage);
+        throw new ApiError(errorMessage, response.status, errorData.detail);
       }
 
-      const data = await response.json();
-      return data as T;
+      return response;
     } catch (error: any) {
       if (error.name === 'AbortError') {
         throw new Error('Request timeout');
@@ -208,6 +249,14 @@ class ApiClient {
     return this.request<T>(fullUrl, { method: 'GET' });
   }
 
+  // GET request for keyset-paginated listings; the next cursor comes from X-Next-Cursor
+  public async getPage<T>(url: string, params: Record<string, string> = {}): Promise<{ data: T; nextCursor: string | null }> {
+    const queryString = new URLSearchParams(params).toString();
+    const response = await this.send(queryString ? `${url}?${queryString}` : url, { method: 'GET' });
+    const data = (await response.json()) as T;
+    return { data, nextCursor: response.headers.get('X-Next-Cursor') };
+  }
+
   // POST request
   public post<T>(url: string, data: any = {}, options: RequestInit = {}): Promise<T> {
     const isFormData = data instanceof FormData;
@@ -239,6 +288,17 @@ class ApiClient {
     });
   }
 
+  // PATCH request
+  public patch<T>(url: string, data: any = {}): Promise<T> {
+    return this.request<T>(url, {
+      method: 'PATCH',
+      body: JSON.stringify(data),
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    });
+  }
+
   // DELETE request
   public delete<T>(url: string): Promise<T> {
     return this.request<T>(url, { method: 'DELETE' });
@@ -265,8 +325,20 @@ export const novelApi = {
   // Delete novel
   deleteNovel: (novelId: number) => apiClient.delete(`/novels/${novelId}`),
   
-  // Get chapters
-  getChapters: (novelId: number) => apiClient.get<Chapter[]>(`/novels/${novelId}/chapters`),
+  // Get the table of contents (no chapter bodies), following X-Next-Cursor until the last page
+  getChapters: async (novelId: number): Promise<ChapterListItem[]> => {
+    const chapters: ChapterListItem[] = [];
+    let cursor: string | null = null;
+    do {
+      const params: Record<string, string> = { limit: '1000' };
+      if (cursor) params.cursor = cursor;
+      const page: { data: ChapterListItem[]; nextCursor: string | null } =
+        await apiClient.getPage<ChapterListItem[]>(`/novels/${novelId}/chapters`, params);
+      chapters.push(...page.data);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return chapters;
+  },
   
   // Create chapter
   createChapter: (novelId: number, chapterData: ChapterCreate) => apiClient.post<Chapter>(`/novels/${novelId}/chapters`, chapterData),
@@ -274,6 +346,10 @@ export const novelApi = {
   // Proofread chapter
   proofreadChapter: (novelId: number, chapterId: number) => apiClient.post<any>(`/novels/${novelId}/chapters/${chapterId}/proofread`),
   
+  // Full-text search over chapters ("quoted phrase", space-separated terms are ANDed)
+  searchChapters: (novelId: number, q: string, limit = 20, offset = 0) =>
+    apiClient.get<any>(`/novels/${novelId}/search`, { q, limit: String(limit), offset: String(offset) }),
+  
   // Change chapter status
   changeChapterStatus: (novelId: number, chapterId: number, status: string) => apiClient.post<any>(`/novels/${novelId}/chapters/${chapterId}/status/${status}`),
 
@@ -317,7 +393,9 @@ export const authApi = {
 
 export const chapterApi = {
   getChapter: (chapterId: number) => apiClient.get<Chapter>(`/novels/chapters/${chapterId}`),
-  updateChapter: (chapterId: number, data: any) => apiClient.put<Chapter>(`/novels/chapters/${chapterId}`, data),
+  // base_version is required; a stale version is rejected with 409
+  updateChapter: (chapterId: number, data: { base_version: number | null; [field: string]: any }) => apiClient.put<Chapter>(`/novels/chapters/${chapterId}`, data),
+  patchChapter: (chapterId: number, data: { base_version: number; splices: TextSplice[]; prompt_version?: string }) => apiClient.patch<ChapterPatchAck>(`/novels/chapters/${chapterId}`, data),
   deleteChapter: (chapterId: number) => apiClient.delete(`/novels/chapters/${chapterId}`),
 };
 
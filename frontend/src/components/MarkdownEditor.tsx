@@ -71,6 +71,8 @@ interface MarkdownEditorProps {
   onSave?: (content: string) => Promise<boolean>;
   chapterId: number;
   novelId?: number;
+  // AI 生成章节时服务端选用的 prompt 版本，保存时需要带上
+  onPromptVersion?: (version: string) => void;
 }
 
 export interface MarkdownEditorRef {
@@ -81,7 +83,7 @@ export interface MarkdownEditorRef {
   setContent: (content: string) => void;
 }
 
-const MarkdownEditor = forwardRef<MarkdownEditorRef, MarkdownEditorProps>(({ initialContent = '', onSave, chapterId, novelId }, ref) => {
+const MarkdownEditor = forwardRef<MarkdownEditorRef, MarkdownEditorProps>(({ initialContent = '', onSave, chapterId, novelId, onPromptVersion }, ref) => {
   const { addNotification } = useNotification();
   const [content, setContent] = useState<string>(initialContent);
   const [isSaving, setIsSaving] = useState<boolean>(false);
@@ -425,6 +427,9 @@ const MarkdownEditor = forwardRef<MarkdownEditorRef, MarkdownEditorProps>(({ ini
                     
                     try {
                         const data = JSON.parse(dataStr);
+                        if (data.prompt_version) {
+                            onPromptVersion?.(data.prompt_version);
+                        }
                         if (data.content) {
                             insertStreamChunk(data.content, startPos, generatedLength);
                             generatedLength += data.content.length;
@@ -6,9 +6,24 @@ import StatusBar from '../components/StatusBar';
 import Sidebar from '../components/Sidebar';
 import WorldBible from '../components/WorldBible';
 import ConsistencyPanel from '../components/ConsistencyPanel';
-import { novelApi, chapterApi, Novel, Chapter } from '../api/api';
+import { novelApi, chapterApi, Novel, Chapter, TextSplice, ApiError } from '../api/api';
 import { Button } from '../components/ui/button';
 
+// 计算从 base 到 next 的单个替换操作（按码点计算偏移，与后端一致）
+const computeSplice = (base: string, next: string): TextSplice => {
+  const a = Array.from(base);
+  const b = Array.from(next);
+  let prefix = 0;
+  while (prefix < a.length && prefix < b.length && a[prefix] === b[prefix]) prefix++;
+  let suffix = 0;
+  while (suffix < a.length - prefix && suffix < b.length - prefix && a[a.length - 1 - suffix] === b[b.length - 1 - suffix]) suffix++;
+  return {
+    offset: prefix,
+    delete: a.length - prefix - suffix,
+    insert: b.slice(prefix, b.length - suffix).join(''),
+  };
+};
+
 const EditorPage = () => {
   const [searchParams, setSearchParams] = useSearchParams();
   const [chapterId, setChapterId] = useState<number>(
@@ -24,6 +39,13 @@ const EditorPage = () => {
   const [isWorldBibleOpen, setIsWorldBibleOpen] = useState(false);
   const [isConsistencyPanelOpen, setIsConsistencyPanelOpen] = useState(false);
   const editorRef = useRef<MarkdownEditorRef>(null);
+  // 最近一次成功保存的内容与版本，用于增量保存
+  const savedContentRef = useRef<string | null>(null);
+  const versionRef = useRef<number | null>(null);
+  // AI 生成章节所用的 prompt 版本，随下一次保存提交，之后才能为该版本评分
+  const promptVersionRef = useRef<string | null>(null);
+  // 保存时发现服务器上的章节已被修改（409/428）：保留本地内容，等待用户选择
+  const [conflict, setConflict] = useState<{ serverContent: string; serverVersion: number | null; localContent: string } | null>(null);
 
   // 获取所有小说列表
   useEffect(() => {
@@ -65,6 +87,8 @@ const EditorPage = () => {
       try {
         const chapter = await chapterApi.getChapter(chapterId);
         setContent(chapter.content || '');
+        savedContentRef.current = chapter.content || '';
+        versionRef.current = chapter.version ?? null;
         setSelectedNovelId(chapter.novel_id);
         setSaveStatus('saved');
       } catch (err: any) {
@@ -112,17 +136,76 @@ const EditorPage = () => {
   const saveChapterContent = async (newContent: string) => {
     setSaveStatus('saving');
     try {
-      await chapterApi.updateChapter(chapterId, { content: newContent });
+      let saved = false;
+      if (savedContentRef.current !== null && versionRef.current !== null) {
+        try {
+          const ack = await chapterApi.patchChapter(chapterId, {
+            base_version: versionRef.current,
+            splices: [computeSplice(savedContentRef.current, newContent)],
+            ...(promptVersionRef.current ? { prompt_version: promptVersionRef.current } : {}),
+          });
+          versionRef.current = ack.version;
+          saved = true;
+        } catch (patchErr) {
+          // 只有增量无法应用（422）时才退回全量保存；版本冲突等错误交给下面处理
+          if (!(patchErr instanceof ApiError && patchErr.status === 422)) throw patchErr;
+          console.warn('增量保存失败，改为全量保存:', patchErr);
+        }
+      }
+      if (!saved) {
+        // 全量保存同样带上基准版本，服务端会拒绝过期的版本
+        const chapter = await chapterApi.updateChapter(chapterId, {
+          content: newContent,
+          base_version: versionRef.current,
+          ...(promptVersionRef.current ? { prompt_version: promptVersionRef.current } : {}),
+        });
+        versionRef.current = chapter.version ?? null;
+      }
+      savedContentRef.current = newContent;
+      promptVersionRef.current = null;
       setContent(newContent);
+      setConflict(null);
       setSaveStatus('saved');
       return true;
     } catch (err) {
       console.error('保存章节失败:', err);
       setSaveStatus('unsaved');
+      if (err instanceof ApiError && (err.status === 409 || err.status === 428)) {
+        await loadConflict(newContent);
+      }
       return false;
     }
   };
 
+  // 重新获取服务器上的章节，展示冲突
+  const loadConflict = async (localContent: string) => {
+    try {
+      const chapter = await chapterApi.getChapter(chapterId);
+      setConflict({ serverContent: chapter.content || '', serverVersion: chapter.version ?? null, localContent });
+    } catch (err) {
+      console.error('获取最新章节失败:', err);
+    }
+  };
+
+  // 放弃本地修改，载入服务器版本
+  const takeServerVersion = () => {
+    if (!conflict) return;
+    savedContentRef.current = conflict.serverContent;
+    versionRef.current = conflict.serverVersion;
+    setContent(conflict.serverContent);
+    editorRef.current?.setContent(conflict.serverContent);
+    setConflict(null);
+    setSaveStatus('saved');
+  };
+
+  // 以服务器版本为基准，用本地内容覆盖
+  const keepLocalVersion = async () => {
+    if (!conflict) return;
+    savedContentRef.current = conflict.serverContent;
+    versionRef.current = conflict.serverVersion;
+    await saveChapterContent(conflict.localContent);
+  };
+
   // 工具栏动作处理
   const handleToolbarAction = (actionId: string) => {
     console.log('Toolbar action:', actionId);
@@ -211,6 +294,15 @@ const EditorPage = () => {
         {/* 工具栏 */}
         <Toolbar onAction={handleToolbarAction} />
         
+        {/* 版本冲突提示 */}
+        {conflict && (
+          <div className="flex items-center gap-3 border-b bg-destructive/10 px-4 py-2 text-sm text-destructive">
+            <span className="flex-1">章节已在其他地方被修改（服务器版本 {conflict.serverVersion ?? '未知'}），本次保存未生效。</span>
+            <Button variant="outline" size="sm" onClick={takeServerVersion}>载入服务器版本</Button>
+            <Button variant="outline" size="sm" onClick={keepLocalVersion}>用我的内容覆盖</Button>
+          </div>
+        )}
+
         {/* 编辑器与设定集容器 */}
         <div className="flex flex-1 overflow-hidden">
             <div className="flex-1 overflow-auto bg-card/50">
@@ -220,6 +312,7 @@ const EditorPage = () => {
                 onSave={saveChapterContent}
                 chapterId={chapterId}
                 novelId={selectedNovelId}
+                onPromptVersion={(version) => { promptVersionRef.current = version; }}
               />
             </div>
             
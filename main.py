@@ -1,10 +1,13 @@
-from fastapi import FastAPI, Request, Response, status
+from fastapi import FastAPI, Depends, Request, Response, Query, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.api.deps import get_current_admin_user
+from app.core.middleware import InstrumentationMiddleware
 import time
+import asyncio
 import logging
 
 # 配置日志记录
@@ -18,7 +21,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # 导入Prometheus相关库
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.metrics import render_latest, cleanup_dead_workers
 
 app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
 
@@ -67,89 +71,117 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID", "Server-Timing"],
 )
 
+# 请求日志、UTF-8 与 Prometheus 指标合并为一个纯 ASGI 中间件，按路由模板打标签
+app.add_middleware(InstrumentationMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+async def start_compute_executor():
+    # 预热计算进程池并开始采样事件循环延迟
+    from app.services.compute_executor import compute_executor
+    compute_executor.start_lag_monitor()
+    await compute_executor.warm_up()
+
+@app.on_event("startup")
+def cleanup_metrics_files():
+    # 被重启替换的 worker 留下的 gauge 文件
+    cleanup_dead_workers()
+
+@app.on_event("startup")
+def ensure_search_index():
+    # 已有数据库升级后首次启动时创建全文索引表，之后可调用 reindex 接口补建索引
+    from app.core.database import engine
+    from app.services.search_service import search_service
+    search_service.ensure_schema(engine)
+
+@app.on_event("startup")
+def ensure_prompt_registry():
+    # 创建 prompt 版本表并写入内置版本
+    from app.core.database import engine
+    from app.services.prompt_manager import prompt_manager
+    prompt_manager.ensure_schema(engine)
+
+@app.on_event("startup")
+async def warm_up_services():
+    # langchain_openai、chromadb 与 jieba 词典不在导入时加载；启动后在后台线程中预热，
+    # 服务无需等待即可接受请求，首个用到它们的请求也不必承担加载时间
+    if not settings.WARM_UP_SERVICES:
+        return
+
+    def warm_up():
+        from app.services.llm_service import llm_service
+        from app.services.context_manager import context_manager
+        from app.services.search_service import search_service
+        for service in (llm_service, context_manager, search_service):
+            start = time.perf_counter()
+            try:
+                service.warm_up()
+            except Exception as e:
+                logger.warning(f"Warm-up of {type(service).__name__} failed: {e}")
+                continue
+            logger.info(f"Warmed up {type(service).__name__} in {time.perf_counter() - start:.2f}s")
+
+    app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up))
+
+@app.on_event("startup")
+async def start_publish_queue():
+    if settings.PUBLISH_QUEUE_ENABLED:
+        from app.services.publish_queue import publish_queue
+        publish_queue.start()
+
+@app.on_event("shutdown")
+def stop_compute_executor():
+    from app.services.compute_executor import compute_executor
+    compute_executor.shutdown()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    from app.services.password_hasher import password_hasher
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_browser_pool():
+    # 先停止调度器，再关闭其使用的浏览器
+    from app.services.publish_queue import publish_queue
+    from app.services.browser_pool import browser_pool
+    await publish_queue.stop()
+    await browser_pool.close()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    from app.core.database import async_engine
+    await async_engine.dispose()
+
 @app.get("/")
 def root():
     return {"message": "Welcome to AI Novel Agent API"}
 
-# 确保指标只注册一次
-# 使用try-except块处理指标重复注册问题
-from prometheus_client import Counter, Histogram
-
-# 定义指标变量
-NOVEL_REQUEST_COUNT = None
-NOVEL_REQUEST_LATENCY = None
-
-# 尝试注册指标，如果已存在则跳过
-try:
-    # 使用唯一前缀"novel_agent_"避免与其他服务冲突
-    NOVEL_REQUEST_COUNT = Counter(
-        name="novel_agent_requests_total", 
-        documentation="Total HTTP requests for novel agent API", 
-        labelnames=["path", "method", "status"]
-    )
-    NOVEL_REQUEST_LATENCY = Histogram(
-        name="novel_agent_request_latency_seconds", 
-        documentation="Request latency for novel agent API", 
-        labelnames=["path", "method"]
-    )
-    logger.info("Prometheus metrics registered successfully")
-except ValueError as e:
-    # 如果指标已存在，捕获异常并从注册表中获取现有指标
-    logger.info(f"Metrics already registered: {e}")
-    # 从注册表中获取现有指标
-    for metric in REGISTRY.collect():  
-        if metric.name == "novel_agent_requests_total":
-            NOVEL_REQUEST_COUNT = REGISTRY._names_to_collectors["novel_agent_requests_total"]
-        elif metric.name == "novel_agent_request_latency_seconds":
-            NOVEL_REQUEST_LATENCY = REGISTRY._names_to_collectors["novel_agent_request_latency_seconds"]
-
-@app.middleware("http")
-async def request_logging_middleware(request: Request, call_next):
-    start = time.time()
-    response = await call_next(request)
-    latency = time.time() - start
-    logger.info(f"Request: {request.method} {request.url.path} - Status: {response.status_code} - Latency: {latency:.4f}s")
-    return response
-
-@app.middleware("http")
-async def set_utf8_encoding(request: Request, call_next):
-    response = await call_next(request)
-    # 确保所有JSON响应使用UTF-8编码
-    if "application/json" in response.headers.get("Content-Type", ""):
-        response.headers["Content-Type"] = "application/json; charset=utf-8"
-    return response
-
-@app.middleware("http")
-async def prometheus_metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    # 计算请求延迟
-    latency = time.time() - start_time
-    
-    # 只有当指标成功注册后才记录
-    if NOVEL_REQUEST_COUNT is not None and NOVEL_REQUEST_LATENCY is not None:
-        # 记录请求计数和延迟
-        NOVEL_REQUEST_COUNT.labels(
-            path=request.url.path, 
-            method=request.method, 
-            status=response.status_code
-        ).inc()
-        
-        NOVEL_REQUEST_LATENCY.labels(
-            path=request.url.path, 
-            method=request.method
-        ).observe(latency)
-    
-    return response
-
-# 暴露Prometheus指标端点
+# 暴露Prometheus指标端点（多 worker 部署时汇总所有进程）
 @app.get("/metrics")
 def metrics():
-    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# 最近的（慢）请求及其各阶段耗时，数据只保存在当前进程内存中；包含请求路径与 SQL 语句，仅管理员可见
+@app.get("/debug/traces", dependencies=[Depends(get_current_admin_user)])
+def debug_traces(slow: bool = True, min_duration_ms: float = 0, limit: int = Query(20, ge=1, le=200), spans: bool = True):
+    from app.core.tracing import tracer
+    traces = tracer.traces(slow=slow, min_duration=min_duration_ms / 1000, limit=limit)
+    return {
+        "slow_threshold_ms": tracer.slow_threshold * 1000,
+        "traces": [t.to_dict(include_spans=spans) for t in traces]
+    }
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(get_current_admin_user)])
+def debug_trace(trace_id: str):
+    from app.core.tracing import tracer
+    trace = tracer.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,68 @@
+import os
+import sys
+import uuid
+import tempfile
+
+# 配置在导入 app 之前确定：临时数据库与目录、离线的模拟 LLM，不启动发布调度与后台预热
+TEST_DIR = tempfile.mkdtemp(prefix="novel-agent-tests-")
+os.environ.update({
+    "OPENAI_API_KEY": "test-key",
+    "DATABASE_URL": f"sqlite:///{TEST_DIR}/test.db",
+    "CHROMA_PERSIST_DIRECTORY": f"{TEST_DIR}/chroma",
+    "PROOFREAD_REPORT_DIRECTORY": f"{TEST_DIR}/reports",
+    "PUBLISH_SESSION_DIR": f"{TEST_DIR}/publish_sessions",
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_TTFT": "0.01",
+    "FAKE_LLM_TOKENS_PER_SECOND": "10000",
+    "FAKE_LLM_OUTPUT_TOKENS": "50",
+    "FAKE_EMBEDDING_LATENCY": "0",
+    "PUBLISH_QUEUE_ENABLED": "false",
+    "WARM_UP_SERVICES": "false",
+    "COMPUTE_WORKERS": "2",
+    "BCRYPT_ROUNDS": "4",
+    # 小连接池：连接若在等待 LLM 或流式响应期间不归还，并发测试会耗尽连接池
+    "DB_POOL_SIZE": "5",
+    "DB_MAX_OVERFLOW": "0",
+    "DB_POOL_TIMEOUT": "5",
+})
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    from app.init_db import init_db
+    init_db()
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def auth_headers(client):
+    """注册一个新用户并返回其认证头"""
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/api/v1/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+    token = client.post("/api/v1/auth/token", data={"username": username, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def novel(client, auth_headers):
+    """当前用户的一本小说，带两章正文"""
+    novel = client.post("/api/v1/novels/", json={"title": "测试小说", "genre": "奇幻", "style": "轻松", "synopsis": "简介"}, headers=auth_headers).json()
+    from app.core.database import SessionLocal
+    from app.models.models import Chapter
+    with SessionLocal() as db:
+        for order in (1, 2):
+            db.add(Chapter(novel_id=novel["id"], title=f"第{order}章", order=order, content=f"第{order}章的正文。" * 20))
+        db.commit()
+    return novel
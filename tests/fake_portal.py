@@ -0,0 +1,196 @@
+"""测试用的模拟作者后台
+
+- FakePortal：本地 HTTP 服务，提供登录页、作者后台与作品章节列表，供真实 Chromium 测试使用；
+- InMemoryBrowser / InMemoryAdapter / InMemoryPublisher：实现 BrowserPool、发布检查点用到的少量接口，
+  直接读写 FakePortal 的状态，不启动浏览器。
+"""
+import uuid
+import threading
+from html import escape
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+
+class FakePortal:
+    def __init__(self, username: str = "author", password: str = "secret"):
+        self.credentials = {username: password}
+        self.sessions: set = set()
+        self.login_count = 0
+        # 作品名 -> 已发布章节标题
+        self.chapters: Dict[str, List[str]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def login_url(self) -> str:
+        return f"{self.base_url}/login"
+
+    @property
+    def author_url(self) -> str:
+        return f"{self.base_url}/author/"
+
+    def expire_sessions(self):
+        """让已登录的会话全部失效，下次访问后台会被重定向到登录页"""
+        self.sessions.clear()
+
+    def start(self) -> "FakePortal":
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _session(self) -> Optional[str]:
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                token = cookie["session"].value if "session" in cookie else None
+                return token if token in portal.sessions else None
+
+            def _send(self, status: int, body: str = "", headers: Optional[Dict[str, str]] = None):
+                data = f"<html><body>{body}</body></html>".encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/login"):
+                    return self._send(200, (
+                        "<form method='post' action='/login'>"
+                        "<input name='username'><input name='password' type='password'>"
+                        "<button type='submit'>登录</button></form>"
+                    ))
+                if self._session() is None:
+                    return self._send(302, headers={"Location": "/login"})
+                if self.path == "/author/":
+                    return self._send(200, "<a href='/author/works'>我的作品</a>")
+                if self.path == "/author/works":
+                    return self._send(200, "".join(
+                        f"<a href='/author/works/{i}'>{escape(title)}</a>" for i, title in enumerate(portal.chapters)
+                    ))
+                if self.path.startswith("/author/works/"):
+                    title = list(portal.chapters)[int(self.path.rsplit("/", 1)[-1])]
+                    return self._send(200, "".join(
+                        f"<a href='/chapter/{i}'>{escape(name)}</a>" for i, name in enumerate(portal.chapters[title])
+                    ))
+                return self._send(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                if self.path == "/login" and portal.credentials.get(form.get("username")) == form.get("password"):
+                    portal.login_count += 1
+                    token = uuid.uuid4().hex
+                    portal.sessions.add(token)
+                    return self._send(303, headers={"Location": "/author/", "Set-Cookie": f"session={token}; Path=/"})
+                return self._send(401, "登录失败")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class InMemoryContext:
+    def __init__(self, storage_state: Optional[Dict[str, Any]] = None):
+        self.cookies: List[Dict[str, Any]] = list((storage_state or {}).get("cookies", []))
+        self.closed = False
+
+    async def storage_state(self) -> Dict[str, Any]:
+        return {"cookies": list(self.cookies), "origins": []}
+
+    async def close(self):
+        self.closed = True
+
+
+class InMemoryBrowser:
+    def __init__(self):
+        self.contexts: List[InMemoryContext] = []
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def new_context(self, storage_state: Optional[Dict[str, Any]] = None) -> InMemoryContext:
+        context = InMemoryContext(storage_state)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        pass
+
+
+class InMemoryAdapter:
+    """按 FakePortal 的会话判断登录态；登录时把会话写入上下文的 cookie"""
+
+    def __init__(self, portal: FakePortal, platform: Any):
+        self.portal = portal
+        self.platform = platform
+
+    async def is_logged_in(self, context: InMemoryContext) -> bool:
+        return any(c["name"] == "session" and c["value"] in self.portal.sessions for c in context.cookies)
+
+    async def login(self, username: str, password: str, context: InMemoryContext) -> bool:
+        if self.portal.credentials.get(username) != password:
+            return False
+        self.portal.login_count += 1
+        token = uuid.uuid4().hex
+        self.portal.sessions.add(token)
+        context.cookies = [{"name": "session", "value": token}]
+        return True
+
+
+class InMemoryPage:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class InMemoryPublisher(InMemoryAdapter):
+    """在 FakePortal.chapters 上发布章节；fail_after_submit 模拟提交已生效但客户端收到异常"""
+
+    def __init__(self, portal: FakePortal, platform: Any):
+        super().__init__(portal, platform)
+        self.submissions: List[str] = []
+        self.fail_after_submit = 0
+        self.fail_before_submit = 0
+
+    def _url(self, chapter: Any) -> str:
+        titles = self.portal.chapters.get(chapter.novel.title, [])
+        return f"/chapter/{chapter.novel.title}/{titles.index(chapter.title)}"
+
+    async def open_editor(self, chapter: Any, context: Any) -> InMemoryPage:
+        return InMemoryPage()
+
+    async def submit(self, page: InMemoryPage, chapter: Any):
+        if self.fail_before_submit:
+            self.fail_before_submit -= 1
+            raise TimeoutError("submit button not found")
+        self.submissions.append(chapter.content)
+        self.portal.chapters.setdefault(chapter.novel.title, []).append(chapter.title)
+        if self.fail_after_submit:
+            self.fail_after_submit -= 1
+            raise TimeoutError("navigation timed out after submit")
+
+    async def confirm(self, page: InMemoryPage, chapter: Any) -> Optional[str]:
+        return self._url(chapter)
+
+    async def find_published(self, chapter: Any, context: Any) -> Optional[str]:
+        # 与真实适配器一致：标题完全相同才算找到
+        if chapter.title in self.portal.chapters.get(chapter.novel.title, []):
+            return self._url(chapter)
+        return None
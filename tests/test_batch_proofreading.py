@@ -0,0 +1,47 @@
+"""批量校对任务：状态保存在数据库中，其他 worker 也能查询；worker 退出后的任务按失败返回"""
+import json
+import time
+from app.core.database import SessionLocal
+from app.models.models import ProofreadJob
+from app.services.batch_proofreading_service import BatchProofreadingService
+
+
+def _wait_finished(client, url, headers, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(url, headers=headers).json()
+        if job["status"] != "running":
+            return job
+        time.sleep(0.1)
+    raise AssertionError("job did not finish")
+
+
+def test_job_state_is_shared_across_workers(client, auth_headers, novel):
+    job = client.post(f"/api/v1/novels/{novel['id']}/proofread_jobs", headers=auth_headers).json()
+    url = f"/api/v1/novels/{novel['id']}/proofread_jobs/{job['job_id']}"
+    done = _wait_finished(client, url, headers=auth_headers)
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    assert done["status"] == "completed" and done["total"] == done["completed"] == len(chapters)
+    assert done["report"]["chapter_count"] == len(chapters)
+
+    # 另一个进程中的服务实例（没有运行过该任务）读到相同的状态
+    assert BatchProofreadingService().get_job(job["job_id"]) == done
+
+    events = [json.loads(line[len("data: "):]) for line in client.get(f"{url}/stream", headers=auth_headers).text.split("\n\n") if line.startswith("data: {")]
+    assert sorted(r["chapter_id"] for e in events for r in e.get("results", [])) == sorted(c["id"] for c in chapters)
+    assert events[-1]["report"] == done["report"]
+
+
+def test_job_of_stopped_worker_is_reported_failed(client, auth_headers, novel):
+    old = time.time() - 3600
+    with SessionLocal() as db:
+        db.add(ProofreadJob(id="stale-job", novel_id=novel["id"], status="running", completed=1, total=2, started_at=old, heartbeat_at=old))
+        db.commit()
+    job = client.get(f"/api/v1/novels/{novel['id']}/proofread_jobs/stale-job", headers=auth_headers).json()
+    assert job["status"] == "failed" and job["error"]
+
+
+def test_job_of_other_novel_is_not_found(client, auth_headers, novel):
+    job = client.post(f"/api/v1/novels/{novel['id']}/proofread_jobs", headers=auth_headers).json()
+    other = client.post("/api/v1/novels/", json={"title": "另一本", "genre": "奇幻", "style": "轻松", "synopsis": "简介"}, headers=auth_headers).json()
+    assert client.get(f"/api/v1/novels/{other['id']}/proofread_jobs/{job['job_id']}", headers=auth_headers).status_code == 404
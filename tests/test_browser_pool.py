@@ -0,0 +1,73 @@
+"""浏览器池：按账号复用上下文，登录态失效时重新登录，重启后从加密文件恢复"""
+import asyncio
+import pytest
+from app.models.models import Platform
+from app.services.browser_pool import BrowserPool
+from app.services.publishing_adapters import QidianAdapter
+from tests.fake_portal import FakePortal, InMemoryBrowser, InMemoryAdapter
+
+
+@pytest.fixture
+def portal():
+    portal = FakePortal().start()
+    yield portal
+    portal.stop()
+
+
+async def _exercise_pool(make_pool, adapter, portal):
+    pool = make_pool()
+    try:
+        async with pool.session(adapter, "author", "secret") as first:
+            pass
+        async with pool.session(adapter, "author", "secret") as second:
+            pass
+        assert second is first
+        assert portal.login_count == 1
+
+        # 平台侧会话过期：下一次检查时重新登录，仍复用同一个上下文
+        portal.expire_sessions()
+        pool.invalidate(adapter.platform.value, "author")
+        async with pool.session(adapter, "author", "secret") as third:
+            pass
+        assert third is first
+        assert portal.login_count == 2
+    finally:
+        await pool.close()
+
+    # 新的浏览器池（进程重启）从磁盘恢复登录态，不再登录
+    restarted = make_pool()
+    try:
+        async with restarted.session(adapter, "author", "secret"):
+            pass
+        assert portal.login_count == 2
+    finally:
+        await restarted.close()
+
+
+def test_pool_reuses_contexts_and_relogs_in_memory(portal, tmp_path):
+    def make_pool():
+        pool = BrowserPool(session_dir=str(tmp_path))
+        pool._browser = InMemoryBrowser()
+        return pool
+
+    asyncio.run(_exercise_pool(make_pool, InMemoryAdapter(portal, Platform.QIDIAN), portal))
+    assert len(list(tmp_path.glob("*.state"))) == 1
+
+
+def test_pool_with_chromium_against_fake_portal(portal, tmp_path):
+    async def chromium_available() -> bool:
+        pool = BrowserPool(session_dir=str(tmp_path))
+        try:
+            await pool._get_browser()
+            return True
+        except Exception:
+            return False
+        finally:
+            await pool.close()
+
+    if not asyncio.run(chromium_available()):
+        pytest.skip("Chromium cannot be launched in this environment")
+
+    adapter = QidianAdapter()
+    adapter.login_url, adapter.publish_url = portal.login_url, portal.author_url
+    asyncio.run(_exercise_pool(lambda: BrowserPool(session_dir=str(tmp_path)), adapter, portal))
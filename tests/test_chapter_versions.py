@@ -0,0 +1,36 @@
+"""章节保存的乐观并发控制：PATCH 与 PUT 都要求基准版本"""
+
+
+def _first_chapter(client, novel, headers):
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=headers).json()
+    return client.get(f"/api/v1/novels/chapters/{chapters[0]['id']}", headers=headers).json()
+
+
+def test_put_requires_base_version(client, auth_headers, novel):
+    ch = _first_chapter(client, novel, auth_headers)
+    r = client.put(f"/api/v1/novels/chapters/{ch['id']}", json={"content": "新内容"}, headers=auth_headers)
+    assert r.status_code == 428
+
+
+def test_put_rejects_stale_version(client, auth_headers, novel):
+    ch = _first_chapter(client, novel, auth_headers)
+    url = f"/api/v1/novels/chapters/{ch['id']}"
+    r = client.put(url, json={"content": "第一次保存", "base_version": ch["version"]}, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["ETag"] == f'"{ch["id"]}-{r.json()["version"]}"'
+
+    # 仍以旧版本为基准的全量保存不能覆盖上一次保存
+    r = client.put(url, json={"content": "基于旧版本"}, headers={**auth_headers, "If-Match": f'"{ch["id"]}-{ch["version"]}"'})
+    assert r.status_code == 409
+    assert r.json()["detail"]["current_version"] == ch["version"] + 1
+    r = client.put(f"/api/v1/novels/{novel['id']}/chapters/{ch['id']}", json={"title": "改名", "base_version": ch["version"]}, headers=auth_headers)
+    assert r.status_code == 409
+    assert client.get(url, headers=auth_headers).json()["content"] == "第一次保存"
+
+
+def test_patch_conflict_is_not_bypassed(client, auth_headers, novel):
+    ch = _first_chapter(client, novel, auth_headers)
+    url = f"/api/v1/novels/chapters/{ch['id']}"
+    client.put(url, json={"content": "其他人的修改", "base_version": ch["version"]}, headers=auth_headers)
+    r = client.patch(url, json={"base_version": ch["version"], "splices": [{"offset": 0, "delete": 0, "insert": "我"}]}, headers=auth_headers)
+    assert r.status_code == 409
@@ -0,0 +1,96 @@
+"""正文压缩列：各编码标记的读写往返，以及旧库迁移脚本可重复执行"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import types
+from app.models.models import Chapter, ChapterRevision, Novel
+
+LONG = "夜色深沉，城门之外传来脚步声。他缓缓抬起头，望向远处的山峦。\n" * 40
+SHORT = "短正文"
+
+
+@pytest.mark.parametrize("codec,tag", [
+    ("zlib", types.CODEC_ZLIB),
+    pytest.param("zstd", types.CODEC_ZSTD, marks=pytest.mark.skipif(types.zstandard is None, reason="zstandard is not installed")),
+    ("none", types.CODEC_RAW),
+])
+def test_round_trip(novel, monkeypatch, codec, tag):
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION", codec)
+    stored = types.compress_text(LONG)
+    assert stored[:1] == tag
+    assert types.decompress_text(stored) == LONG
+    # 短文本不压缩
+    assert types.compress_text(SHORT) == types.CODEC_RAW + SHORT.encode("utf-8")
+
+    with SessionLocal() as db:
+        chapter = Chapter(novel_id=novel["id"], title=codec, order=50, content=LONG)
+        db.add(chapter)
+        db.commit()
+        chapter_id = chapter.id
+    # 读取只看数据中的标记，与当前配置无关
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION", "zlib" if codec != "zlib" else "none")
+    with SessionLocal() as db:
+        raw = db.execute(text("SELECT content_z FROM chapters WHERE id = :id"), {"id": chapter_id}).scalar()
+        assert bytes(raw)[:1] == tag
+        assert db.get(Chapter, chapter_id).content == LONG
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        types.decompress_text(b"x" + LONG.encode("utf-8"))
+
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE novels (id INTEGER PRIMARY KEY, title VARCHAR, genre VARCHAR, style VARCHAR, synopsis TEXT, outline TEXT, "
+    "status VARCHAR, author_id INTEGER, created_at DATETIME, updated_at DATETIME)",
+    'CREATE TABLE chapters (id INTEGER PRIMARY KEY, novel_id INTEGER, title VARCHAR, content TEXT, summary TEXT, "order" INTEGER, '
+    "status VARCHAR, created_at DATETIME, updated_at DATETIME)",
+    "CREATE TABLE chapter_revisions (id INTEGER PRIMARY KEY, chapter_id INTEGER, content TEXT, created_at DATETIME)",
+]
+
+
+def test_migration_can_be_rerun(tmp_path, monkeypatch, capsys):
+    from app import migrate_compressed_content as migration
+    legacy = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with legacy.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO novels (id, title, outline) VALUES (1, '旧书', :outline)"), {"outline": LONG})
+        for i, content in enumerate([LONG, SHORT, LONG + "第三章"], start=1):
+            conn.execute(text('INSERT INTO chapters (id, novel_id, title, content, "order", status) VALUES (:id, 1, :title, :content, :id, \'draft\')'),
+                         {"id": i, "title": f"第{i}章", "content": content})
+        conn.execute(text("INSERT INTO chapter_revisions (id, chapter_id, content) VALUES (1, 1, :content)"), {"content": LONG[:100]})
+    monkeypatch.setattr(migration, "engine", legacy)
+
+    migration.migrate(batch_size=2)
+    first = capsys.readouterr().out
+    assert "chapters.content: migrated 3 rows" in first
+    assert "chapter_revisions.content: migrated 1 rows" in first and "novels.outline: migrated 1 rows" in first
+
+    def snapshot():
+        with Session(legacy) as db:
+            chapters = [(c.content, c.word_count, c.version) for c in db.query(Chapter).order_by(Chapter.id)]
+            revision = db.get(ChapterRevision, 1)
+            return chapters, (revision.content, revision.content_length), db.get(Novel, 1).outline
+
+    migrated = snapshot()
+    assert migrated == (
+        [(LONG, len(LONG), 1), (SHORT, len(SHORT), 1), (LONG + "第三章", len(LONG) + 3, 1)],
+        (LONG[:100], 100), LONG
+    )
+    with legacy.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM chapters WHERE content IS NOT NULL")).scalar() == 0
+
+    # 迁移之后修改过的正文不会被再次迁移覆盖
+    with Session(legacy) as db:
+        db.get(Chapter, 1).content = "迁移后编辑过"
+        db.commit()
+    migration.migrate(batch_size=2)
+    second = capsys.readouterr().out
+    assert second.count("migrated 0 rows") == 3
+    chapters, revision, outline = snapshot()
+    assert chapters[0] == ("迁移后编辑过", len("迁移后编辑过"), 2)
+    assert chapters[1:] == migrated[0][1:] and revision == migrated[1] and outline == migrated[2]
+    legacy.dispose()
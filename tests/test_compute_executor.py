@@ -0,0 +1,40 @@
+import time
+import asyncio
+from app.services.compute_executor import compute_executor
+from app.services.proofreading_service import proofreading_service
+
+# 约 900 万字、8000 处语法问题：在当前进程中检查需要 0.5 秒以上
+LARGE_CHAPTER = ("清晨的阳光洒在安静的小镇街道上他慢慢走过石板路" * 50 + "的的") * 8000
+# 把 2700 万字节的参数序列化给工作进程时会短暂持有 GIL（约 0.07 秒），
+# 留出余量；在当前进程中检查会让事件循环停顿 0.5 秒以上
+MAX_LAG = 0.25
+
+
+async def _proofread_with_lag_probe():
+    await compute_executor.warm_up()
+    lags = []
+    done = asyncio.Event()
+
+    async def probe(interval: float = 0.01):
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - expected)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    result = await proofreading_service.proofread_text(LARGE_CHAPTER)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    return result, lags, elapsed
+
+
+def test_large_proofread_keeps_event_loop_responsive():
+    result, lags, elapsed = asyncio.run(_proofread_with_lag_probe())
+
+    assert result["grammar"]["error_count"] == 8000
+    # 检查期间事件循环持续被调度，且没有一次唤醒延迟超过 MAX_LAG
+    assert max(lags) < MAX_LAG, f"event loop stalled for {max(lags):.3f}s during a {elapsed:.2f}s proofread"
+    assert len(lags) >= elapsed / 0.02
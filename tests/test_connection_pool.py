@@ -0,0 +1,48 @@
+"""流式接口在等待 LLM 之前归还数据库连接：5 个连接的连接池可以同时服务 100 个流"""
+import asyncio
+import httpx
+from app.core.config import settings
+from app.core.database import async_engine
+from app.services.llm_service import llm_service
+
+STREAMS = 100
+TTFT = 1.0
+
+
+async def _run_streams(app, url, headers, started):
+    checked_out = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as http:
+        async def stream():
+            response = await http.post(url, json={"content": "少年站在城门前"}, headers=headers)
+            return response.status_code, response.text
+
+        tasks = [asyncio.create_task(stream()) for _ in range(STREAMS)]
+        # 所有流都已开始等待 LLM 时，连接池中不应有被占用的连接
+        while len(started) < STREAMS and not all(task.done() for task in tasks):
+            await asyncio.sleep(0.01)
+        checked_out.append(async_engine.pool.checkedout())
+        results = await asyncio.gather(*tasks)
+    return results, checked_out
+
+
+def test_streams_do_not_hold_pool_connections(app, client, auth_headers, novel, monkeypatch):
+    assert settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW == 5
+    # 每个流至少持续 TTFT 秒；若流期间占用连接，100 个流需要 20 秒以上，超过 DB_POOL_TIMEOUT
+    monkeypatch.setattr(llm_service.llm, "ttft", TTFT)
+    started = []
+    stream_improve_text = llm_service.stream_improve_text
+
+    def record_start(**kwargs):
+        started.append(1)
+        return stream_improve_text(**kwargs)
+
+    monkeypatch.setattr(llm_service, "stream_improve_text", record_start)
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    url = f"/api/v1/novels/{novel['id']}/chapters/{chapters[0]['id']}/stream_improve"
+
+    results, checked_out = client.portal.call(_run_streams, app, url, auth_headers, started)
+
+    assert [status for status, _ in results] == [200] * STREAMS
+    assert all(body.rstrip().endswith("data: [DONE]") for _, body in results)
+    assert checked_out == [0]
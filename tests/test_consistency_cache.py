@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+from app.services.llm_service import llm_service
+from app.services.proofreading_service import proofreading_service
+
+
+def test_cache_key_follows_the_model_in_use(monkeypatch):
+    def key_with(model):
+        monkeypatch.setattr(llm_service, "_llm", model)
+        return proofreading_service._consistency_cache_key("正文", "设定", "标题", "auto")
+
+    fake = key_with(SimpleNamespace(model_name="fake"))
+    assert key_with(SimpleNamespace(model_name="fake")) == fake
+    assert key_with(SimpleNamespace(model_name="gpt-4o")) != fake
+    # ChatOpenAI 等客户端也可能只有 model 属性
+    assert key_with(SimpleNamespace(model="gpt-4o-mini")) not in (fake, key_with(SimpleNamespace(model_name="gpt-4o")))
@@ -0,0 +1,68 @@
+"""一致性检查接口：mode 参数校验、流式接口的整章模式，以及三个接口使用同一份世界观文本"""
+import json
+import pytest
+from app.core.database import SessionLocal
+from app.models.models import Chapter, Character, Location, WorldSetting
+from app.services.proofreading_service import proofreading_service
+
+
+def _events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line.startswith("data: {")]
+
+
+@pytest.fixture
+def long_chapter(novel):
+    """超过 CONSISTENCY_CHUNK_SIZE 的章节，小说带有角色、地点与世界设定"""
+    with SessionLocal() as db:
+        db.add_all([
+            Character(novel_id=novel["id"], name="林舟", role="主角", description="沉默的剑客"),
+            Location(novel_id=novel["id"], name="北城", description="终年积雪"),
+            WorldSetting(novel_id=novel["id"], concept="灵力", category="Magic", description="只在夜间流动"),
+        ])
+        chapter = Chapter(novel_id=novel["id"], title="长章", order=3, content="林舟走过北城的长街，雪落无声。\n" * 500)
+        db.add(chapter)
+        db.commit()
+        return chapter.id
+
+
+@pytest.fixture
+def checked_chunks(monkeypatch):
+    """记录每个分块检查收到的世界观文本，不调用模型"""
+    calls = []
+
+    async def check_chunk(offset, chunk, world_bible, title, semaphore):
+        calls.append(world_bible)
+        return [], {}
+
+    monkeypatch.setattr(proofreading_service, "_check_chunk", check_chunk)
+    return calls
+
+
+@pytest.mark.parametrize("route", ["consistency_check", "stream_consistency_check"])
+def test_unknown_mode_is_rejected(client, auth_headers, novel, long_chapter, route):
+    r = client.post(f"/api/v1/novels/{novel['id']}/chapters/{long_chapter}/{route}", params={"mode": "fast"}, headers=auth_headers)
+    assert r.status_code == 422
+
+
+def test_stream_consistency_check_accepts_single_mode(client, auth_headers, novel, long_chapter, checked_chunks):
+    url = f"/api/v1/novels/{novel['id']}/chapters/{long_chapter}/stream_consistency_check"
+
+    def chunk_counts(**params):
+        events = _events(client.post(url, params=params, headers=auth_headers).text)
+        assert events[0]["source"] == "rules"
+        return {e["chunk_count"] for e in events if e["source"] == "llm"}
+
+    (auto,) = chunk_counts()
+    assert auto > 1
+    assert chunk_counts(mode="single") == {1}
+
+
+def test_routes_share_the_world_bible(client, auth_headers, novel, long_chapter, checked_chunks):
+    base = f"/api/v1/novels/{novel['id']}/chapters/{long_chapter}"
+    client.post(f"{base}/stream_consistency_check", params={"mode": "single"}, headers=auth_headers)
+    client.post(f"{base}/consistency_check", params={"mode": "single"}, headers=auth_headers)
+    assert len(checked_chunks) == 2 and checked_chunks[0] == checked_chunks[1]
+    world_bible = checked_chunks[0]
+    assert "- 林舟 (主角): 沉默的剑客" in world_bible
+    assert "- 北城: 终年积雪" in world_bible
+    assert "- 灵力 (Magic): 只在夜间流动" in world_bible
@@ -0,0 +1,45 @@
+"""规则一致性检查：只在同一段落、句子窗口与字符距离之内判定共现"""
+from app.services.consistency_rules import ConsistencyRuleEngine
+
+RULE = {"rule_id": "time_conflict", "type": "time_conflict", "first": "昨天", "second": "今天", "message": "同一天内的时间矛盾", "suggestion": "检查时间描述的一致性"}
+
+
+def _engine(**kwargs) -> ConsistencyRuleEngine:
+    return ConsistencyRuleEngine([RULE], **kwargs)
+
+
+def test_pair_in_same_paragraph_within_window_is_flagged():
+    text = "他昨天才到。今天又走了。"
+    issues = _engine(window=2, max_distance=200).check(text)
+    assert len(issues) == 1
+    issue = issues[0]
+    assert issue["rule_id"] == "time_conflict" and issue["message"] == RULE["message"]
+    assert text[issue["start"]:issue["end"]] == "昨天才到。今天"
+
+
+def test_pair_across_paragraph_break_is_not_flagged():
+    assert _engine(window=5, max_distance=200).check("他昨天才到\n今天又走了。") == []
+
+
+def test_pair_beyond_max_distance_is_not_flagged():
+    engine = _engine(window=5, max_distance=20)
+    assert engine.check("昨天" + "雪" * 30 + "今天") == []
+    assert len(engine.check("昨天" + "雪" * 10 + "今天")) == 1
+
+
+def test_pair_beyond_sentence_window_is_not_flagged():
+    engine = _engine(window=1, max_distance=200)
+    assert engine.check("他昨天才到。今天又走了。") == []
+    assert len(engine.check("他昨天才到，今天又走了。")) == 1
+
+
+def test_each_first_term_pairs_with_the_next_second_term():
+    text = "昨天，今天。\n昨天下雪，今天放晴。\n只有今天。"
+    issues = _engine().check(text)
+    assert [text[i["start"]:i["end"]] for i in issues] == ["昨天，今天", "昨天下雪，今天"]
+
+
+def test_bundled_rules_load():
+    engine = ConsistencyRuleEngine.from_file()
+    assert engine.rules and all(r["first"] and r["second"] for r in engine.rules)
+    assert engine.check("") == []
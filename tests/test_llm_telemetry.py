@@ -0,0 +1,109 @@
+"""LLM 调用记录：首 token 时间、token 间隔、用量（含估算）、错误与取消，以及缓存命中的模型标签"""
+import asyncio
+import uuid
+import pytest
+from app.services.fake_llm import FakeChatModel, FakeLLMError
+from app.services.llm_telemetry import llm_telemetry
+
+TTFT = 0.05
+TOKENS_PER_SECOND = 100
+OUTPUT_TOKENS = 10
+
+
+class NoUsageChatModel(FakeChatModel):
+    """不返回 usage_metadata 的模型，用量需要估算"""
+
+    async def _astream(self, *args, **kwargs):
+        async for chunk in super()._astream(*args, **kwargs):
+            if chunk.message.content:
+                yield chunk
+
+
+def _prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([("user", "{content}")])
+
+
+def _model(cls=FakeChatModel, **kwargs):
+    return cls(ttft=TTFT, tokens_per_second=TOKENS_PER_SECOND, output_tokens=OUTPUT_TOKENS, **kwargs)
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """收集 _finish 产生的每条调用记录"""
+    collected = []
+    finish = llm_telemetry._finish
+
+    def capture(*args, **kwargs):
+        record = finish(*args, **kwargs)
+        collected.append(record)
+        return record
+
+    monkeypatch.setattr(llm_telemetry, "_finish", capture)
+    return collected
+
+
+def _assert_timing(stats):
+    assert stats["ttft"] >= TTFT
+    assert stats["chunks"] == OUTPUT_TOKENS
+    # 相邻 token 之间间隔 1 / tokens_per_second
+    assert stats["inter_token"] >= 0.8 / TOKENS_PER_SECOND
+    assert stats["latency"] >= stats["ttft"] + (OUTPUT_TOKENS - 1) * stats["inter_token"] * 0.99
+    assert stats["tokens_per_second"] > 0
+
+
+def test_ainvoke_records_timing_and_reported_usage():
+    stats = {}
+    message = asyncio.run(llm_telemetry.ainvoke("summary", _prompt(), _model(), {"content": "一章正文"}, stats=stats))
+    _assert_timing(stats)
+    assert stats["operation"] == "summary" and stats["model"] == "fake" and stats["result"] == "ok"
+    # 用量取自模型返回的 usage_metadata：prompt 按字符计，completion 为 token 数
+    assert stats["prompt_tokens"] == len("一章正文") and stats["completion_tokens"] == OUTPUT_TOKENS
+    assert stats["usage_estimated"] is False and stats["error"] is None
+    assert message.content
+
+
+def test_astream_estimates_usage_when_not_reported():
+    stats = {}
+
+    async def collect():
+        return [part async for part in llm_telemetry.astream("continue", _prompt(), _model(NoUsageChatModel), {"content": "前文"}, stats=stats)]
+
+    parts = asyncio.run(collect())
+    assert len(parts) == OUTPUT_TOKENS
+    _assert_timing(stats)
+    assert stats["usage_estimated"] is True
+    assert stats["prompt_tokens"] == len(_prompt().invoke({"content": "前文"}).to_string())
+    assert stats["completion_tokens"] == len("".join(parts))
+
+
+def test_failed_and_cancelled_calls_are_recorded():
+    stats = {}
+    with pytest.raises(FakeLLMError):
+        asyncio.run(llm_telemetry.ainvoke("summary", _prompt(), _model(error_rate=1.0), {"content": "正文"}, stats=stats))
+    assert stats["result"] == "error" and stats["error"] == "FakeLLMError" and stats["ttft"] is None
+
+    cancelled = {}
+
+    async def read_one():
+        stream = llm_telemetry.astream("continue", _prompt(), _model(), {"content": "前文"}, stats=cancelled)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_one())
+    assert cancelled["error"] == "cancelled" and cancelled["chunks"] == 1
+
+
+def test_cache_hit_is_labelled_with_the_model_in_use(client, records):
+    from app.services.llm_service import llm_service
+    content = f"缓存命中 {uuid.uuid4().hex}"
+
+    async def summarize_twice():
+        await llm_service.generate_summary(content)
+        await llm_service.generate_summary(content)
+
+    client.portal.call(summarize_twice)
+    generated, hit = records[-2:]
+    assert generated["cache_hit"] is False and hit["cache_hit"] is True
+    assert hit["operation"] == "summary" and hit["result"] == "cache_hit"
+    assert hit["model"] == generated["model"] == llm_service.model_name == "fake"
@@ -0,0 +1,78 @@
+"""多 worker 部署：/metrics 汇总所有 worker 的计数"""
+import os
+import re
+import sys
+import time
+import socket
+import subprocess
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUESTS = 60
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _scrape(base_url: str) -> str:
+    with httpx.Client(timeout=10) as http:
+        return http.get(f"{base_url}/metrics").text
+
+
+def _root_requests(metrics: str) -> float:
+    pattern = re.compile(r'^novel_agent_requests_total\{(?=[^}]*method="GET")(?=[^}]*path="/")(?=[^}]*status="200")[^}]*\} (\S+)$', re.M)
+    return sum(float(value) for value in pattern.findall(metrics))
+
+
+@pytest.fixture
+def workers(app, tmp_path):
+    """以 3 个 worker 启动 uvicorn，指标写入临时目录"""
+    port = _free_port()
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), COMPUTE_WORKERS="1")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", "3", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if process.poll() is not None:
+                pytest.fail("uvicorn exited during startup")
+            try:
+                if httpx.get(f"{base_url}/metrics", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                pytest.fail("uvicorn did not start within 60s")
+            time.sleep(0.2)
+        yield base_url, tmp_path
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def test_metrics_are_aggregated_across_workers(workers):
+    base_url, metrics_dir = workers
+    before = _root_requests(_scrape(base_url))
+    # 不复用连接，请求分散到各 worker
+    for _ in range(REQUESTS):
+        with httpx.Client(timeout=10) as http:
+            assert http.get(f"{base_url}/").status_code == 200
+
+    # 无论哪个 worker 响应 /metrics，结果都包含所有 worker 的计数
+    for _ in range(5):
+        assert _root_requests(_scrape(base_url)) == before + REQUESTS
+
+    # 计数来自多个 worker 各自的指标文件
+    pids = set()
+    for name in os.listdir(metrics_dir):
+        match = re.match(r"counter_(\d+)\.db$", name)
+        if match:
+            pids.add(match.group(1))
+    assert len(pids) >= 2
@@ -0,0 +1,135 @@
+"""Prompt 注册表：版本写入、模板校验、Thompson 采样选择、统计累加与数据库不可用时的回退"""
+import json
+import uuid
+import pytest
+from sqlalchemy import select
+from app.core.database import SessionLocal
+from app.models.models import PromptVariant
+
+
+def _events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line.startswith("data: {")]
+
+
+def _chapter_calls() -> dict:
+    with SessionLocal() as db:
+        return dict(db.execute(select(PromptVariant.version, PromptVariant.calls).where(PromptVariant.task == "chapter")).all())
+
+
+def test_stream_generate_uses_registry_and_reports_version(client, auth_headers, novel):
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    ch = client.get(f"/api/v1/novels/chapters/{chapters[0]['id']}", headers=auth_headers).json()
+    before = _chapter_calls()
+
+    r = client.post(f"/api/v1/novels/{novel['id']}/chapters/{ch['id']}/stream_generate", headers=auth_headers)
+    events = _events(r.text)
+    version = events[0]["prompt_version"]
+    assert version in before
+    assert all("content" in e for e in events[1:]) and len(events) > 1
+    assert _chapter_calls()[version] == before[version] + 1
+
+    # 保存生成的正文时带上版本，之后可以为该版本评分
+    generated = "".join(e["content"] for e in events[1:])
+    r = client.put(
+        f"/api/v1/novels/chapters/{ch['id']}",
+        json={"content": generated, "base_version": ch["version"], "prompt_version": version}, headers=auth_headers
+    )
+    assert r.json()["prompt_version"] == version
+    r = client.post(f"/api/v1/novels/{novel['id']}/chapters/{ch['id']}/prompt_feedback", json={"score": 0.9}, headers=auth_headers)
+    assert r.status_code == 200 and r.json()["prompt_version"] == version
+
+
+def _manager(**kwargs):
+    from app.services.prompt_manager import PromptManager
+    return PromptManager(weights={"quality": 1.0, "tokens": 0.0, "latency": 0.0, "cost": 0.0}, **kwargs)
+
+
+def _variant(id: int, version: str, **stats):
+    from app.services.prompt_manager import Variant
+    variant = Variant(id, "summary", version, [["user", "{content}"]])
+    variant.stats.update(stats)
+    return variant
+
+
+def test_ensure_schema_is_idempotent(app):
+    from app.core.database import engine
+    from app.services.prompt_manager import DEFAULT_VARIANTS, prompt_manager
+
+    def rows():
+        with SessionLocal() as db:
+            return sorted(db.execute(select(PromptVariant.task, PromptVariant.version, PromptVariant.messages)).all())
+
+    prompt_manager.ensure_schema(engine)
+    first = rows()
+    prompt_manager.ensure_schema(engine)
+    assert rows() == first
+    builtin = [(task, version) for task, versions in DEFAULT_VARIANTS.items() for version in versions]
+    assert all(sum(1 for r in first if (r[0], r[1]) == key) == 1 for key in builtin)
+
+
+def test_build_template_rejects_unknown_variables():
+    from app.services.prompt_manager import build_template
+    assert set(build_template("summary", [["user", "总结：{content}"]]).input_variables) == {"content"}
+    with pytest.raises(ValueError, match="secret"):
+        build_template("summary", [["system", "{secret}"], ["user", "{content}"]])
+    with pytest.raises(ValueError):
+        build_template("poem", [["user", "{content}"]])
+
+
+def test_thompson_sampling_prefers_better_quality():
+    manager = _manager(seed=7)
+    good = _variant(1, "good", calls=40, ratings=40, quality_sum=36)
+    poor = _variant(2, "poor", calls=40, ratings=40, quality_sum=12)
+    manager._variants = {"summary": [good, poor]}
+    shares = manager.selection_shares("summary", samples=500)
+    assert shares["good"] > 0.95
+
+
+def test_thompson_sampling_prefers_cheaper_variant_at_equal_quality():
+    manager = _manager(seed=7)
+    manager.weights = {"quality": 1.0, "tokens": 0.5, "latency": 0.0, "cost": 0.0}
+    # 质量相同，每次调用平均 800 与 3000 个 token
+    cheap = _variant(1, "cheap", calls=50, ratings=20, quality_sum=14, prompt_tokens_sum=50 * 500, completion_tokens_sum=50 * 300)
+    costly = _variant(2, "costly", calls=50, ratings=20, quality_sum=14, prompt_tokens_sum=50 * 2000, completion_tokens_sum=50 * 1000)
+    manager._variants = {"summary": [cheap, costly]}
+    shares = manager.selection_shares("summary", samples=500)
+    assert shares["cheap"] > 0.95
+
+
+def test_recorded_stats_are_visible_after_refresh(client):
+    manager = _manager()
+    version = f"test-{uuid.uuid4().hex[:8]}"
+
+    async def record():
+        variant = await manager.add_variant("summary", version, [["user", "一句话总结：{content}"]])
+        await manager.record_call(variant, {"latency": 1.5, "prompt_tokens": 100, "completion_tokens": 20, "cost_usd": 0.01})
+        await manager.record_call(variant, {"error": "TimeoutError"})
+        assert await manager.evaluate_template("summary", version, 0.75)
+        # 另一个进程（新的实例）刷新后看到累加后的统计
+        other = _manager()
+        await other.refresh()
+        return other.get_variant("summary", version).stats
+
+    stats = client.portal.call(record)
+    assert stats["calls"] == 2 and stats["errors"] == 1
+    assert stats["latency_sum"] == 1.5 and stats["prompt_tokens_sum"] == 100 and stats["completion_tokens_sum"] == 20
+    assert stats["ratings"] == 1 and stats["quality_sum"] == 0.75
+
+
+def test_falls_back_to_builtin_prompt_when_table_is_unavailable(client, tmp_path, monkeypatch):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.services import prompt_manager as module
+    empty = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/empty.db")
+    monkeypatch.setattr(module, "AsyncSessionLocal", async_sessionmaker(empty))
+    manager = _manager()
+
+    async def run():
+        variant = await manager.select("chapter")
+        # 内置版本没有数据库行，调用统计不写入
+        await manager.record_call(variant, {"latency": 1.0})
+        await empty.dispose()
+        return variant
+
+    variant = client.portal.call(run)
+    assert variant.id is None and variant.version == "v1"
+    assert "chapter_title" in variant.template.input_variables
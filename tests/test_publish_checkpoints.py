@@ -0,0 +1,119 @@
+"""分步骤发布：提交结果不明时先查找，已发出的章节内容变更后不会再发一次"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.models.models import Platform, PublishStep
+from app.services.browser_pool import BrowserPool
+from app.services.publish_checkpoints import PublishCheckpoints, PublishStepError
+from app.services.publishing_adapters import QidianAdapter
+from tests.fake_portal import FakePortal, InMemoryPublisher
+
+
+@pytest.fixture
+def chapter(client, auth_headers, novel):
+    # 检查点按章节 id 记录，使用真实章节的 id
+    chapter_id = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()[0]["id"]
+    return SimpleNamespace(id=chapter_id, title="第1章 出城", content="第一版正文", novel=SimpleNamespace(title=novel["title"]))
+
+
+@pytest.fixture
+def publisher():
+    return InMemoryPublisher(FakePortal(), Platform.QIDIAN)
+
+
+@pytest.fixture
+def checkpoints():
+    return PublishCheckpoints(step_attempts=2, step_retry_delay=0)
+
+
+def _run(client, checkpoints, publisher, chapter):
+    return client.portal.call(checkpoints.run, publisher, chapter, None)
+
+
+def _step(client, checkpoints, chapter):
+    return client.portal.call(checkpoints.get_record, Platform.QIDIAN.value, chapter.id).step
+
+
+def test_published_chapter_is_not_submitted_again(client, checkpoints, publisher, chapter):
+    url = _run(client, checkpoints, publisher, chapter)
+    assert _run(client, checkpoints, publisher, chapter) == url
+    assert publisher.submissions == ["第一版正文"]
+
+
+def test_ambiguous_submit_is_confirmed_by_lookup(client, checkpoints, publisher, chapter):
+    publisher.fail_after_submit = 1
+    assert _run(client, checkpoints, publisher, chapter)
+    assert publisher.submissions == ["第一版正文"]
+    assert _step(client, checkpoints, chapter) == PublishStep.CONFIRMED.value
+
+
+def test_edited_chapter_is_not_posted_twice(client, checkpoints, publisher, chapter):
+    _run(client, checkpoints, publisher, chapter)
+    chapter.content = "修改后的正文"
+    with pytest.raises(PublishStepError):
+        _run(client, checkpoints, publisher, chapter)
+    assert publisher.submissions == ["第一版正文"]
+    assert _step(client, checkpoints, chapter) == PublishStep.CONFIRMED.value
+
+
+def test_edit_after_ambiguous_submit_looks_the_chapter_up(client, checkpoints, publisher, chapter):
+    # 提交时异常且章节已出现在平台上，但当时查找失败，记录停在 submitting
+    publisher.fail_after_submit = 1
+    publisher.find_published = _unavailable
+    with pytest.raises(TimeoutError):
+        _run(client, checkpoints, publisher, chapter)
+    assert _step(client, checkpoints, chapter) == PublishStep.SUBMITTING.value
+
+    del publisher.find_published
+    chapter.content = "修改后的正文"
+    with pytest.raises(PublishStepError):
+        _run(client, checkpoints, publisher, chapter)
+    assert publisher.submissions == ["第一版正文"]
+
+
+def test_edit_after_failed_submit_publishes_new_content(client, checkpoints, publisher, chapter):
+    publisher.fail_before_submit = 2
+    with pytest.raises(PublishStepError):
+        _run(client, checkpoints, publisher, chapter)
+    assert _step(client, checkpoints, chapter) == PublishStep.SUBMITTING.value
+
+    chapter.content = "修改后的正文"
+    assert _run(client, checkpoints, publisher, chapter)
+    assert publisher.submissions == ["修改后的正文"]
+
+
+async def _unavailable(chapter, context):
+    raise TimeoutError("chapter list did not load")
+
+
+def test_find_published_matches_exact_title(tmp_path):
+    portal = FakePortal().start()
+    titles = ["第1章（修订）", "第1章 \"风\"'起'", "第1章"]
+    portal.chapters["测试小说"] = titles
+    adapter = QidianAdapter()
+    adapter.login_url, adapter.publish_url = portal.login_url, portal.author_url
+
+    async def find_all():
+        pool = BrowserPool(session_dir=str(tmp_path))
+        try:
+            await pool._get_browser()
+        except Exception:
+            await pool.close()
+            return None
+        try:
+            async with pool.session(adapter, "author", "secret") as context:
+                found = []
+                for title in titles + ["第2章"]:
+                    chapter = SimpleNamespace(title=title, novel=SimpleNamespace(title="测试小说"))
+                    found.append(await adapter.find_published(chapter, context))
+                return found
+        finally:
+            await pool.close()
+
+    try:
+        found = asyncio.run(find_all())
+    finally:
+        portal.stop()
+    if found is None:
+        pytest.skip("Chromium cannot be launched in this environment")
+    assert found == ["/chapter/0", "/chapter/1", "/chapter/2", None]
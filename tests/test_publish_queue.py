@@ -0,0 +1,101 @@
+"""发布队列的租约：排队中的任务持续续租，过期后被重新领取的任务不会被原 worker 写回"""
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+from sqlalchemy import select, update
+from app.core.database import AsyncSessionLocal
+from app.core.security import security_manager
+from app.models.models import Account, PublishJob, PublishJobStatus, PublishLog
+from app.services import publish_queue as publish_queue_module
+from app.services.publish_queue import PublishQueue
+
+
+class SlowAdapter:
+    platform = None
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.published = []
+
+    async def publish_chapter(self, chapter, context) -> bool:
+        await asyncio.sleep(self.delay)
+        self.published.append(chapter.id)
+        return True
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    adapter = SlowAdapter(delay=0.6)
+
+    @asynccontextmanager
+    async def session(adapter, username, password):
+        yield object()
+
+    monkeypatch.setattr(publish_queue_module, "get_adapter", lambda platform: adapter)
+    monkeypatch.setattr(publish_queue_module.browser_pool, "session", session)
+    return adapter
+
+
+def _enqueue(client, novel, auth_headers):
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    # 第三章由接口创建，凑满三个任务
+    chapters.append(client.post(f"/api/v1/novels/{novel['id']}/chapters", json={"title": "第三章", "order": 3, "outline_snippet": "进城"}, headers=auth_headers).json())
+
+    async def enqueue():
+        async with AsyncSessionLocal() as db:
+            account = Account(platform="qidian", username=f"author_{uuid.uuid4().hex[:8]}", enc_password=security_manager.encrypt("pw"))
+            db.add(account)
+            await db.commit()
+            jobs = await PublishQueue().enqueue(db, novel["id"], account, [ch["id"] for ch in chapters])
+            return [job.id for job in jobs]
+
+    return client.portal.call(enqueue)
+
+
+async def _statuses(job_ids):
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(
+            select(PublishJob.status).where(PublishJob.id.in_(job_ids)).order_by(PublishJob.id)
+        )).scalars())
+
+
+def test_queued_jobs_keep_their_lease(client, auth_headers, novel, adapter):
+    job_ids = _enqueue(client, novel, auth_headers)
+    # 三章依次发布共约 1.8 秒，第三章在 1 秒的租约过期后才开始
+    queue = PublishQueue(lease_seconds=1, rate_per_minute=0)
+    rival = PublishQueue(lease_seconds=1, rate_per_minute=0)
+
+    async def run():
+        dispatch = asyncio.create_task(queue.dispatch_due())
+        stolen = []
+        while not dispatch.done():
+            await asyncio.sleep(0.1)
+            stolen += await rival._claim()
+        return await dispatch, stolen
+
+    claimed, stolen = client.portal.call(run)
+    assert claimed == 3
+    assert stolen == []
+    assert len(adapter.published) == 3
+    assert client.portal.call(_statuses, job_ids) == [PublishJobStatus.SUCCEEDED.value] * 3
+
+
+def test_reclaimed_job_is_not_written_back(client, auth_headers, novel, adapter):
+    job_ids = _enqueue(client, novel, auth_headers)
+    queue = PublishQueue(rate_per_minute=0)
+
+    async def run():
+        jobs = [job for job in await queue._claim() if job.id in job_ids]
+        # 模拟租约过期后被另一个 worker 重新领取
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(PublishJob).where(PublishJob.id == jobs[0].id).values(attempts=PublishJob.attempts + 1))
+            await db.commit()
+        assert [job.id for job in await queue._renew_leases(jobs)] == [job.id for job in jobs[1:]]
+        await queue._record(jobs[0], None)
+        async with AsyncSessionLocal() as db:
+            logs = (await db.execute(select(PublishLog).where(PublishLog.chapter_id == jobs[0].chapter_id))).scalars().all()
+        return len(logs)
+
+    assert client.portal.call(run) == 1
+    assert client.portal.call(_statuses, job_ids)[0] == PublishJobStatus.RUNNING.value
@@ -0,0 +1,42 @@
+"""资源归属依赖（owned_*）用一条查询完成用户校验、资源查找与归属判断"""
+import uuid
+import pytest
+from app.core.query_counter import count_queries
+
+
+@pytest.fixture
+def resources(client, auth_headers, novel):
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    character = client.post(f"/api/v1/novels/{novel['id']}/characters", json={"name": "林风", "role": "主角", "description": "少年剑客"}, headers=auth_headers).json()
+    return {"novel": novel["id"], "chapter": chapters[0]["id"], "character": character["id"]}
+
+
+# (方法, 路径, 期望状态码, 期望查询数)；查询数包含接口本身的查询
+ENDPOINTS = [
+    ("get", "/api/v1/novels/{novel}", 200, 1),
+    ("get", "/api/v1/novels/chapters/{chapter}", 200, 1),
+    ("get", "/api/v1/novels/{novel}/chapters/{chapter}", 200, 1),
+    ("get", "/api/v1/novels/{novel}/characters", 200, 2),
+    ("get", "/api/v1/novels/{novel}/chapters/{chapter}/revisions", 200, 2),
+    ("delete", "/api/v1/characters/{character}", 200, 2),
+    ("get", "/api/v1/novels/999999999", 404, 1),
+    ("get", "/api/v1/novels/chapters/999999999", 404, 1),
+]
+
+
+@pytest.mark.parametrize("method, path, status, queries", ENDPOINTS)
+def test_owned_endpoint_query_count(client, auth_headers, resources, method, path, status, queries):
+    with count_queries() as counter:
+        response = getattr(client, method)(path.format(**resources), headers=auth_headers)
+    assert response.status_code == status
+    assert counter.count == queries, counter.statements
+
+
+def test_foreign_resource_is_rejected_in_one_query(client, auth_headers, resources):
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/api/v1/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+    token = client.post("/api/v1/auth/token", data={"username": username, "password": "pw"}).json()["access_token"]
+    with count_queries() as counter:
+        response = client.get(f"/api/v1/novels/chapters/{resources['chapter']}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+    assert counter.count == 1, counter.statements
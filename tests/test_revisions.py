@@ -0,0 +1,129 @@
+"""章节修订历史：增量的生成与回放、快照间隔、重建与修订接口，以及与章节更新同一事务写入"""
+import random
+import pytest
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Chapter, ChapterRevision
+from app.services.revision_service import make_delta, apply_delta, revision_service
+
+BODY = "".join(f"第{i}段，夜色深沉，城门之外传来脚步声。\n" for i in range(60))
+
+
+def _first_chapter(client, novel, headers):
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=headers).json()
+    return client.get(f"/api/v1/novels/chapters/{chapters[0]['id']}", headers=headers).json()
+
+
+def _revision_count(chapter_id: int) -> int:
+    with SessionLocal() as db:
+        return db.query(ChapterRevision).filter(ChapterRevision.chapter_id == chapter_id).count()
+
+
+def test_failed_revision_rolls_back_the_chapter_update(client, auth_headers, novel, monkeypatch):
+    ch = _first_chapter(client, novel, auth_headers)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("revision write failed")
+
+    monkeypatch.setattr(revision_service, "add_revision", broken)
+    with pytest.raises(RuntimeError):
+        client.put(f"/api/v1/novels/chapters/{ch['id']}", json={"content": "不会保存", "base_version": ch["version"]}, headers=auth_headers)
+    monkeypatch.undo()
+
+    after = client.get(f"/api/v1/novels/chapters/{ch['id']}", headers=auth_headers).json()
+    assert after["content"] == ch["content"] and after["version"] == ch["version"]
+    assert _revision_count(ch["id"]) == 0
+
+
+def test_stale_save_adds_no_revision(client, auth_headers, novel):
+    ch = _first_chapter(client, novel, auth_headers)
+    url = f"/api/v1/novels/chapters/{ch['id']}"
+    assert client.put(url, json={"content": "第一次", "base_version": ch["version"]}, headers=auth_headers).status_code == 200
+    r = client.patch(url, json={"base_version": ch["version"], "splices": [{"offset": 0, "delete": 0, "insert": "旧"}]}, headers=auth_headers)
+    assert r.status_code == 409
+    assert _revision_count(ch["id"]) == 1
+
+
+@pytest.mark.parametrize("base,target", [
+    ("", ""),
+    ("", "新的内容"),
+    ("原有内容", ""),
+    ("abc", "abc"),
+    ("开头不变，中间改了，结尾不变", "开头不变，中间改动很大的一段，结尾不变"),
+    (BODY, BODY.replace("第10段", "第十段").replace("第40段，夜色深沉", "第40段，天色微明")),
+    (BODY, "插入的新段落\n" + BODY + "追加的结尾"),
+    (BODY, BODY.replace("第20段，夜色深沉，城门之外传来脚步声。\n", "")),
+])
+def test_delta_round_trip(base, target):
+    assert apply_delta(base, make_delta(base, target)) == target
+
+
+def test_delta_round_trip_random_edits():
+    rng = random.Random(3)
+    text = BODY
+    for _ in range(200):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.randrange(20))
+        target = text[:start] + rng.choice(["", "新", "一段新的文字\n", "\n"]) + text[end:]
+        assert apply_delta(text, make_delta(text, target)) == target
+        text = target
+
+
+def _chapter(novel_id: int) -> int:
+    with SessionLocal() as db:
+        chapter = Chapter(novel_id=novel_id, title="修订", order=99, content=BODY)
+        db.add(chapter)
+        db.commit()
+        return chapter.id
+
+
+def test_snapshot_interval_and_reconstruct(novel, monkeypatch):
+    monkeypatch.setattr(settings, "REVISION_SNAPSHOT_INTERVAL", 5)
+    chapter_id = _chapter(novel["id"])
+    versions = []
+    with SessionLocal() as db:
+        chapter = db.get(Chapter, chapter_id)
+        text = BODY
+        for i in range(12):
+            text = text.replace(f"第{i}段", f"第{i}段（改）")
+            versions.append(text)
+            revision_service.add_revision(db, chapter, text)
+
+        listed = revision_service.list_revisions(db, chapter_id)
+        # 每 5 个修订一个快照，其余为增量
+        assert [r["is_snapshot"] for r in listed] == [i % 5 == 0 for i in range(12)]
+        assert [r["content_length"] for r in listed] == [len(v) for v in versions]
+        for row, expected in zip(listed, versions):
+            assert revision_service.reconstruct(db, revision_service.get_revision(db, chapter_id, row["id"])) == expected
+
+
+def test_large_change_is_stored_as_snapshot(novel):
+    chapter_id = _chapter(novel["id"])
+    with SessionLocal() as db:
+        chapter = db.get(Chapter, chapter_id)
+        revision_service.add_revision(db, chapter, BODY)
+        small = revision_service.add_revision(db, chapter, BODY + "一句")
+        rewritten = revision_service.add_revision(db, chapter, "完全重写的内容。" * 100)
+        assert small.delta is not None
+        assert rewritten.delta is None and rewritten.content == "完全重写的内容。" * 100
+
+
+def test_revision_routes(client, auth_headers, novel):
+    ch = _first_chapter(client, novel, auth_headers)
+    url = f"/api/v1/novels/chapters/{ch['id']}"
+    version = ch["version"]
+    contents = ["第一行\n第二行\n", "第一行\n第二行（改）\n", "第一行\n第二行（改）\n第三行\n"]
+    for content in contents:
+        version = client.put(url, json={"content": content, "base_version": version}, headers=auth_headers).json()["version"]
+
+    base = f"/api/v1/novels/{novel['id']}/chapters/{ch['id']}/revisions"
+    listed = client.get(base, headers=auth_headers).json()
+    assert [r["number"] for r in listed] == [1, 2, 3]
+    assert [client.get(f"{base}/{r['id']}", headers=auth_headers).json()["content"] for r in listed] == contents
+
+    diff = client.get(f"{base}/diff", params={"from_revision": listed[0]["id"], "to_revision": listed[2]["id"]}, headers=auth_headers).json()["diff"]
+    assert "-第二行\n" in diff and "+第二行（改）\n" in diff and "+第三行\n" in diff
+
+    # 其他章节的修订号不能通过本章访问
+    other = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()[1]["id"]
+    assert client.get(f"/api/v1/novels/{novel['id']}/chapters/{other}/revisions/{listed[0]['id']}", headers=auth_headers).status_code == 404
@@ -0,0 +1,37 @@
+"""全文检索：提交后建立索引，分词词典按小说隔离"""
+from app.services import search_tokenizer
+from app.services.search_service import search_service
+
+
+def _search(client, headers, novel_id, q):
+    response = client.get(f"/api/v1/novels/{novel_id}/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_committed_chapters_are_searchable(client, auth_headers, novel):
+    result = _search(client, auth_headers, novel["id"], "正文")
+    assert result["total"] == 2
+    assert "<mark>正文</mark>" in result["results"][0]["snippet"]
+
+
+def test_chapter_written_by_async_endpoint_is_indexed_after_commit(client, auth_headers, novel):
+    chapter = client.post(f"/api/v1/novels/{novel['id']}/chapters", json={"title": "第三章", "order": 3, "outline_snippet": "主角进城"}, headers=auth_headers).json()
+    client.portal.call(search_service.drain)
+    term = search_service.tokenize(chapter["content"])[0]
+    hits = [hit["chapter_id"] for hit in _search(client, auth_headers, novel["id"], term)["results"]]
+    assert chapter["id"] in hits
+
+
+def test_character_names_do_not_change_the_global_dictionary(client, auth_headers, novel):
+    name = "祁星澜"
+    client.post(f"/api/v1/novels/{novel['id']}/characters", json={"name": name, "role": "主角", "description": "剑客"}, headers=auth_headers)
+    chapters = client.get(f"/api/v1/novels/{novel['id']}/chapters", headers=auth_headers).json()
+    version = client.get(f"/api/v1/novels/chapters/{chapters[0]['id']}", headers=auth_headers).json()["version"]
+    client.put(f"/api/v1/novels/chapters/{chapters[0]['id']}", json={"content": f"{name}推开了城门。", "base_version": version}, headers=auth_headers)
+
+    result = _search(client, auth_headers, novel["id"], name)
+    assert [hit["chapter_id"] for hit in result["results"]] == [chapters[0]["id"]]
+    assert name in search_service.tokenize(f"{name}推开了城门", (name,))
+    # 默认分词器不受影响
+    assert name not in search_tokenizer.get_jieba().dt.FREQ
@@ -0,0 +1,17 @@
+"""冷启动：导入 main 不加载延迟导入的依赖，且耗时在预算内"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 本机中位数约 1 秒；预算留出余量，避免在并行任务较多的 CI 机器上偶发失败，
+# 真正的回归（重新在导入时加载 langchain_core 或 langchain_openai）会被 LAZY_MODULES 检查发现
+BUDGET = 3.0
+
+
+def test_import_main_within_budget():
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "startup.py"), "--runs", "3", "--budget", str(BUDGET)],
+        cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,43 @@
+import uuid
+import asyncio
+from app.core.database import SessionLocal
+from app.core.tracing import tracer
+from app.models.models import User
+
+
+def _login(client, admin: bool = False):
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/api/v1/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+    if admin:
+        with SessionLocal() as db:
+            db.query(User).filter(User.username == username).update({"is_admin": True})
+            db.commit()
+    token = client.post("/api/v1/auth/token", data={"username": username, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_debug_traces_require_admin(client):
+    assert client.get("/debug/traces").status_code == 401
+    assert client.get("/debug/traces", headers=_login(client)).status_code == 403
+    assert client.get("/debug/traces/0", headers=_login(client)).status_code == 403
+
+    admin = _login(client, admin=True)
+    response = client.get("/debug/traces", params={"slow": False}, headers=admin)
+    assert response.status_code == 200
+    trace_id = response.json()["traces"][0]["trace_id"]
+    assert client.get(f"/debug/traces/{trace_id}", headers=admin).status_code == 200
+
+
+def test_background_tasks_do_not_join_the_request_trace():
+    async def request():
+        tracer.start_trace("GET")
+        inherited = asyncio.create_task(_has_trace())
+        detached = asyncio.create_task(tracer.detached(_has_trace()))
+        return await inherited, await detached
+
+    assert asyncio.run(request()) == (True, False)
+
+
+async def _has_trace() -> bool:
+    span = tracer.start_span("job")
+    return span is not None
@@ -0,0 +1,33 @@
+import time
+from app.models.models import User
+from app.services.user_cache import UserCache
+
+
+def _user(name: str) -> User:
+    return User(id=1, username=name, email=f"{name}@example.com", is_active=1, is_admin=False)
+
+
+def test_evicted_entries_leave_the_user_index():
+    cache = UserCache(maxsize=3, ttl=60)
+    for i in range(100):
+        cache.set({"jti": f"token-{i}", "sub": f"user{i}"}, _user(f"user{i}"))
+    assert len(cache._local) == 3
+    assert set(cache._keys_by_user) == {"user97", "user98", "user99"}
+
+
+def test_expired_entries_leave_the_user_index():
+    cache = UserCache(maxsize=100, ttl=60)
+    for i in range(10):
+        cache.set({"jti": f"token-{i}", "sub": f"user{i}", "exp": time.time() + 0.05}, _user(f"user{i}"))
+    time.sleep(0.1)
+    cache.set({"jti": "fresh", "sub": "alice"}, _user("alice"))
+    assert cache._keys_by_user == {"alice": {"fresh"}}
+
+
+def test_invalidate_user_drops_all_tokens():
+    cache = UserCache(maxsize=100, ttl=60)
+    for jti in ("a", "b"):
+        cache.set({"jti": jti, "sub": "alice"}, _user("alice"))
+    cache.invalidate_user("alice")
+    assert cache.get({"jti": "a", "sub": "alice"}) is None
+    assert cache._keys_by_user == {}